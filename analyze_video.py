@@ -0,0 +1,528 @@
+import os
+import csv
+import cv2
+import time
+import argparse
+from concurrent.futures import ProcessPoolExecutor
+from helpers import prepare_interpreter, Preprocessor, MotionGate, load_labels
+from helpers import get_tensor_output, get_class_mask, filter_detections, measurement_lines
+from tracker import Tracker
+
+# Declare Parameters
+LABEL_PATH = "labelmap.txt"
+MODEL = "efficientdet_lite0.tflite"
+NUM_THREADS = 4
+THRESHOLD = 0.3
+MAX_DETECTIONS = 25
+LABELS_TO_TRACK = ["car", "motorcycle", "bus", "truck"]
+DETECT_EVERY = 3 # frames
+ROI_MARGIN = 0.15 # Share of frame height around the lines run through the model, None for all
+MOTION_THRESHOLD = 0.01 # Share of changed pixels needed to run the model
+SPEED_LIMIT = 40 # km/hr
+DISTANCE = 30 # Meters between the measurement lines
+SEGMENT = 300 # Seconds of video per worker task
+OVERLAP = 10 # Seconds a segment starts early to pick up vehicles already on the road
+MIN_IOU = 0.5 # Overlap of two boxes needed to stitch their ids
+
+DETECTION_FIELDS = ["frame", "time", "id", "class", "score", "x1", "y1", "x2", "y2"]
+VIOLATION_FIELDS = ["frame", "time", "id", "class", "speed"]
+
+
+def parse_args():
+	""" Parse the command line arguments
+
+	Returns:
+		Namespace of the arguments
+	"""
+	parser = argparse.ArgumentParser(description="Measure vehicle speeds in recorded videos without a display")
+	parser.add_argument("videos", nargs="+", help="Video files to analyze")
+	parser.add_argument("-o", "--output", default=".", help="Directory the result files are written to")
+	parser.add_argument("--pictures", default=None, help="Directory the frames of violations are saved to")
+	parser.add_argument("--model", default=MODEL, help="Path to the tflite model")
+	parser.add_argument("--labels", default=LABEL_PATH, help="Path to the label map")
+	parser.add_argument("--threads", type=int, default=NUM_THREADS, help="Threads used by the interpreter")
+	parser.add_argument("--threshold", type=float, default=THRESHOLD, help="Minimum detection score")
+	parser.add_argument("--speed-limit", type=float, default=SPEED_LIMIT, help="Speed limit in km/hr")
+	parser.add_argument("--distance", type=float, default=DISTANCE, help="Meters between the measurement lines")
+	parser.add_argument("--detect-every", type=int, default=DETECT_EVERY, help="Run the detector on every Nth frame")
+	parser.add_argument("--roi-margin", type=float, default=ROI_MARGIN,
+						help="Share of frame height around the lines run through the model, negative for all")
+	parser.add_argument("--motion-threshold", type=float, default=MOTION_THRESHOLD,
+						help="Share of changed pixels needed to run the model, 0 to run on every frame")
+	parser.add_argument("-j", "--workers", type=int, default=1,
+						help="Worker processes analyzing segments of a video, lower --threads to match")
+	parser.add_argument("--segment", type=float, default=SEGMENT, help="Seconds of video per segment")
+	parser.add_argument("--overlap", type=float, default=OVERLAP,
+						help="Seconds a segment starts early, longer than a vehicle takes between the lines")
+	args = parser.parse_args()
+	if args.roi_margin < 0:
+		args.roi_margin = None
+
+	return args
+
+
+def get_time_stamp(video, frame_index, fps):
+	""" Get the time of a frame in the video
+
+	Args:
+		video: Video Capture the frame was read from
+		frame_index: Index of the frame in the video
+		fps: Frames per second of the video
+
+	Returns:
+		Time of the frame in seconds from the start of the video, from
+		the frame index if the container has no time stamps
+	"""
+	time_stamp = video.get(cv2.CAP_PROP_POS_MSEC) / 1000
+	if time_stamp <= 0 and frame_index > 0:
+		time_stamp = frame_index / fps
+
+	return time_stamp
+
+
+def analyze(video_path, args, labels, first_frame=0, end_frame=None, interpreter_info=None):
+	""" Detect, track and time the vehicles of a video
+
+	Frames are read as fast as they can be processed and timed from
+	the video, so the speeds do not depend on the processing rate.
+	Frames the detector is not run on are only grabbed, not decoded.
+
+	Args:
+		video_path: Path to the video
+		args: Namespace of the arguments
+		labels: List of the labels
+		first_frame: Index of the frame to start at
+		end_frame: Index of the frame to stop before, None for the end
+		interpreter_info: Prepared interpreter, a new one if None
+
+	Yields:
+		Frame index, time stamp, frame, ids, boxes, classes, scores and
+		a list of (id, class_name, speed) of the objects that completed
+		in the frame, for every frame the detector was run on
+	"""
+	if interpreter_info is None:
+		interpreter_info = prepare_interpreter(args.model, args.threads)
+	interpreter = interpreter_info["Interpreter"]
+	preprocessor = Preprocessor(interpreter_info, args.roi_margin)
+	motion_gate = MotionGate(args.motion_threshold, roi_margin=args.roi_margin)
+	class_mask = get_class_mask(labels, LABELS_TO_TRACK)
+	tracker = Tracker()
+
+	video = cv2.VideoCapture(video_path)
+	if not video.isOpened():
+		raise IOError(f"Unable to open {video_path}")
+	fps = video.get(cv2.CAP_PROP_FPS) or 25.0
+	if first_frame > 0:
+		video.set(cv2.CAP_PROP_POS_FRAMES, first_frame)
+
+	frame_index = first_frame - 1
+	try:
+		while True:
+			frame_index += 1
+			if end_frame is not None and frame_index >= end_frame:
+				break
+
+			# Run the detector on every detect_every frame with motion, predict in between
+			if frame_index % args.detect_every != 0:
+				if not video.grab():
+					break
+				tracker.predict()
+				continue
+
+			status, frame = video.read()
+			if status is False:
+				break
+			time_stamp = get_time_stamp(video, frame_index, fps)
+
+			if not motion_gate.has_motion(frame):
+				tracker.predict()
+				continue
+
+			# Write the frame into the input tensor
+			preprocessor.process(frame)
+			interpreter.invoke()
+
+			# Get boxes, classes, scores
+			boxes, classes, scores = get_tensor_output(interpreter_info)
+			boxes, classes, scores = filter_detections(preprocessor.to_frame_boxes(boxes), classes, scores,
+													   class_mask, args.threshold, frame, MAX_DETECTIONS)
+
+			tracker.set_lines(measurement_lines(frame.shape[0]))
+			ids = tracker.update(boxes, time_stamp)
+
+			completed = []
+			for index, id_ in enumerate(ids):
+				if id_ in tracker.completed:
+					speed = tracker.calculate_object_speed_in_km_per_hr_model_one(id_, args.distance,
+																				   tracker.completed[id_])
+					if speed != -1:
+						completed.append((int(id_), labels[classes[index]], speed))
+
+			yield frame_index, time_stamp, frame, ids, boxes, classes, scores, completed
+	finally:
+		video.release()
+
+
+def get_detection_rows(labels, frame_index, time_stamp, ids, boxes, classes, scores):
+	""" Get the rows of the detections file for a frame
+
+	Args:
+		labels: List of the labels
+		frame_index: Index of the frame in the video
+		time_stamp: Time of the frame in seconds
+		ids: Array of the object ids
+		boxes: Array of pixel boxes, each row is (x1, y1, x2, y2)
+		classes: Array of the class index of every box
+		scores: Array of the score of every box
+
+	Returns:
+		A list of rows in the order of DETECTION_FIELDS
+	"""
+	time_stamp = round(time_stamp, 3)
+
+	return [[frame_index, time_stamp, int(id_), labels[class_], round(float(score), 3), *(int(i) for i in box)]
+			for id_, box, class_, score in zip(ids, boxes, classes, scores)]
+
+
+def get_video_info(video_path):
+	""" Get the frame rate and length of a video
+
+	Args:
+		video_path: Path to the video
+
+	Returns:
+		Frames per second and number of frames of the video
+	"""
+	video = cv2.VideoCapture(video_path)
+	fps = video.get(cv2.CAP_PROP_FPS) or 25.0
+	frame_count = int(video.get(cv2.CAP_PROP_FRAME_COUNT))
+	video.release()
+
+	return fps, frame_count
+
+
+def get_segments(video_path, args):
+	""" Split a video into segments analyzed by the workers
+
+	Every segment starts overlap seconds before the frames it owns so
+	its tracker already knows the vehicles on the road when they begin.
+
+	Args:
+		video_path: Path to the video
+		args: Namespace of the arguments
+
+	Returns:
+		A list of (first_frame, start_frame, end_frame), the segment owns
+		the frames from start_frame up to end_frame, None for the end
+	"""
+	if args.workers <= 1:
+		return [(0, 0, None)]
+
+	fps, frame_count = get_video_info(video_path)
+
+	# Keep the segments on the detector cadence
+	segment_frames = max(round(args.segment * fps / args.detect_every), 1) * args.detect_every
+	overlap_frames = round(args.overlap * fps / args.detect_every) * args.detect_every
+
+	segments = []
+	for start_frame in range(0, max(frame_count, 1), segment_frames):
+		segments.append((max(start_frame - overlap_frames, 0), start_frame, start_frame + segment_frames))
+	segments[-1] = segments[-1][:2] + (None,)
+
+	return segments
+
+
+worker_interpreter_info = None
+
+
+def init_worker(args):
+	""" Prepare the interpreter of a worker process once
+
+	Args:
+		args: Namespace of the arguments
+	"""
+	global worker_interpreter_info
+	worker_interpreter_info = prepare_interpreter(args.model, args.threads)
+
+
+def analyze_segment(video_path, args, labels, segment):
+	""" Analyze a segment of a video
+
+	Args:
+		video_path: Path to the video
+		args: Namespace of the arguments
+		labels: List of the labels
+		segment: (first_frame, start_frame, end_frame) from get_segments
+
+	Returns:
+		The detection rows of every frame analyzed, including the ones
+		before start_frame, and a list of (row, picture) of the violations
+		in the frames the segment owns, with the picture JPEG encoded or
+		None if pictures are not saved
+	"""
+	first_frame, start_frame, end_frame = segment
+	detections = []
+	violations = []
+	for frame_index, time_stamp, frame, ids, boxes, classes, scores, completed in analyze(
+			video_path, args, labels, first_frame, end_frame, worker_interpreter_info):
+		detections.extend(get_detection_rows(labels, frame_index, time_stamp, ids, boxes, classes, scores))
+		if frame_index >= start_frame:
+			violations.extend(get_violations(args, frame_index, time_stamp, frame, completed))
+
+	return detections, violations
+
+
+def get_violations(args, frame_index, time_stamp, frame, completed):
+	""" Get the violations of a frame
+
+	Args:
+		args: Namespace of the arguments
+		frame_index: Index of the frame in the video
+		time_stamp: Time of the frame in seconds
+		frame: Loaded BGR frame
+		completed: A list of (id, class_name, speed) of the objects that
+				   completed in the frame
+
+	Returns:
+		A list of (row, picture) of the objects above the speed limit,
+		the row in the order of VIOLATION_FIELDS and the picture JPEG
+		encoded or None if pictures are not saved
+	"""
+	violations = []
+	for id_, class_name, speed in completed:
+		if speed <= args.speed_limit:
+			continue
+		picture = None
+		if args.pictures is not None:
+			picture = cv2.imencode(".jpg", frame)[1].tobytes()
+		violations.append(([frame_index, round(time_stamp, 3), id_, class_name, speed], picture))
+
+	return violations
+
+
+def save_picture(args, name, row, picture):
+	""" Write the picture of a violation
+
+	Args:
+		args: Namespace of the arguments
+		name: Name of the video
+		row: Row of the violation in the order of VIOLATION_FIELDS
+		picture: JPEG encoded frame, None if pictures are not saved
+	"""
+	if picture is None:
+		return
+	with open(os.path.join(args.pictures, f"{name}_{row[0]}_{row[2]}.jpg"), "wb") as f:
+		f.write(picture)
+
+
+def calculate_iou(first_box, second_box):
+	""" Calculate the intersection over union of two boxes
+
+	Args:
+		first_box: Pixel box (x1, y1, x2, y2)
+		second_box: Pixel box (x1, y1, x2, y2)
+
+	Returns:
+		Intersection over union between 0 and 1
+	"""
+	width = min(first_box[2], second_box[2]) - max(first_box[0], second_box[0])
+	height = min(first_box[3], second_box[3]) - max(first_box[1], second_box[1])
+	if width <= 0 or height <= 0:
+		return 0
+	intersection = width * height
+	first_area = (first_box[2] - first_box[0]) * (first_box[3] - first_box[1])
+	second_area = (second_box[2] - second_box[0]) * (second_box[3] - second_box[1])
+
+	return intersection / (first_area + second_area - intersection)
+
+
+def stitch_ids(owned_boxes, warm_up_rows):
+	""" Match the ids of a segment to the ids of the segment before it
+
+	Both segments analyze the overlap, so every vehicle seen by both is
+	matched to the id with the most overlapping boxes, each id once.
+
+	Args:
+		owned_boxes: A Dictionary mapping the frame index of the overlap
+					 to a list of (id, box) of the segment before
+		warm_up_rows: Detection rows of the segment in the overlap
+
+	Returns:
+		A Dictionary mapping the ids of the segment to the ids of the
+		segment before
+	"""
+	votes = {}
+	for frame_index, _, id_, _, _, *box in warm_up_rows:
+		matches = [(calculate_iou(box, other_box), other_id) for other_id, other_box in owned_boxes.get(frame_index, ())]
+		if not matches:
+			continue
+		iou, other_id = max(matches)
+		if iou >= MIN_IOU:
+			votes[(id_, other_id)] = votes.get((id_, other_id), 0) + 1
+
+	id_map = {}
+	used = set()
+	for (id_, other_id), _ in sorted(votes.items(), key=lambda item: -item[1]):
+		if id_ not in id_map and other_id not in used:
+			id_map[id_] = other_id
+			used.add(other_id)
+
+	return id_map
+
+
+def analyze_file(video_path, args, labels, executor=None):
+	""" Analyze a video and write its detections and violations
+
+	With an executor the segments of the video are analyzed in parallel
+	and the ids of every segment are stitched to the segment before it,
+	so each vehicle keeps one id and each violation is written once.
+	Without one the video is analyzed in this process and every frame is
+	written as soon as it is analyzed.
+
+	Args:
+		video_path: Path to the video
+		args: Namespace of the arguments
+		labels: List of the labels
+		executor: Process pool the segments are analyzed in, None to
+				  analyze in this process
+
+	Returns:
+		Seconds of video analyzed and number of violations
+	"""
+	name = os.path.splitext(os.path.basename(video_path))[0]
+	detections_path = os.path.join(args.output, f"{name}_detections.csv")
+	violations_path = os.path.join(args.output, f"{name}_violations.csv")
+
+	with open(detections_path, "w", newline="") as detections_file, \
+		 open(violations_path, "w", newline="") as violations_file:
+		detections_writer = csv.writer(detections_file)
+		violations_writer = csv.writer(violations_file)
+		detections_writer.writerow(DETECTION_FIELDS)
+		violations_writer.writerow(VIOLATION_FIELDS)
+
+		if executor is None:
+			last_frame, violations = write_stream(video_path, args, labels, name, detections_writer,
+												  violations_writer)
+		else:
+			last_frame, violations = write_segments(video_path, args, labels, name, executor, detections_writer,
+													violations_writer)
+
+	fps, frame_count = get_video_info(video_path)
+
+	return max(frame_count, last_frame + 1) / fps, violations
+
+
+def write_stream(video_path, args, labels, name, detections_writer, violations_writer):
+	""" Analyze a video in this process and write every frame right away
+
+	Only the ids seen so far are kept, so the memory does not grow with
+	the length of the video.
+
+	Args:
+		video_path: Path to the video
+		args: Namespace of the arguments
+		labels: List of the labels
+		name: Name of the video
+		detections_writer: CSV writer of the detections
+		violations_writer: CSV writer of the violations
+
+	Returns:
+		Index of the last frame analyzed and number of violations
+	"""
+	id_map = {}
+	frame_index = -1
+	violations = 0
+	for frame_index, time_stamp, frame, ids, boxes, classes, scores, completed in analyze(
+			video_path, args, labels):
+		# Number the vehicles from 1 in the order they are seen, as the segments do
+		rows = get_detection_rows(labels, frame_index, time_stamp, ids, boxes, classes, scores)
+		for row in rows:
+			row[2] = id_map.setdefault(row[2], len(id_map) + 1)
+		detections_writer.writerows(rows)
+
+		for row, picture in get_violations(args, frame_index, time_stamp, frame, completed):
+			row[2] = id_map.setdefault(row[2], len(id_map) + 1)
+			violations_writer.writerow(row)
+			save_picture(args, name, row, picture)
+			violations += 1
+
+	return frame_index, violations
+
+
+def write_segments(video_path, args, labels, name, executor, detections_writer, violations_writer):
+	""" Analyze the segments of a video in parallel and write them in order
+
+	Args:
+		video_path: Path to the video
+		args: Namespace of the arguments
+		labels: List of the labels
+		name: Name of the video
+		executor: Process pool the segments are analyzed in
+		detections_writer: CSV writer of the detections
+		violations_writer: CSV writer of the violations
+
+	Returns:
+		Index of the last frame analyzed and number of violations
+	"""
+	segments = get_segments(video_path, args)
+	results = executor.map(analyze_segment, [video_path] * len(segments), [args] * len(segments),
+						   [labels] * len(segments), segments)
+
+	overlap_frames = max(start_frame - first_frame for first_frame, start_frame, _ in segments)
+	last_frame = -1
+	violations = 0
+	next_id = 1
+	owned_boxes = {}
+	for (_, start_frame, end_frame), (detection_rows, violation_rows) in zip(segments, results):
+		warm_up_rows = [row for row in detection_rows if row[0] < start_frame]
+		id_map = stitch_ids(owned_boxes, warm_up_rows)
+
+		# Give the vehicles first seen in this segment new ids
+		for id_ in sorted({row[2] for row in detection_rows} - id_map.keys()):
+			id_map[id_] = next_id
+			next_id += 1
+
+		owned_boxes = {}
+		for row in detection_rows:
+			if row[0] < start_frame:
+				continue
+			row[2] = id_map[row[2]]
+			detections_writer.writerow(row)
+			last_frame = row[0]
+			if end_frame is not None and row[0] >= end_frame - overlap_frames:
+				owned_boxes.setdefault(row[0], []).append((row[2], row[5:]))
+
+		for row, picture in violation_rows:
+			row[2] = id_map[row[2]]
+			violations_writer.writerow(row)
+			save_picture(args, name, row, picture)
+			violations += 1
+
+	return last_frame, violations
+
+
+def main():
+	args = parse_args()
+	labels = load_labels(args.labels)
+	os.makedirs(args.output, exist_ok=True)
+	if args.pictures is not None:
+		os.makedirs(args.pictures, exist_ok=True)
+
+	executor = None
+	if args.workers > 1:
+		executor = ProcessPoolExecutor(args.workers, initializer=init_worker, initargs=(args,))
+
+	try:
+		for video_path in args.videos:
+			time_start = time.time()
+			video_time, violations = analyze_file(video_path, args, labels, executor)
+			elapsed_time = time.time() - time_start
+			print(f"{video_path}: {video_time:.1f} s of video, {violations} violations in {elapsed_time:.1f} s "
+				  f"({video_time / max(elapsed_time, 1e-6):.1f}x real time)")
+	finally:
+		if executor is not None:
+			executor.shutdown()
+
+
+if __name__ == "__main__":
+	main()
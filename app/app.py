@@ -1,16 +1,67 @@
-from flask import Flask, make_response, jsonify, request
+import hashlib
+from flask import Flask, Response, make_response, jsonify, request, stream_with_context, url_for
 from utils import running_smart_speed_system, get_database_configurations, connect_to_database, get_response_image
+from utils import ConnectionPool, ImageCache, TIME_FORMAT
+from utils import parse_time, encode_cursor, decode_cursor, build_violations_query, format_violation
+from utils import read_metrics, format_metrics, stream_json_array
+from image_keys import get_image_path, get_context_key
 
 
 app = Flask(__name__)
 app.config.from_pyfile("settings.py")
 
 database_info = get_database_configurations(app)
-database_connection = connect_to_database(database_info["host"],
-										  database_info["user"],
-										  database_info["passwd"],
-										  database_info["db"])
-database_cursor = database_connection.cursor()
+# Connections are opened on the first requests, never at import
+database_pool = ConnectionPool(lambda: connect_to_database(database_info["host"],
+														   database_info["user"],
+														   database_info["passwd"],
+														   database_info["db"],
+														   autocommit=True),
+							   database_info["pool_size"], database_info["pool_timeout"])
+image_cache = ImageCache(int(app.config.get("IMAGE_CACHE_BYTES")))
+
+
+def get_image_filename(date_time, key=None, context=False):
+	""" Get the file the image of a trespasser was saved to
+	
+	Args:
+		date_time: Datetime Trespassed, names the images saved before
+				   the image store
+		key: Key of the image in the image store, None for an image
+			 saved before the image store
+		context: Condition to get the context image saved with a crop
+		
+	Returns:
+		Path of the image
+		
+	Raises:
+		ValueError: The key points outside the image store
+	"""
+	if key is None:
+		return f"{app.config.get('IMAGES_PATH')}{date_time.strftime(TIME_FORMAT)}.jpg"
+		
+	return get_image_path(app.config.get("IMAGES_ROOT"), get_context_key(key) if context else key)
+	
+	
+def get_thumbnail_size(arguments):
+	""" Get the thumbnail size asked for in a query
+	
+	Args:
+		arguments: Query parameters of the request
+		
+	Returns:
+		Longest side of the thumbnail in pixels, None for the stored image
+		
+	Raises:
+		ValueError: The size is not between 16 and MAX_THUMBNAIL_SIZE
+	"""
+	if "size" not in arguments:
+		return None
+	size = int(arguments["size"])
+	if not 16 <= size <= int(app.config.get("MAX_THUMBNAIL_SIZE")):
+		raise ValueError(f"size must be between 16 and {app.config.get('MAX_THUMBNAIL_SIZE')}")
+		
+	return size
 
 
 @app.route("/")
@@ -39,26 +90,217 @@ def state_of_system():
 	
 @app.route("/recent")
 def recent():
-	""" Returns the info of the latest trespasser or the number passed
+	""" Returns the info of the latest trespassers, newest first
+	
+	The trespassers are streamed as a JSON array, each image is read
+	only when its trespasser is written out. The stored JPEGs are sent as
+	they are, or shrunk to the size query parameter. The ETag of the
+	response changes with the trespassers and their images, so a poll
+	with If-None-Match is answered with 304 before any image is read.
+	
+	Query parameters:
+		number: Trespassers in the page, 1 by default, at most
+				RECENT_MAX_NUMBER
+		cursor: X-Next-Cursor of the page before
+		images: 0 to leave the images out, they can be fetched from
+				image_url
+		size: Longest side of the images in pixels
 	
 	Returns:
-		trespasser info i.e speed, time and picture
+		200 - trespasser info i.e id, speed, time, camera, lane, image_url
+			  and picture, the picture is None if its file is missing. The
+			  cursor of the next page is in the X-Next-Cursor header
+		304 - The client has the page
+		400 - Invalid query parameters
+		404 - No trespasser has been saved
 	"""
-	database_connection.commit()
-	number = request.args.get("number")
-	if number is None:
-		number = 1
-		
-	statement = f"SELECT speed, trespassed_at FROM {database_info['table']} ORDER BY id DESC LIMIT {number}"
-	response = {}
-	if database_cursor.execute(statement):
-		results = database_cursor.fetchall()
-		for index, (speed, date) in enumerate(results):
-			filename = f"{app.config.get('IMAGES_PATH')}{date}.jpg"
-			encoded_image = get_response_image(filename)
-			response[index + 1] = {"speed": speed, "date": date, "ImageBytes": encoded_image}
-		return jsonify(response)
-		
-	database_connection.commit()	
-	return make_response(("No image has been saved"), 404)
+	arguments = request.args
+	try:
+		number = int(arguments.get("number", 1))
+		if number < 1:
+			raise ValueError("number must be positive")
+		number = min(number, int(app.config.get("RECENT_MAX_NUMBER")))
+		cursor = decode_cursor(arguments["cursor"]) if "cursor" in arguments else None
+		size = get_thumbnail_size(arguments)
+	except ValueError as error:
+		return make_response((f"Invalid query: {error}", 400))
+	with_images = arguments.get("images", "1").lower() not in ("0", "false", "no")
+		
+	# One row more than the page tells if there is a next page
+	statement, parameters = build_violations_query(database_info["table"], cursor=cursor, limit=number + 1)
+	with database_pool.connection() as connection, connection.cursor() as database_cursor:
+		database_cursor.execute(statement, parameters)
+		rows = database_cursor.fetchall()
+	if not rows and cursor is None:
+		return make_response(("No image has been saved"), 404)
+		
+	next_cursor = None
+	if len(rows) > number:
+		rows = rows[:number]
+		next_cursor = encode_cursor(rows[-1][2], rows[-1][0])
+		
+	etag = hashlib.sha1(f"{with_images},{size}".encode())
+	for row in rows:
+		image_etag = None
+		if with_images:
+			try:
+				image_etag, _ = image_cache.get_etag(get_image_filename(row[2], row[5]), size)
+			except (OSError, ValueError):
+				pass
+		etag.update(f"{row},{image_etag};".encode())
+	etag = etag.hexdigest()
+	headers = {"ETag": f'"{etag}"'}
+	if next_cursor is not None:
+		headers["X-Next-Cursor"] = next_cursor
+	if request.if_none_match.contains(etag):
+		return make_response(("", 304, headers))
+		
+	def generate_trespassers():
+		for row in rows:
+			trespasser = format_violation(row)
+			trespasser["image_url"] = url_for("image", id_=row[0], size=size)
+			if with_images:
+				try:
+					trespasser["ImageBytes"] = get_response_image(get_image_filename(row[2], row[5]), image_cache, size)
+				except (OSError, ValueError):
+					trespasser["ImageBytes"] = None
+			yield trespasser
+			
+	return Response(stream_with_context(stream_json_array(generate_trespassers())), 200, headers,
+					mimetype="application/json")
+	
+	
+@app.route("/images/<int:id_>")
+def image(id_):
+	""" Returns the stored JPEG of a trespasser
+	
+	The file is sent as it was saved, or shrunk to the size query
+	parameter, and answered with 304 when If-None-Match holds its ETag.
+	With context=1 the downscaled frame saved with a crop is sent.
 	
+	Args:
+		id_: Id of the trespasser
+		
+	Returns:
+		200 - The JPEG
+		304 - The client has the JPEG
+		400 - Invalid size
+		404 - No such trespasser or image
+	"""
+	try:
+		size = get_thumbnail_size(request.args)
+	except ValueError as error:
+		return make_response((f"Invalid query: {error}", 400))
+		
+	context = request.args.get("context", "0").lower() not in ("0", "false", "no")
+	statement = f"SELECT trespassed_at, image FROM {database_info['table']} WHERE id = %s"
+	with database_pool.connection() as connection, connection.cursor() as cursor:
+		cursor.execute(statement, (id_,))
+		row = cursor.fetchone()
+	if row is None:
+		return make_response(("No such trespasser", 404))
+		
+	try:
+		filename = get_image_filename(row[0], row[1], context)
+		etag, _ = image_cache.get_etag(filename, size)
+		if request.if_none_match.contains(etag):
+			response = make_response(("", 304))
+		else:
+			image_bytes, etag = image_cache.get(filename, size)
+			response = make_response(image_bytes)
+			response.mimetype = "image/jpeg"
+	except (OSError, ValueError):
+		return make_response(("The image has not been saved", 404))
+	response.set_etag(etag)
+	response.headers["Cache-Control"] = "no-cache"
+	return response
+	
+	
+@app.route("/violations")
+def violations():
+	""" Returns a page of trespassers, newest first
+	
+	Query parameters:
+		from: Earliest time, ISO 8601, included
+		to: Latest time, ISO 8601, excluded
+		min_speed: Lowest speed
+		camera: Name of the camera
+		lane: Lane
+		limit: Trespassers in the page, at most VIOLATIONS_MAX_PAGE_SIZE
+		cursor: next_cursor of the page before
+	
+	Returns:
+		200 - The trespassers i.e id, speed, time, camera and lane, and the
+			  cursor of the next page, null on the last page
+		400 - Invalid query parameters
+	"""
+	arguments = request.args
+	try:
+		limit = int(arguments.get("limit", app.config.get("VIOLATIONS_PAGE_SIZE")))
+		if limit < 1:
+			raise ValueError("limit must be positive")
+		limit = min(limit, int(app.config.get("VIOLATIONS_MAX_PAGE_SIZE")))
+		start = parse_time(arguments["from"]) if "from" in arguments else None
+		end = parse_time(arguments["to"]) if "to" in arguments else None
+		min_speed = int(arguments["min_speed"]) if "min_speed" in arguments else None
+		lane = int(arguments["lane"]) if "lane" in arguments else None
+		cursor = decode_cursor(arguments["cursor"]) if "cursor" in arguments else None
+	except ValueError as error:
+		return make_response((f"Invalid query: {error}", 400))
+		
+	# One row more than the page tells if there is a next page
+	statement, parameters = build_violations_query(database_info["table"], start, end, min_speed,
+												   arguments.get("camera"), lane, cursor, limit + 1)
+	with database_pool.connection() as connection, connection.cursor() as database_cursor:
+		database_cursor.execute(statement, parameters)
+		rows = database_cursor.fetchall()
+		
+	next_cursor = None
+	if len(rows) > limit:
+		rows = rows[:limit]
+		next_cursor = encode_cursor(rows[-1][2], rows[-1][0])
+		
+	return jsonify({"violations": [format_violation(row) for row in rows], "next_cursor": next_cursor})
+	
+	
+@app.route("/metrics")
+def metrics():
+	""" Returns the stage latencies and counters of the smart speed system
+		and the state of the database connection pool and image cache
+	
+	Returns:
+		200 - Metrics in the Prometheus text format
+		503 - No metrics have been dumped
+	"""
+	current_metrics = read_metrics(app.config.get("METRICS_PATH"))
+	if current_metrics is None:
+		return make_response(("No metrics available", 503))
+	for name, value in database_pool.get_stats().items():
+		current_metrics.setdefault("gauges", {})[f"database_pool_{name}"] = value
+	for name, value in image_cache.get_stats().items():
+		current_metrics["gauges"][f"image_cache_{name}"] = value
+		
+	response = make_response(format_metrics(current_metrics), 200)
+	response.headers["Content-Type"] = "text/plain; version=0.0.4; charset=utf-8"
+	return response
+	
+	
+@app.route("/pool")
+def pool():
+	""" Returns the state of the database connection pool
+	
+	Returns:
+		The size of the pool, the open, idle and in use connections
+		and the time requests waited for a connection
+	"""
+	return jsonify(database_pool.get_stats())
+	
+	
+@app.errorhandler(TimeoutError)
+def database_busy(error):
+	""" Answer requests that waited too long for a database connection
+	
+	Returns:
+		503 - Every connection is in use
+	"""
+	return make_response((str(error), 503))
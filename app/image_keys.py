@@ -0,0 +1,47 @@
+import os
+import uuid
+
+
+def new_key(date_time):
+	""" Make a key no other image has
+	
+	Args:
+		date_time: Datetime Trespassed
+		
+	Returns:
+		Key YYYY/MM/DD/HHMMSS_ffffff_id.jpg of the image
+	"""
+	return f"{date_time:%Y/%m/%d/%H%M%S_%f}_{uuid.uuid4().hex[:12]}.jpg"
+	
+	
+def get_context_key(key):
+	""" Get the key of the context image saved with a crop
+	
+	Args:
+		key: Key of the crop
+		
+	Returns:
+		Key of the context image
+	"""
+	return f"{os.path.splitext(key)[0]}_context.jpg"
+	
+	
+def get_image_path(root, key):
+	""" Get the path of an image under the root of the image store
+	
+	Args:
+		root: Directory the image store keeps the images under
+		key: Key of the image, YYYY/MM/DD/HHMMSS_ffffff_id.jpg
+		
+	Returns:
+		Path of the image
+		
+	Raises:
+		ValueError: The key points outside the root
+	"""
+	root = os.path.abspath(root)
+	path = os.path.normpath(os.path.join(root, key))
+	if os.path.commonpath((root, path)) != root:
+		raise ValueError(f"Invalid image key {key}")
+		
+	return path
@@ -0,0 +1,4 @@
+-- Store the key of the image of every violation in the image store,
+-- violations saved before have none and keep their picture_<time>.jpg
+ALTER TABLE history
+	ADD COLUMN image VARCHAR(64) NULL AFTER lane;
@@ -2,6 +2,12 @@
 CREATE TABLE IF NOT EXISTS history(
 	id INT NOT NULL AUTO_INCREMENT,
 	speed SMALLINT NOT NULL,
-	trespassed_at TEXT NOT NULL,
-	PRIMARY KEY (id)
+	trespassed_at DATETIME(3) NOT NULL,
+	camera VARCHAR(32) NOT NULL DEFAULT 'camera_0',
+	lane TINYINT UNSIGNED NULL,
+	image VARCHAR(64) NULL,
+	PRIMARY KEY (id),
+	INDEX history_trespassed_at (trespassed_at, id),
+	INDEX history_speed (speed, trespassed_at),
+	INDEX history_camera_trespassed_at (camera, trespassed_at, id)
 );
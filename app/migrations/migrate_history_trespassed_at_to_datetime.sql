@@ -0,0 +1,32 @@
+-- Move a history table created with trespassed_at as TEXT, in the
+-- %d_%m_%y_%H_%M_%S format of the image names, to the indexed schema
+-- of create_history_table.sql. Run once, after stopping the speed scripts.
+ALTER TABLE history
+	ADD COLUMN trespassed_at_datetime DATETIME(3) NULL AFTER trespassed_at;
+
+-- Only text in the format is converted, so strict mode does not stop the update
+UPDATE history
+	SET trespassed_at_datetime = STR_TO_DATE(trespassed_at, '%d_%m_%y_%H_%i_%s')
+	WHERE trespassed_at REGEXP '^[0-9]{2}_[0-9]{2}_[0-9]{2}_[0-9]{2}_[0-9]{2}_[0-9]{2}$';
+
+-- Report the rows whose time could not be converted
+SELECT id, speed, trespassed_at
+	FROM history
+	WHERE trespassed_at_datetime IS NULL;
+
+-- Keep them in history_unconverted to be fixed by hand, so the column can be made NOT NULL
+CREATE TABLE history_unconverted AS
+	SELECT * FROM history
+	WHERE trespassed_at_datetime IS NULL;
+
+DELETE FROM history
+	WHERE trespassed_at_datetime IS NULL;
+
+ALTER TABLE history
+	DROP COLUMN trespassed_at,
+	CHANGE COLUMN trespassed_at_datetime trespassed_at DATETIME(3) NOT NULL,
+	ADD COLUMN camera VARCHAR(32) NOT NULL DEFAULT 'camera_0',
+	ADD COLUMN lane TINYINT UNSIGNED NULL,
+	ADD INDEX history_trespassed_at (trespassed_at, id),
+	ADD INDEX history_speed (speed, trespassed_at),
+	ADD INDEX history_camera_trespassed_at (camera, trespassed_at, id);
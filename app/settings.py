@@ -6,4 +6,13 @@ MY_SQL_USER= environ.get("MY_SQL_USER")
 MY_SQL_PASSWORD = environ.get("MY_SQL_PASSWORD")
 MY_SQL_DATABASE = environ.get("MY_SQL_DATABASE")
 MY_SQL_TABLE = environ.get("MY_SQL_TABLE")
+MY_SQL_POOL_SIZE = environ.get("MY_SQL_POOL_SIZE", 4)
+MY_SQL_POOL_TIMEOUT = environ.get("MY_SQL_POOL_TIMEOUT", 5.0)
 IMAGES_PATH = environ.get("IMAGES_PATH")
+IMAGES_ROOT = environ.get("IMAGES_ROOT", "/home/user/Python/track_history")
+VIOLATIONS_PAGE_SIZE = environ.get("VIOLATIONS_PAGE_SIZE", 50)
+VIOLATIONS_MAX_PAGE_SIZE = environ.get("VIOLATIONS_MAX_PAGE_SIZE", 500)
+RECENT_MAX_NUMBER = environ.get("RECENT_MAX_NUMBER", 20)
+IMAGE_CACHE_BYTES = environ.get("IMAGE_CACHE_BYTES", 32 * 1024 * 1024)
+MAX_THUMBNAIL_SIZE = environ.get("MAX_THUMBNAIL_SIZE", 640)
+METRICS_PATH = environ.get("METRICS_PATH", "/tmp/smart_speed_metrics.json")
@@ -1,8 +1,32 @@
+import os
+import json
+import tempfile
 import unittest
 import subprocess
 from threading import Thread
-from  utils import running_smart_speed_system, connect_to_database
+import pymysql
+from datetime import datetime
+from  utils import running_smart_speed_system, connect_to_database, format_metrics, ConnectionPool
+from  utils import encode_cursor, decode_cursor, build_violations_query, ImageCache
+from  utils import stream_json_array
+from  image_keys import get_image_path, get_context_key
 
+class FakeConnection:
+	""" Stand-in for a pymysql connection that can be dropped """
+	
+	def __init__(self):
+		self.dropped = False
+		self.closed = False
+		
+	def ping(self, reconnect=True):
+		if self.dropped and not reconnect:
+			raise pymysql.err.OperationalError(2006, "MySQL server has gone away")
+		self.dropped = False
+		
+	def close(self):
+		self.closed = True
+		
+		
 class TestUtilsFunctions(unittest.TestCase):
 	"""
 		A Class for testing the functions in the 
@@ -24,3 +48,86 @@ class TestUtilsFunctions(unittest.TestCase):
 		cursor.execute("SHOW DATABASES")
 		data = cursor.fetchone();
 		self.assertIsNotNone(data)
+		
+	def test_format_metrics_returns_cumulative_buckets_and_counters(self):
+		metrics = {"histograms": {"invoke": {"buckets": [0.1, "+Inf"], "counts": [2, 1], "sum": 0.5,
+											 "count": 3, "quantiles": {"0.5": 0.075}}},
+				   "counters": {"violations": 4}}
+		text = format_metrics(metrics)
+		self.assertIn('smart_speed_stage_seconds_bucket{stage="invoke",le="0.1"} 2', text)
+		self.assertIn('smart_speed_stage_seconds_bucket{stage="invoke",le="+Inf"} 3', text)
+		self.assertIn('smart_speed_stage_quantile_seconds{stage="invoke",quantile="0.5"} 0.075', text)
+		self.assertIn("smart_speed_violations_total 4", text)
+		
+	def test_format_metrics_returns_gauges(self):
+		text = format_metrics({"gauges": {"violation_queue_depth": 3}})
+		self.assertIn("# TYPE smart_speed_violation_queue_depth gauge", text)
+		self.assertIn("smart_speed_violation_queue_depth 3", text)
+		
+	def test_connection_pool_opens_lazily_and_reuses_connections(self):
+		pool = ConnectionPool(FakeConnection, size=2, timeout=0.01)
+		self.assertEqual(0, pool.get_stats()["open"])
+		with pool.connection() as first:
+			with pool.connection() as second:
+				self.assertIsNot(first, second)
+				self.assertRaises(TimeoutError, pool.checkout)
+		first.dropped = True
+		with pool.connection() as connection:
+			self.assertFalse(connection.dropped)
+		stats = pool.get_stats()
+		self.assertEqual((2, 2, 1, 1), (stats["open"], stats["idle"], stats["timeouts"], stats["reconnects"]))
+		
+	def test_connection_pool_discards_connections_on_database_errors(self):
+		pool = ConnectionPool(FakeConnection, size=1)
+		with self.assertRaises(pymysql.MySQLError):
+			with pool.connection() as connection:
+				raise pymysql.err.InterfaceError("broken")
+		self.assertTrue(connection.closed)
+		self.assertEqual(0, pool.get_stats()["open"])
+		
+	def test_cursor_round_trips_time_and_id(self):
+		date_time = datetime(2024, 5, 1, 8, 30, 15, 123000)
+		self.assertEqual((date_time, 42), decode_cursor(encode_cursor(date_time, 42)))
+		self.assertRaises(ValueError, decode_cursor, "not a cursor")
+		
+	def test_build_violations_query_filters_and_continues_after_cursor(self):
+		start, last = datetime(2024, 5, 1), datetime(2024, 5, 2, 12)
+		statement, parameters = build_violations_query("history", start=start, min_speed=60,
+													   cursor=(last, 7), limit=11)
+		self.assertIn("WHERE trespassed_at >= %s AND speed >= %s AND "
+					  "(trespassed_at < %s OR (trespassed_at = %s AND id < %s))", statement)
+		self.assertTrue(statement.endswith("ORDER BY trespassed_at DESC, id DESC LIMIT %s"))
+		self.assertEqual([start, 60, last, last, 7, 11], parameters)
+		
+	def test_image_cache_serves_bytes_as_stored_until_the_file_changes(self):
+		with tempfile.TemporaryDirectory() as directory:
+			first, second = os.path.join(directory, "first.jpg"), os.path.join(directory, "second.jpg")
+			for filename in (first, second):
+				with open(filename, "wb") as f:
+					f.write(b"jpeg bytes")
+			image_cache = ImageCache(max_bytes=15)
+			image_bytes, etag = image_cache.get(first)
+			self.assertEqual(b"jpeg bytes", image_bytes)
+			self.assertEqual((b"jpeg bytes", etag), image_cache.get(first))
+			_, second_etag = image_cache.get(second)
+			self.assertEqual((1, 1, 2), (image_cache.get_stats()["images"], image_cache.hits, image_cache.misses))
+			
+			os.utime(second, ns=(0, 0))
+			self.assertNotEqual(second_etag, image_cache.get(second)[1])
+			self.assertEqual(3, image_cache.misses)
+			
+	def test_stream_json_array_writes_valid_json_one_item_at_a_time(self):
+		pieces = list(stream_json_array(iter([{"speed": 50}, {"speed": 61}])))
+		self.assertEqual(4, len(pieces))
+		self.assertEqual([{"speed": 50}, {"speed": 61}], json.loads("".join(pieces)))
+		self.assertEqual([], json.loads("".join(stream_json_array([]))))
+		
+	def test_get_image_path_keeps_keys_inside_the_root(self):
+		root = os.path.abspath("images")
+		key = "2024/05/01/120000_000000_0123456789ab.jpg"
+		self.assertEqual(os.path.join(root, "2024", "05", "01", "120000_000000_0123456789ab.jpg"),
+						 get_image_path("images", key))
+		self.assertEqual("2024/05/01/120000_000000_0123456789ab_context.jpg", get_context_key(key))
+		for key in ("../secret.jpg", "2024/../../secret.jpg", "/etc/passwd"):
+			with self.assertRaises(ValueError):
+				get_image_path("images", key)
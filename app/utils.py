@@ -1,9 +1,18 @@
 import pymysql
 import subprocess
 import io
-from base64 import encodebytes
+import os
+import json
+import time
+import threading
+from collections import OrderedDict
+from contextlib import contextmanager
+from datetime import datetime
+from base64 import encodebytes, urlsafe_b64encode, urlsafe_b64decode
 from PIL import Image
 
+TIME_FORMAT = "%d_%m_%y_%H_%M_%S" # Time in the file names of the violation images
+
 
 def running_smart_speed_system(filename):
 	""" Check if the smart speed system is running
@@ -27,7 +36,7 @@ def running_smart_speed_system(filename):
 	else:
 		return f"python {filename}" in output
 		
-def connect_to_database(host, user, password, database=None):
+def connect_to_database(host, user, password, database=None, autocommit=False):
 	""" Connect to mysql Database
 	
 	Args:
@@ -35,16 +44,169 @@ def connect_to_database(host, user, password, database=None):
 		user: Username log in as
 		password: User's Password
 		database: Database to use, None to not use a specific one
+		autocommit: Condition to commit every statement, so every read
+					sees the latest rows
 		
 	Return:
 		Connection Object
 	"""
 	return pymysql.connect(host=host, user=user, password=password,
-						   database=database)
+						   database=database, autocommit=autocommit)
+						   
 						   
+class ConnectionPool:
+	""" A bounded pool of database connections shared by request threads
+	
+	No connection is opened until the first checkout. A connection is
+	checked out by one thread at a time, pinged on checkout so a
+	connection dropped by a MySQL restart is reopened, and discarded
+	when a database error escapes its block.
+	
+	Attributes:
+		connect: Function opening a new connection
+		size: Maximum number of open connections
+		timeout: Seconds a checkout waits for a free connection
+		idle: A list of the connections waiting to be checked out
+		opened: Number of open connections
+		condition: Condition used to wait for a free connection
+		stats: A Dictionary of the checkouts, timeouts, reconnects and
+			   the total and longest seconds waited
+	"""
+	
+	def __init__(self, connect, size=4, timeout=5.0):
+		""" Intializes the Connection Pool
+		
+		Args:
+			connect: Function opening a new connection
+			size: Maximum number of open connections
+			timeout: Seconds a checkout waits for a free connection
+		"""
+		self.connect = connect
+		self.size = size
+		self.timeout = timeout
+		self.idle = []
+		self.opened = 0
+		self.condition = threading.Condition()
+		self.stats = {"checkouts": 0, "timeouts": 0, "reconnects": 0,
+					  "wait_seconds": 0.0, "max_wait_seconds": 0.0}
+		
+	@contextmanager
+	def connection(self):
+		""" Check out a connection for the block run in the context
+		
+		Raises:
+			TimeoutError: No connection was free within the timeout
+		"""
+		connection = self.checkout()
+		try:
+			yield connection
+		except pymysql.MySQLError:
+			self.discard(connection)
+			raise
+		except BaseException:
+			self.checkin(connection)
+			raise
+		else:
+			self.checkin(connection)
+			
+	def checkout(self):
+		""" Take a free connection, opening one if the pool is not full
+		
+		Returns:
+			A connection that answered a ping
+		
+		Raises:
+			TimeoutError: No connection was free within the timeout
+		"""
+		time_start = time.perf_counter()
+		with self.condition:
+			if not self.condition.wait_for(lambda: self.idle or self.opened < self.size, self.timeout):
+				self.stats["timeouts"] += 1
+				raise TimeoutError(f"No database connection was free within {self.timeout} seconds")
+			connection = self.idle.pop() if self.idle else None
+			if connection is None:
+				self.opened += 1
+			waited = time.perf_counter() - time_start
+			self.stats["checkouts"] += 1
+			self.stats["wait_seconds"] += waited
+			self.stats["max_wait_seconds"] = max(self.stats["max_wait_seconds"], waited)
+			
+		try:
+			if connection is None:
+				return self.connect()
+			self.check(connection)
+			return connection
+		except BaseException:
+			self.discard(connection)
+			raise
+			
+	def check(self, connection):
+		""" Ping a connection, reopening it if the server dropped it
+		
+		Args:
+			connection: Connection to check
+		"""
+		try:
+			connection.ping(reconnect=False)
+		except pymysql.MySQLError:
+			connection.ping(reconnect=True)
+			with self.condition:
+				self.stats["reconnects"] += 1
+				
+	def checkin(self, connection):
+		""" Give a connection back to the pool
+		
+		Args:
+			connection: Connection checked out of the pool
+		"""
+		with self.condition:
+			self.idle.append(connection)
+			self.condition.notify()
+			
+	def discard(self, connection):
+		""" Close a broken connection and free its place in the pool
+		
+		Args:
+			connection: Connection checked out of the pool, None if it
+						could not be opened
+		"""
+		if connection is not None:
+			try:
+				connection.close()
+			except Exception:
+				pass
+		with self.condition:
+			self.opened -= 1
+			self.condition.notify()
+			
+	def close(self):
+		""" Close the idle connections """
+		with self.condition:
+			idle, self.idle = self.idle, []
+			self.opened -= len(idle)
+		for connection in idle:
+			connection.close()
+			
+	def get_stats(self):
+		""" Get the size of the pool and the time spent waiting on it
+		
+		Returns:
+			A dictionary of the size, open, idle and in use connections,
+			the checkouts, timeouts and reconnects and the mean and
+			longest seconds a checkout waited
+		"""
+		with self.condition:
+			stats = dict(self.stats, size=self.size, open=self.opened, idle=len(self.idle),
+						 in_use=self.opened - len(self.idle))
+		stats["mean_wait_seconds"] = stats["wait_seconds"] / max(stats["checkouts"], 1)
+		
+		return stats
+		
+		
 def get_database_configurations(app):
 	""" Get the database configuration i.e host, user,
-		password, database, table
+		password, database, table and the size and timeout
+		of the connection pool
 		
 	Args:
 		app: An instance of the app
@@ -57,23 +219,363 @@ def get_database_configurations(app):
 	password = app.config.get("MY_SQL_PASSWORD")
 	database = app.config.get("MY_SQL_DATABASE")
 	table = app.config.get("MY_SQL_TABLE")
+	pool_size = int(app.config.get("MY_SQL_POOL_SIZE"))
+	pool_timeout = float(app.config.get("MY_SQL_POOL_TIMEOUT"))
 	
 	return {"host": host, "user": user, "passwd": password,
-			"db": database, "table": table}
+			"db": database, "table": table,
+			"pool_size": pool_size, "pool_timeout": pool_timeout}
 	
 	
-def get_response_image(filename):
-	""" Convert the image to byte array
+def get_response_image(filename, image_cache=None, size=None):
+	""" Encode the stored JPEG as base64, without decoding it
 	
 	Args:
-		filename: Name of the image file to convert to a byte arraty
+		filename: Name of the image file to encode
+		image_cache: ImageCache the bytes are read through, None to
+					 read the file
+		size: Longest side of a thumbnail in pixels, None for the
+			  stored image
 		
 	Returns:
 		Encoded Byte array
 	"""
-	pil_image = Image.open(filename, mode='r')
+	if image_cache is None:
+		image_cache = ImageCache(0)
+	image_bytes, _ = image_cache.get(filename, size)
+	
+	return encodebytes(image_bytes).decode("ascii")
+	
+	
+def make_thumbnail(image_bytes, size, quality=80):
+	""" Shrink a JPEG so its longest side is at most size pixels
+	
+	Args:
+		image_bytes: Bytes of the JPEG
+		size: Longest side of the thumbnail in pixels
+		quality: Quality of the thumbnail, 0 to 100
+		
+	Returns:
+		Bytes of the thumbnail JPEG
+	"""
+	pil_image = Image.open(io.BytesIO(image_bytes))
+	pil_image.draft("RGB", (size, size)) # Let the decoder skip the detail the thumbnail drops
+	pil_image.thumbnail((size, size))
 	bytes_arr = io.BytesIO()
-	pil_image.save(bytes_arr, format="PNG")
-	encoded_img = encodebytes(bytes_arr.getvalue()).decode("ascii")
+	pil_image.convert("RGB").save(bytes_arr, format="JPEG", quality=quality)
+	
+	return bytes_arr.getvalue()
+	
 	
-	return encoded_img
+class ImageCache:
+	""" A least recently used cache of the images served by the API
+	
+	Entries are keyed by the path and modification time of the file and
+	the thumbnail size, so a file written again is read again. Every
+	entry has an ETag made from the same key, so a client holding the
+	image can be answered without sending it.
+	
+	Attributes:
+		max_bytes: Most bytes of images kept, 0 to keep none
+		entries: An Ordered Dictionary mapping a key to the bytes and
+				 ETag of an image, least recently used first
+		size_in_bytes: Bytes of the images kept
+		lock: Lock guarding the entries
+		hits: Number of images served from the cache
+		misses: Number of images read from the disk
+	"""
+	
+	def __init__(self, max_bytes=32 * 1024 * 1024):
+		""" Intializes the Image Cache
+		
+		Args:
+			max_bytes: Most bytes of images kept, 0 to keep none
+		"""
+		self.max_bytes = max_bytes
+		self.entries = OrderedDict()
+		self.size_in_bytes = 0
+		self.lock = threading.Lock()
+		self.hits = 0
+		self.misses = 0
+		
+	def get_etag(self, filename, size=None):
+		""" Get the ETag of an image without reading it
+		
+		Args:
+			filename: Name of the image file
+			size: Longest side of a thumbnail in pixels, None for the
+				  stored image
+			
+		Returns:
+			The ETag and the key of the image
+			
+		Raises:
+			OSError: The file cannot be found
+		"""
+		status = os.stat(filename)
+		key = (filename, status.st_mtime_ns, size)
+		
+		return f"{status.st_mtime_ns:x}-{status.st_size:x}-{size or 0}", key
+		
+	def get(self, filename, size=None):
+		""" Get the bytes and ETag of an image
+		
+		Args:
+			filename: Name of the image file
+			size: Longest side of a thumbnail in pixels, None for the
+				  stored image
+			
+		Returns:
+			Bytes of the JPEG and its ETag
+			
+		Raises:
+			OSError: The file cannot be read
+		"""
+		etag, key = self.get_etag(filename, size)
+		with self.lock:
+			image_bytes = self.entries.get(key)
+			if image_bytes is not None:
+				self.entries.move_to_end(key)
+				self.hits += 1
+				return image_bytes, etag
+			self.misses += 1
+			
+		with open(filename, "rb") as f:
+			image_bytes = f.read()
+		if size is not None:
+			image_bytes = make_thumbnail(image_bytes, size)
+		self.put(key, image_bytes)
+		
+		return image_bytes, etag
+		
+	def put(self, key, image_bytes):
+		""" Keep an image, evicting the least recently used ones
+		
+		Args:
+			key: Path, modification time and thumbnail size
+			image_bytes: Bytes of the image
+		"""
+		if len(image_bytes) > self.max_bytes:
+			return
+		with self.lock:
+			previous = self.entries.pop(key, None)
+			if previous is not None:
+				self.size_in_bytes -= len(previous)
+			self.entries[key] = image_bytes
+			self.size_in_bytes += len(image_bytes)
+			while self.size_in_bytes > self.max_bytes:
+				_, evicted = self.entries.popitem(last=False)
+				self.size_in_bytes -= len(evicted)
+				
+	def get_stats(self):
+		""" Get the size and hit rate of the cache
+		
+		Returns:
+			A dictionary of the images and bytes kept and the hits and
+			misses
+		"""
+		with self.lock:
+			return {"images": len(self.entries), "bytes": self.size_in_bytes,
+					"max_bytes": self.max_bytes, "hits": self.hits, "misses": self.misses}
+	
+	
+def read_metrics(filename):
+	""" Read the metrics dumped by the smart speed system
+	
+	Args:
+		filename: JSON file the metrics are dumped to
+		
+	Returns:
+		A dictionary of the histograms and counters, None if there is
+		no file
+	"""
+	try:
+		with open(filename) as f:
+			return json.load(f)
+	except (OSError, ValueError):
+		return None
+		
+		
+def format_metrics(metrics, prefix="smart_speed"):
+	""" Format the metrics in the Prometheus text format
+	
+	Every stage is a label of one latency histogram, with its p50, p95
+	and p99 as a gauge, every counter is a counter and every gauge a
+	gauge.
+	
+	Args:
+		metrics: A dictionary of the histograms, counters and gauges
+		prefix: Prefix of the metric names
+		
+	Returns:
+		The metrics as text
+	"""
+	lines = []
+	histograms = metrics.get("histograms", {})
+	if histograms:
+		name = f"{prefix}_stage_seconds"
+		lines.append(f"# HELP {name} Latency of a pipeline stage")
+		lines.append(f"# TYPE {name} histogram")
+		for stage, histogram in histograms.items():
+			cumulative = 0
+			for bucket, count in zip(histogram["buckets"], histogram["counts"]):
+				cumulative += count
+				lines.append(f'{name}_bucket{{stage="{stage}",le="{bucket}"}} {cumulative}')
+			lines.append(f'{name}_sum{{stage="{stage}"}} {histogram["sum"]}')
+			lines.append(f'{name}_count{{stage="{stage}"}} {histogram["count"]}')
+			
+		name = f"{prefix}_stage_quantile_seconds"
+		lines.append(f"# HELP {name} Estimated quantile of the latency of a pipeline stage")
+		lines.append(f"# TYPE {name} gauge")
+		for stage, histogram in histograms.items():
+			for quantile, value in histogram["quantiles"].items():
+				lines.append(f'{name}{{stage="{stage}",quantile="{quantile}"}} {value}')
+				
+	for counter, value in metrics.get("counters", {}).items():
+		name = f"{prefix}_{counter}_total"
+		lines.append(f"# TYPE {name} counter")
+		lines.append(f"{name} {value}")
+		
+	for gauge, value in metrics.get("gauges", {}).items():
+		name = f"{prefix}_{gauge}"
+		lines.append(f"# TYPE {name} gauge")
+		lines.append(f"{name} {value}")
+		
+	if "updated_at" in metrics:
+		name = f"{prefix}_metrics_updated_at_seconds"
+		lines.append(f"# TYPE {name} gauge")
+		lines.append(f"{name} {metrics['updated_at']}")
+		
+	return "\n".join(lines) + "\n"
+	
+	
+def parse_time(text):
+	""" Parse a time given in a query
+	
+	Args:
+		text: ISO 8601 date or datetime, such as 2024-05-01 or
+			  2024-05-01T08:30:00
+		
+	Returns:
+		The datetime
+		
+	Raises:
+		ValueError: The text is not an ISO 8601 date or datetime
+	"""
+	return datetime.fromisoformat(text)
+	
+	
+def encode_cursor(date_time, id_):
+	""" Encode the position of a row in a page as an opaque cursor
+	
+	Args:
+		date_time: Datetime Trespassed of the row
+		id_: Id of the row
+		
+	Returns:
+		URL safe cursor
+	"""
+	position = f"{date_time.isoformat()}|{id_}".encode()
+	
+	return urlsafe_b64encode(position).decode("ascii").rstrip("=")
+	
+	
+def decode_cursor(cursor):
+	""" Decode a cursor made by encode_cursor
+	
+	Args:
+		cursor: URL safe cursor
+		
+	Returns:
+		Datetime Trespassed and id of the row
+		
+	Raises:
+		ValueError: The cursor is malformed
+	"""
+	try:
+		position = urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)).decode()
+		date_time, id_ = position.split("|")
+		return datetime.fromisoformat(date_time), int(id_)
+	except (ValueError, UnicodeDecodeError) as error:
+		raise ValueError(f"Invalid cursor {cursor}") from error
+		
+		
+def build_violations_query(table, start=None, end=None, min_speed=None, camera=None, lane=None,
+						   cursor=None, limit=50):
+	""" Build the query of a page of violations, newest first
+	
+	Pages are read with keyset pagination, the page after a cursor
+	starts below the (trespassed_at, id) of the cursor, so it is found
+	through the index on trespassed_at whatever page is read.
+	
+	Args:
+		table: Table in database
+		start: Earliest Datetime Trespassed, included, None for any
+		end: Latest Datetime Trespassed, excluded, None for any
+		min_speed: Lowest speed, None for any
+		camera: Name of the camera, None for any
+		lane: Lane, None for any
+		cursor: Datetime Trespassed and id of the last row of the page
+				before, None for the first page
+		limit: Number of rows read
+		
+	Returns:
+		The statement and a list of its parameters
+	"""
+	conditions, parameters = [], []
+	if start is not None:
+		conditions.append("trespassed_at >= %s")
+		parameters.append(start)
+	if end is not None:
+		conditions.append("trespassed_at < %s")
+		parameters.append(end)
+	if min_speed is not None:
+		conditions.append("speed >= %s")
+		parameters.append(min_speed)
+	if camera is not None:
+		conditions.append("camera = %s")
+		parameters.append(camera)
+	if lane is not None:
+		conditions.append("lane = %s")
+		parameters.append(lane)
+	if cursor is not None:
+		conditions.append("(trespassed_at < %s OR (trespassed_at = %s AND id < %s))")
+		parameters.extend((cursor[0], cursor[0], cursor[1]))
+		
+	where = f" WHERE {' AND '.join(conditions)}" if conditions else ""
+	statement = (f"SELECT id, speed, trespassed_at, camera, lane, image FROM {table}{where} "
+				 f"ORDER BY trespassed_at DESC, id DESC LIMIT %s")
+	parameters.append(limit)
+	
+	return statement, parameters
+	
+	
+def format_violation(row):
+	""" Convert a row read by the query of build_violations_query to a dictionary
+	
+	Args:
+		row: Id, speed, Datetime Trespassed, camera, lane and image key
+		
+	Returns:
+		A dictionary of the row, the time in ISO 8601, without the image
+		key
+	"""
+	id_, speed, date_time, camera, lane, _ = row
+	
+	return {"id": id_, "speed": speed, "trespassed_at": date_time.isoformat(timespec="milliseconds"),
+			"camera": camera, "lane": lane}
+	
+	
+def stream_json_array(items):
+	""" Write a JSON array one item at a time
+	
+	Args:
+		items: Iterable of the items, each one JSON serializable
+		
+	Returns:
+		A generator of the pieces of the array
+	"""
+	yield "["
+	for index, item in enumerate(items):
+		yield ("," if index else "") + json.dumps(item)
+	yield "]"
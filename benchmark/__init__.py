@@ -0,0 +1,14 @@
+""" End to end benchmark of the speed pipelines on synthetic traffic
+
+Synthetic videos of rectangles moving down at known pixel speeds are
+run through headless versions of the speed_* pipelines, with stand-ins
+for the TFLite interpreter and the camera, so the benchmark runs on a
+plain Linux box:
+
+	python -m benchmark.run --output results.json
+
+The Tracker alone is measured across object counts and frame rates,
+and compared with other association engines, by tracker_bench:
+
+	python -m benchmark.tracker_bench --engines batch per_detection
+"""
@@ -0,0 +1,108 @@
+import time
+import tempfile
+import cv2
+from helpers import set_camera, capture_frame
+from speed_stages import SpeedStages
+from renderer import Renderer
+from metrics import Metrics
+from violation_writer import ViolationWriter
+from image_store import ImageStore
+from benchmark.stubs import StubConnection
+
+LABEL_PATH = "labelmap.txt"
+MODEL = "efficientdet_lite0.tflite"
+NUM_THREADS = 4
+THRESHOLD = 0.3
+MAX_DETECTIONS = 25
+LABELS_TO_TRACK = ["car", "motorcycle", "bus", "truck"]
+
+
+class HeadlessRenderer(Renderer):
+	""" A Renderer that draws the frames but never shows them """
+
+	def present(self, image):
+		return False
+
+
+def make_stages(model_one, settings, metrics, violation_writer):
+	""" Make the stages of the speed scripts without a display or database
+
+	Args:
+		model_one: Condition to measure speed with model one
+		settings: A dictionary with detect_every, roi_margin,
+				  motion_threshold, render and speed_limit
+		metrics: Metrics the stage latencies are recorded in
+		violation_writer: ViolationWriter the trespassers are queued in
+
+	Returns:
+		The Speed Stages, measurements keeps every speed measured
+	"""
+	renderer = HeadlessRenderer(settings["render"], lines_color=(0, 0, 255) if model_one else None)
+
+	return SpeedStages(model_one, MODEL, LABEL_PATH, renderer, metrics, violation_writer, NUM_THREADS, THRESHOLD,
+					   MAX_DETECTIONS, LABELS_TO_TRACK, settings["detect_every"], settings["roi_margin"],
+					   settings["motion_threshold"], settings["speed_limit"], measurements=[])
+
+
+def run_video(model_one, video_path, settings):
+	""" Run the loop of the speed_video scripts on a video
+
+	Args:
+		model_one: Condition to measure speed with model one
+		video_path: Path of the video
+		settings: A dictionary with detect_every, roi_margin,
+				  motion_threshold, render and speed_limit
+
+	Returns:
+		The Metrics, the Speed Stages and the seconds it took
+	"""
+	metrics = Metrics()
+	video = cv2.VideoCapture(video_path)
+	with tempfile.TemporaryDirectory() as directory:
+		violation_writer = ViolationWriter(StubConnection(), "history", ImageStore(directory), metrics=metrics)
+		violation_writer.start()
+		speed_stages = make_stages(model_one, settings, metrics, violation_writer)
+
+		time_start = time.perf_counter()
+		while True:
+			with metrics.time("capture"):
+				status, frame = video.read()
+			if not status:
+				break
+			speed_stages.process(frame, video.get(cv2.CAP_PROP_POS_MSEC) / 1000)
+		elapsed_time = time.perf_counter() - time_start
+		violation_writer.close()
+	video.release()
+
+	return metrics, speed_stages, elapsed_time
+
+
+def run_live(model_one, settings):
+	""" Run the threaded pipeline of the speed_live scripts on the camera
+
+	The camera is expected to be the stand-in playing a video, the run
+	stops when the video ends.
+
+	Args:
+		model_one: Condition to measure speed with model one
+		settings: A dictionary with detect_every, roi_margin,
+				  motion_threshold, render and speed_limit
+
+	Returns:
+		The Metrics, the Speed Stages and the seconds it took
+	"""
+	metrics = Metrics()
+	picam = set_camera(0, 0, 0)
+	picam.start()
+	with tempfile.TemporaryDirectory() as directory:
+		violation_writer = ViolationWriter(StubConnection(), "history", ImageStore(directory), metrics=metrics)
+		violation_writer.start()
+		speed_stages = make_stages(model_one, settings, metrics, violation_writer)
+
+		time_start = time.perf_counter()
+		speed_stages.run_live(lambda: capture_frame(picam))
+		elapsed_time = time.perf_counter() - time_start
+		violation_writer.close()
+	picam.stop()
+
+	return metrics, speed_stages, elapsed_time
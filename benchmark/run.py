@@ -0,0 +1,163 @@
+import os
+import json
+import platform
+import argparse
+import tempfile
+import numpy as np
+from datetime import datetime
+
+from benchmark import stubs
+stubs.install() # Before helpers is imported by the pipelines
+from benchmark import synthetic
+from benchmark.pipelines import run_video, run_live
+from helpers import measurement_lines
+
+SCENARIOS = ["model_one_video", "model_one_live", "model_two_video", "model_two_live"]
+
+# Settings of the speed scripts
+MODEL_ONE_SETTINGS = {"detect_every": 3, "roi_margin": 0.15, "motion_threshold": 0.01, "speed_limit": 40}
+MODEL_TWO_SETTINGS = {"detect_every": 1, "roi_margin": None, "motion_threshold": 0.01, "speed_limit": 60}
+
+
+def parse_args():
+	""" Parse the command line arguments
+
+	Returns:
+		Namespace of the arguments
+	"""
+	parser = argparse.ArgumentParser(description="Benchmark the speed pipelines on synthetic traffic")
+	parser.add_argument("-o", "--output", default="benchmark_results.json", help="JSON file the results are saved to")
+	parser.add_argument("--scenarios", nargs="+", choices=SCENARIOS, default=SCENARIOS, help="Scenarios to run")
+	parser.add_argument("--latency", type=float, default=50.0, help="Milliseconds every invoke of the model takes")
+	parser.add_argument("--vehicles", type=int, default=12, help="Number of vehicles")
+	parser.add_argument("--duration", type=float, default=20.0, help="Seconds the vehicles enter the road in")
+	parser.add_argument("--width", type=int, default=360, help="Width of the video")
+	parser.add_argument("--height", type=int, default=640, help="Height of the video")
+	parser.add_argument("--fps", type=float, default=25.0, help="Frames per second of the video")
+	parser.add_argument("--seed", type=int, default=0, help="Seed of the vehicles")
+	parser.add_argument("--unpaced", action="store_true",
+						help="Capture the live frames as fast as possible instead of at the frame rate")
+	parser.add_argument("--render", action="store_true", help="Draw the frames, they are never shown")
+	parser.add_argument("--video", default=None, help="Keep the synthetic video at this path")
+
+	return parser.parse_args()
+
+
+def summarize_stages(metrics):
+	""" Summarize the latency of every stage
+
+	Args:
+		metrics: Metrics of a run
+
+	Returns:
+		A dictionary mapping a stage to its count, mean, p50, p95 and p99
+		in milliseconds
+	"""
+	stages = {}
+	for stage, histogram in metrics.histograms.items():
+		stages[stage] = {"count": histogram.count,
+						 "mean_ms": 1000 * histogram.sum / max(histogram.count, 1),
+						 "p50_ms": 1000 * histogram.quantile(0.5),
+						 "p95_ms": 1000 * histogram.quantile(0.95),
+						 "p99_ms": 1000 * histogram.quantile(0.99)}
+
+	return stages
+
+
+def summarize_speeds(measurements, vehicles, expected_speeds, width):
+	""" Compare the measured speeds with the speeds of the vehicles
+
+	Args:
+		measurements: A list of (time_stamp, x, speed) of the run
+		vehicles: A list of vehicles from make_vehicles
+		expected_speeds: Speed the model should measure for every vehicle
+		width: Width of the video
+
+	Returns:
+		A dictionary of the number of measurements and vehicles measured
+		and the mean absolute and relative errors
+	"""
+	errors = []
+	relative_errors = []
+	measured = set()
+	for time_stamp, x, speed in measurements:
+		index = synthetic.find_vehicle(vehicles, x, time_stamp, width)
+		if index is None:
+			continue
+		measured.add(index)
+		errors.append(speed - expected_speeds[index])
+		relative_errors.append(abs(speed - expected_speeds[index]) / expected_speeds[index])
+
+	errors = np.asarray(errors, dtype=float)
+	return {"measurements": len(measurements), "vehicles": len(vehicles), "vehicles_measured": len(measured),
+			"mean_error": float(errors.mean()) if len(errors) else None,
+			"mean_absolute_error": float(np.abs(errors).mean()) if len(errors) else None,
+			"mean_relative_error": float(np.mean(relative_errors)) if relative_errors else None}
+
+
+def run_scenario(name, video_path, vehicles, args):
+	""" Run a scenario and summarize it
+
+	Args:
+		name: Name of the scenario
+		video_path: Path of the synthetic video
+		vehicles: A list of vehicles from make_vehicles
+		args: Namespace of the arguments
+
+	Returns:
+		A dictionary of the results of the scenario
+	"""
+	model_one = name.startswith("model_one")
+	settings = dict(MODEL_ONE_SETTINGS if model_one else MODEL_TWO_SETTINGS, render=args.render)
+	if name.endswith("live"):
+		metrics, speed_stages, elapsed_time = run_live(model_one, settings)
+	else:
+		metrics, speed_stages, elapsed_time = run_video(model_one, video_path, settings)
+
+	if model_one:
+		lines = measurement_lines(args.height)
+		expected_speeds = [synthetic.expected_speed_model_one(vehicle, lines) for vehicle in vehicles]
+	else:
+		expected_speeds = [synthetic.expected_speed_model_two(vehicle, args.fps, settings["detect_every"])
+						   for vehicle in vehicles]
+
+	frames = metrics.counters.get("frames", 0)
+	return {"settings": settings, "frames": frames, "seconds": elapsed_time,
+			"fps": frames / elapsed_time if elapsed_time else None,
+			"counters": dict(metrics.counters),
+			"stages": summarize_stages(metrics),
+			"speed": summarize_speeds(speed_stages.measurements, vehicles, expected_speeds, args.width)}
+
+
+def main():
+	args = parse_args()
+	vehicles = synthetic.make_vehicles(args.vehicles, args.duration, seed=args.seed)
+
+	with tempfile.TemporaryDirectory() as directory:
+		video_path = args.video or os.path.join(directory, "synthetic.avi")
+		frame_count = synthetic.generate_video(video_path, vehicles, args.width, args.height, args.fps,
+											   args.duration + 3)
+		stubs.install(args.latency / 1000, video_path, not args.unpaced)
+
+		results = {"created_at": datetime.now().isoformat(timespec="seconds"),
+				   "platform": {"python": platform.python_version(), "machine": platform.machine(),
+								"system": platform.system(), "processor": platform.processor()},
+				   "config": {"latency_ms": args.latency, "vehicles": vehicles, "frames": frame_count,
+							  "width": args.width, "height": args.height, "fps": args.fps,
+							  "unpaced": args.unpaced, "render": args.render},
+				   "scenarios": {}}
+		for name in args.scenarios:
+			result = run_scenario(name, video_path, vehicles, args)
+			results["scenarios"][name] = result
+			speed = result["speed"]
+			error = speed["mean_relative_error"]
+			print(f"{name}: {result['fps']:.1f} FPS, {speed['vehicles_measured']}/{speed['vehicles']} vehicles measured, "
+				  f"mean speed error {'-' if error is None else f'{error:.1%}'}")
+
+	with open(args.output, "w") as f:
+		json.dump(results, f, indent=2)
+	print(f"Saved {args.output}")
+
+
+if __name__ == "__main__":
+	main()
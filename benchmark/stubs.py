@@ -0,0 +1,203 @@
+import sys
+import time
+import types
+import cv2
+import numpy as np
+
+INPUT_SIZE = 320 # Width and height of the stand-in model input
+CAR = 2 # Index of car in labelmap.txt
+MAX_DETECTIONS = 25
+
+
+class StubInterpreter:
+	""" Stand-in for tflite_runtime's Interpreter
+
+	Bright rectangles of the synthetic videos are found in the input
+	tensor and returned as the boxes of cars, after sleeping for the
+	latency of a real model.
+
+	Attributes:
+		latency: Seconds every invoke takes
+		input: The input tensor
+		outputs: A Dictionary mapping the output index to its tensor
+		invocations: Number of invokes
+	"""
+
+	latency = 0.0
+
+	def __init__(self, model_path=None, num_threads=None, **kwargs):
+		self.input = np.zeros((1, INPUT_SIZE, INPUT_SIZE, 3), dtype=np.uint8)
+		self.outputs = {1: np.zeros((1, MAX_DETECTIONS, 4), dtype=np.float32),
+						2: np.zeros((1, MAX_DETECTIONS), dtype=np.float32),
+						3: np.zeros((1, MAX_DETECTIONS), dtype=np.float32)}
+		self.invocations = 0
+
+	def allocate_tensors(self):
+		pass
+
+	def get_input_details(self):
+		return [{"index": 0, "shape": np.array(self.input.shape), "dtype": np.uint8}]
+
+	def get_output_details(self):
+		return [{"index": index} for index in self.outputs]
+
+	def tensor(self, index):
+		return lambda: self.input
+
+	def set_tensor(self, index, value):
+		self.input[...] = value
+
+	def get_tensor(self, index):
+		return self.outputs[index]
+
+	def invoke(self):
+		time_start = time.perf_counter()
+		self.invocations += 1
+		boxes, classes, scores = (self.outputs[index][0] for index in (1, 2, 3))
+		boxes[:] = 0
+		classes[:] = 0
+		scores[:] = 0
+
+		mask = (self.input[0, :, :, 0] > 200).astype(np.uint8)
+		count, _, stats, _ = cv2.connectedComponentsWithStats(mask, connectivity=4)
+		for index, (x, y, width, height, area) in enumerate(stats[1:MAX_DETECTIONS + 1]):
+			boxes[index] = (y, x, y + height, x + width)
+			classes[index] = CAR
+			scores[index] = 0.9
+		boxes /= INPUT_SIZE
+
+		remaining = self.latency - (time.perf_counter() - time_start)
+		if remaining > 0:
+			time.sleep(remaining)
+
+
+class StubRequest:
+	""" Stand-in for a Picamera2 capture request """
+
+	def __init__(self, frame, time_stamp):
+		self.frame = frame
+		self.time_stamp = time_stamp
+
+	def make_array(self, name):
+		return self.frame
+
+	def get_metadata(self):
+		return {"SensorTimestamp": int(self.time_stamp * 1e9)}
+
+	def release(self):
+		pass
+
+
+class StubPicamera2:
+	""" Stand-in for Picamera2 playing a video
+
+	Frames are returned as fast as they are asked for, or at the frame
+	rate of the video in real time mode. Once the video has ended every
+	capture returns None.
+
+	Attributes:
+		video_path: Path of the video played
+		realtime: Condition to pace the frames at the frame rate
+		video: Video Capture of the video
+		fps: Frames per second of the video
+		frame_index: Index of the next frame
+		time_start: Time the camera was started at
+	"""
+
+	video_path = None
+	realtime = False
+
+	def __init__(self, camera_num=0):
+		self.preview_configuration = types.SimpleNamespace(main=types.SimpleNamespace(size=None, format=None),
+														   controls=types.SimpleNamespace(FrameRate=None),
+														   align=lambda: None)
+		self.video = None
+		self.fps = 25.0
+		self.frame_index = 0
+		self.time_start = None
+
+	def configure(self, mode):
+		pass
+
+	def start(self):
+		self.video = cv2.VideoCapture(self.video_path)
+		self.fps = self.video.get(cv2.CAP_PROP_FPS) or 25.0
+		self.time_start = time.perf_counter()
+
+	def stop(self):
+		if self.video is not None:
+			self.video.release()
+
+	def capture_request(self):
+		status, frame = self.video.read()
+		if not status:
+			return StubRequest(None, self.frame_index / self.fps)
+		time_stamp = self.frame_index / self.fps
+		self.frame_index += 1
+		if self.realtime:
+			delay = self.time_start + time_stamp - time.perf_counter()
+			if delay > 0:
+				time.sleep(delay)
+
+		return StubRequest(frame, time_stamp)
+
+	def capture_array(self):
+		return self.capture_request().make_array("main")
+
+
+class StubCursor:
+	""" Stand-in for a pymysql cursor, executes nothing """
+
+	def __enter__(self):
+		return self
+
+	def __exit__(self, *args):
+		return False
+
+	def executemany(self, statement, rows):
+		return len(rows)
+
+
+class StubConnection:
+	""" Stand-in for a pymysql connection, inserts nothing """
+
+	def cursor(self):
+		return StubCursor()
+
+	def commit(self):
+		pass
+
+	def rollback(self):
+		pass
+
+	def ping(self, reconnect=False):
+		pass
+
+	def close(self):
+		pass
+
+
+def install(latency=0.0, video_path=None, realtime=False):
+	""" Put the stand-ins in place of tflite_runtime and picamera2
+
+	Must be called before helpers is imported.
+
+	Args:
+		latency: Seconds every invoke takes
+		video_path: Path of the video the camera plays
+		realtime: Condition to pace the camera at the frame rate
+	"""
+	StubInterpreter.latency = latency
+	StubPicamera2.video_path = video_path
+	StubPicamera2.realtime = realtime
+
+	tflite_runtime = types.ModuleType("tflite_runtime")
+	interpreter = types.ModuleType("tflite_runtime.interpreter")
+	interpreter.Interpreter = StubInterpreter
+	tflite_runtime.interpreter = interpreter
+	picamera2 = types.ModuleType("picamera2")
+	picamera2.Picamera2 = StubPicamera2
+
+	sys.modules["tflite_runtime"] = tflite_runtime
+	sys.modules["tflite_runtime.interpreter"] = interpreter
+	sys.modules["picamera2"] = picamera2
@@ -0,0 +1,147 @@
+import cv2
+import numpy as np
+
+BACKGROUND = 60 # Gray level of the road
+VEHICLE = 255 # Gray level of the vehicles
+
+
+def make_vehicles(count=12, duration=20.0, lanes=3, min_speed=150.0, max_speed=450.0, seed=0):
+	""" Make vehicles entering the road at random times and speeds
+
+	Vehicles of a lane enter at least 2 seconds apart, so they never
+	overlap.
+
+	Args:
+		count: Number of vehicles
+		duration: Seconds of video the vehicles enter in
+		lanes: Number of lanes
+		min_speed: Lowest speed in pixels per second
+		max_speed: Highest speed in pixels per second
+		seed: Seed of the random generator
+
+	Returns:
+		A list of dictionaries with the lane, start time in seconds and
+		speed in pixels per second of every vehicle
+	"""
+	generator = np.random.default_rng(seed)
+	vehicles = []
+	for index in range(count):
+		lane = index % lanes
+		start = (index // lanes) * max(duration / max(count // lanes, 1), 2.0) + generator.uniform(0, 1)
+		speed = generator.uniform(min_speed, max_speed)
+		vehicles.append({"lane": lane, "start": round(start, 3), "speed": round(speed, 1)})
+
+	return vehicles
+
+
+def get_boxes(vehicles, time_stamp, width, height, lanes=3, size=(0.5, 40)):
+	""" Get the boxes of the vehicles on the road at a time
+
+	Args:
+		vehicles: A list of vehicles from make_vehicles
+		time_stamp: Time in seconds
+		width: Width of the frame
+		height: Height of the frame
+		lanes: Number of lanes
+		size: Width of a vehicle as a share of the lane and its height
+			  in pixels
+
+	Returns:
+		A list of (index, box) of the vehicles on the road, each box is
+		(x1, y1, x2, y2) in pixels
+	"""
+	lane_width = width / lanes
+	box_width = round(lane_width * size[0])
+	boxes = []
+	for index, vehicle in enumerate(vehicles):
+		min_y = round(vehicle["speed"] * (time_stamp - vehicle["start"]))
+		if time_stamp < vehicle["start"] or min_y + size[1] > height:
+			continue
+		min_x = round((vehicle["lane"] + 0.5) * lane_width - box_width / 2)
+		boxes.append((index, (min_x, min_y, min_x + box_width, min_y + size[1])))
+
+	return boxes
+
+
+def generate_video(path, vehicles, width=360, height=640, fps=25.0, duration=22.0, lanes=3):
+	""" Write a video of the vehicles moving down the road
+
+	Args:
+		path: Path of the video, an .avi or .mp4 file
+		vehicles: A list of vehicles from make_vehicles
+		width: Width of the frames
+		height: Height of the frames
+		fps: Frames per second
+		duration: Seconds of video
+		lanes: Number of lanes
+
+	Returns:
+		Number of frames written
+	"""
+	fourcc = cv2.VideoWriter_fourcc(*("MJPG" if path.endswith(".avi") else "mp4v"))
+	video = cv2.VideoWriter(path, fourcc, fps, (width, height))
+	if not video.isOpened():
+		raise IOError(f"Unable to write {path}")
+
+	frame = np.empty((height, width, 3), dtype=np.uint8)
+	frame_count = round(duration * fps)
+	for index in range(frame_count):
+		frame[:] = BACKGROUND
+		for _, (min_x, min_y, max_x, max_y) in get_boxes(vehicles, index / fps, width, height, lanes):
+			frame[min_y:max_y, min_x:max_x] = VEHICLE
+		video.write(frame)
+	video.release()
+
+	return frame_count
+
+
+def find_vehicle(vehicles, x, time_stamp, width, lanes=3):
+	""" Find the vehicle a measurement belongs to
+
+	Args:
+		vehicles: A list of vehicles from make_vehicles
+		x: X coordinate of the middle of the measured box
+		time_stamp: Time of the measurement in seconds
+		width: Width of the frame
+		lanes: Number of lanes
+
+	Returns:
+		Index of the vehicle in its lane that entered last before the
+		measurement, None if there is none
+	"""
+	lane = min(int(x / (width / lanes)), lanes - 1)
+	candidates = [(vehicle["start"], index) for index, vehicle in enumerate(vehicles)
+				  if vehicle["lane"] == lane and vehicle["start"] <= time_stamp]
+
+	return max(candidates)[1] if candidates else None
+
+
+def expected_speed_model_one(vehicle, lines, distance=30):
+	""" Get the speed model one should measure for a vehicle
+
+	Args:
+		vehicle: A vehicle from make_vehicles
+		lines: Y coordinates of the measurement lines
+		distance: Meters between the measurement lines
+
+	Returns:
+		Speed in km/hr
+	"""
+	return vehicle["speed"] * distance / (lines[1] - lines[0]) * 3.6
+
+
+def expected_speed_model_two(vehicle, fps, detect_every=1, window=3):
+	""" Get the speed model two should measure for a vehicle
+
+	Model two reports the pixels moved over a full window of detections
+
+	Args:
+		vehicle: A vehicle from make_vehicles
+		fps: Frames per second of the video
+		detect_every: Frames between two detections
+		window: Detections in the window of the Tracker, its fps
+
+	Returns:
+		Speed in the units of model two
+	"""
+	return vehicle["speed"] * detect_every / fps * (window - 1) * 3.6
@@ -0,0 +1,301 @@
+import json
+import time
+import argparse
+import platform
+import importlib
+import tracemalloc
+import numpy as np
+from datetime import datetime
+
+from benchmark import stubs
+stubs.install() # Before helpers is imported
+from helpers import measurement_lines
+from helpers import calculate_speed_fixed_distance_measure_time, calculate_speed_fixed_time_measure_distance
+from tracker import Tracker
+
+LANE_WIDTH = 120 # Pixels between the middles of two lanes
+SPACING = 200 # Pixels between two objects of a lane
+OBJECTS_PER_LANE = 10
+BOX_SIZE = (50, 40) # Width and height of the boxes in pixels
+
+
+def make_trajectories(count, seed=0, min_speed=150.0, max_speed=450.0):
+	""" Make objects moving down their lanes at constant speeds
+
+	Objects leave the bottom of the frame and come back at the top, the
+	Tracker sees them as new objects, so tracks keep being created and
+	deleted over long runs.
+
+	Args:
+		count: Number of simultaneous objects
+		seed: Seed of the random generator
+		min_speed: Lowest speed in pixels per second
+		max_speed: Highest speed in pixels per second
+
+	Returns:
+		A dictionary with the x, start y and speed of every object and the
+		width and height of the frame
+	"""
+	generator = np.random.default_rng(seed)
+	lanes = -(-count // OBJECTS_PER_LANE)
+	index = np.arange(count)
+	return {"x": (index // OBJECTS_PER_LANE + 0.5) * LANE_WIDTH,
+			"y": (index % OBJECTS_PER_LANE) * SPACING + generator.uniform(0, SPACING / 2, count),
+			"speed": generator.uniform(min_speed, max_speed, count),
+			"jitter": generator,
+			"width": lanes * LANE_WIDTH,
+			"height": OBJECTS_PER_LANE * SPACING}
+
+
+def get_boxes(trajectories, frame_index, fps):
+	""" Get the boxes of the objects in a frame
+
+	Args:
+		trajectories: Trajectories from make_trajectories
+		frame_index: Index of the frame
+		fps: Frames per second
+
+	Returns:
+		Array of shape (N, 4), each row is (x1, y1, x2, y2)
+	"""
+	count = len(trajectories["x"])
+	mid_y = (trajectories["y"] + trajectories["speed"] * frame_index / fps) % trajectories["height"]
+	mid_x = trajectories["x"] + trajectories["jitter"].integers(-1, 2, count)
+	mid_y = mid_y + trajectories["jitter"].integers(-1, 2, count)
+
+	return np.column_stack((mid_x - BOX_SIZE[0] / 2, mid_y - BOX_SIZE[1] / 2,
+							mid_x + BOX_SIZE[0] / 2, mid_y + BOX_SIZE[1] / 2))
+
+
+def batch_step(tracker, boxes, time_stamp):
+	""" Track a frame the way the speed scripts do
+
+	All the boxes are matched with Tracker.update, then the speed of
+	every detection is calculated from its id.
+
+	Args:
+		tracker: Tracker, or an engine with the same interface
+		boxes: Array of shape (N, 4)
+		time_stamp: Capture time of the frame in seconds
+	"""
+	ids = tracker.update(boxes, time_stamp)
+	for box, id_ in zip(boxes, ids):
+		if tracker.model_one:
+			calculate_speed_fixed_distance_measure_time(None, box, None, None, (0, 0, 0), tracker, id_)
+		else:
+			calculate_speed_fixed_time_measure_distance(None, box, None, None, (0, 0, 0), tracker, id_)
+
+
+def per_detection_step(tracker, boxes, time_stamp):
+	""" Track a frame one detection at a time
+
+	Every box is matched on its own with Tracker.assign_id, as the
+	calculate_speed_* helpers do when no id is given. The frame is
+	advanced with Tracker.predict, so missed objects are still aged.
+
+	Args:
+		tracker: Tracker
+		boxes: Array of shape (N, 4)
+		time_stamp: Capture time of the frame in seconds
+	"""
+	tracker.predict()
+	for box in boxes:
+		if tracker.model_one:
+			id_ = tracker.assign_id(box[:2], box[2:], time_stamp)
+			calculate_speed_fixed_distance_measure_time(None, box, None, None, (0, 0, 0), tracker, id_)
+		else:
+			calculate_speed_fixed_time_measure_distance(None, box, None, None, (0, 0, 0), tracker)
+
+
+ENGINES = {"batch": (Tracker, batch_step), "per_detection": (Tracker, per_detection_step)}
+
+
+def load_engine(name):
+	""" Get the factory and step of an engine
+
+	Args:
+		name: batch, per_detection or module:attribute of a class or
+			  function making an engine with the interface of Tracker,
+			  it is run like batch
+
+	Returns:
+		The factory, called like Tracker, and the step of the engine
+	"""
+	if name in ENGINES:
+		return ENGINES[name]
+	module_name, _, attribute = name.partition(":")
+	if not attribute:
+		raise ValueError(f"Unknown engine {name}, expected one of {list(ENGINES)} or module:attribute")
+
+	return getattr(importlib.import_module(module_name), attribute), batch_step
+
+
+def make_tracker(factory, model_one, trajectories, fps):
+	""" Make a tracker for the trajectories
+
+	Args:
+		factory: Factory of the engine
+		model_one: Condition to measure speed with model one
+		trajectories: Trajectories from make_trajectories
+		fps: Frames per second
+
+	Returns:
+		The tracker
+	"""
+	if model_one:
+		return factory(model_one=True, lines=measurement_lines(trajectories["height"]))
+
+	return factory(model_one=False, fps=max(int(fps), 1))
+
+
+def time_frames(step, tracker, trajectories, fps, frames, warmup):
+	""" Measure the seconds every frame takes
+
+	Args:
+		step: Step of the engine
+		tracker: Fresh tracker
+		trajectories: Trajectories from make_trajectories
+		fps: Frames per second
+		frames: Number of frames measured
+		warmup: Number of frames run first
+
+	Returns:
+		Array of the seconds of the measured frames
+	"""
+	seconds = np.empty(frames)
+	for frame_index in range(warmup + frames):
+		boxes = get_boxes(trajectories, frame_index, fps)
+		time_start = time.perf_counter()
+		step(tracker, boxes, frame_index / fps)
+		if frame_index >= warmup:
+			seconds[frame_index - warmup] = time.perf_counter() - time_start
+
+	return seconds
+
+
+def trace_frames(step, tracker, trajectories, fps, frames, warmup):
+	""" Measure the memory every frame allocates
+
+	Tracing slows Python down, so it is measured apart from the time.
+
+	Args:
+		step: Step of the engine
+		tracker: Fresh tracker
+		trajectories: Trajectories from make_trajectories
+		fps: Frames per second
+		frames: Number of frames measured
+		warmup: Number of frames run first
+
+	Returns:
+		Array of the peak bytes allocated in every measured frame, the
+		bytes still allocated after the run minus those after the warmup
+		and the number of tracks at the end
+	"""
+	allocated = np.empty(frames, dtype=np.int64)
+	tracemalloc.start()
+	try:
+		for frame_index in range(warmup + frames):
+			boxes = get_boxes(trajectories, frame_index, fps)
+			if frame_index == warmup:
+				start_memory = tracemalloc.get_traced_memory()[0]
+			tracemalloc.reset_peak()
+			before = tracemalloc.get_traced_memory()[0]
+			step(tracker, boxes, frame_index / fps)
+			if frame_index >= warmup:
+				allocated[frame_index - warmup] = tracemalloc.get_traced_memory()[1] - before
+		growth = tracemalloc.get_traced_memory()[0] - start_memory
+	finally:
+		tracemalloc.stop()
+
+	return allocated, growth, len(tracker.tracks)
+
+
+def run_case(engine, model_one, count, fps, frames, warmup, seed):
+	""" Benchmark an engine on a number of objects at a frame rate
+
+	Args:
+		engine: Name of the engine
+		model_one: Condition to measure speed with model one
+		count: Number of simultaneous objects
+		fps: Frames per second
+		frames: Number of frames measured
+		warmup: Number of frames run first
+		seed: Seed of the trajectories
+
+	Returns:
+		A dictionary of the time and memory of the frames
+	"""
+	factory, step = load_engine(engine)
+	trajectories = make_trajectories(count, seed)
+	seconds = time_frames(step, make_tracker(factory, model_one, trajectories, fps), trajectories, fps,
+						  frames, warmup)
+	trajectories = make_trajectories(count, seed)
+	allocated, growth, tracks = trace_frames(step, make_tracker(factory, model_one, trajectories, fps),
+											 trajectories, fps, frames, warmup)
+
+	return {"engine": engine, "model": "one" if model_one else "two", "objects": count, "fps": fps,
+			"frames": frames,
+			"mean_ms": 1000 * float(seconds.mean()),
+			"p50_ms": 1000 * float(np.percentile(seconds, 50)),
+			"p99_ms": 1000 * float(np.percentile(seconds, 99)),
+			"us_per_object": 1e6 * float(seconds.mean()) / count,
+			"allocated_kb_per_frame": float(allocated.mean()) / 1024,
+			"max_allocated_kb": float(allocated.max()) / 1024,
+			"memory_growth_kb": growth / 1024,
+			"tracks": tracks}
+
+
+def parse_args():
+	""" Parse the command line arguments
+
+	Returns:
+		Namespace of the arguments
+	"""
+	parser = argparse.ArgumentParser(description="Benchmark the Tracker on simulated trajectories")
+	parser.add_argument("-o", "--output", default=None, help="JSON file the results are saved to")
+	parser.add_argument("--engines", nargs="+", default=["batch", "per_detection"],
+						help="Engines to compare, the first is the baseline: batch, per_detection "
+							 "or module:attribute of a class with the interface of Tracker")
+	parser.add_argument("--models", nargs="+", choices=["one", "two"], default=["one", "two"],
+						help="Speed models to run")
+	parser.add_argument("--objects", type=int, nargs="+", default=[1, 10, 50, 100, 500],
+						help="Numbers of simultaneous objects")
+	parser.add_argument("--fps", type=float, nargs="+", default=[5.0, 25.0], help="Frame rates")
+	parser.add_argument("--frames", type=int, default=2000, help="Frames measured per case")
+	parser.add_argument("--warmup", type=int, default=200, help="Frames run before measuring")
+	parser.add_argument("--seed", type=int, default=0, help="Seed of the trajectories")
+
+	return parser.parse_args()
+
+
+def main():
+	args = parse_args()
+	results = {"created_at": datetime.now().isoformat(timespec="seconds"),
+			   "platform": {"python": platform.python_version(), "machine": platform.machine(),
+							"system": platform.system(), "processor": platform.processor()},
+			   "config": {"engines": args.engines, "frames": args.frames, "warmup": args.warmup, "seed": args.seed},
+			   "cases": []}
+
+	print(f"{'engine':<16}{'model':<7}{'objects':>8}{'fps':>6}{'mean ms':>10}{'p99 ms':>10}"
+		  f"{'KB/frame':>10}{'growth KB':>11}{'speedup':>9}")
+	for model in args.models:
+		for fps in args.fps:
+			for count in args.objects:
+				baseline = None
+				for engine in args.engines:
+					case = run_case(engine, model == "one", count, fps, args.frames, args.warmup, args.seed)
+					baseline = baseline or case["mean_ms"]
+					case["speedup"] = baseline / case["mean_ms"]
+					results["cases"].append(case)
+					print(f"{engine:<16}{model:<7}{count:>8}{fps:>6g}{case['mean_ms']:>10.3f}{case['p99_ms']:>10.3f}"
+						  f"{case['allocated_kb_per_frame']:>10.1f}{case['memory_growth_kb']:>11.1f}"
+						  f"{case['speedup']:>8.2f}x")
+
+	if args.output:
+		with open(args.output, "w") as f:
+			json.dump(results, f, indent=2)
+		print(f"Saved {args.output}")
+
+
+if __name__ == "__main__":
+	main()
@@ -1,8 +1,9 @@
 import cv2
 import numpy as np
-from helpers import prepare_interpreter, process_image, load_labels, add_text_to_image
-from helpers import generate_colors, add_label, get_tensor_output, add_id
+from helpers import prepare_interpreter, Preprocessor, MotionGate, load_labels
+from helpers import generate_colors, get_tensor_output, get_class_mask, filter_detections, measurement_lines
 from tracker import Tracker
+from renderer import Renderer
 
 # Declare Parameters
 VIDEO_PATH = "veh2.mp4"
@@ -10,11 +11,15 @@ LABEL_PATH = "labelmap.txt"
 MODEL = "efficientdet_lite0.tflite"
 NUM_THREADS = 4
 THRESHOLD = 0.3
+MAX_DETECTIONS = 25
 LABELS_TO_TRACK = ["car", "motorcycle", "bus", "truck"]
+DETECT_EVERY = 3 # frames
+ROI_MARGIN = 0.15 # Share of frame height around the lines run through the model, None for all
+MOTION_THRESHOLD = 0.01 # Share of changed pixels needed to run the model
+DISPLAY = True # Draw and show the frames, False for headless runs
 
 # Text Properties
 TEXT_LOCATION = (20, 120)
-FONT_STYLE = cv2.FONT_HERSHEY_SIMPLEX
 FONT_SIZE = 2
 FONT_THICKNESS = 4
 FONT_COLOR = [int(i) for i in generate_colors(1)[0]]
@@ -22,10 +27,14 @@ FONT_COLOR = [int(i) for i in generate_colors(1)[0]]
 # Get interpreter info
 interpreter_info = prepare_interpreter(MODEL, NUM_THREADS)
 interpreter = interpreter_info["Interpreter"]
+preprocessor = Preprocessor(interpreter_info, ROI_MARGIN)
+motion_gate = MotionGate(MOTION_THRESHOLD, roi_margin=ROI_MARGIN)
 
 labels = load_labels(LABEL_PATH)
+class_mask = get_class_mask(labels, LABELS_TO_TRACK)
 
 colors = generate_colors(len(labels))
+renderer = Renderer(DISPLAY, lines_color=FONT_COLOR, text_size=FONT_SIZE, text_thickness=FONT_THICKNESS)
 
 # Load Video
 video = cv2.VideoCapture(VIDEO_PATH)
@@ -39,37 +48,39 @@ while True:
 		print("Read operation failed")
 		exit(1)
 		
-#	count += 1 
-#	if count % 3 != 0:
-#		continue
-		
-	input_data, image = process_image(frame, interpreter_info["input_dim"])
-	
-	# Allocate Tensors
-	interpreter.set_tensor(interpreter_info["tensors_index"]["input_tensor_index"], input_data)
-	interpreter.invoke()
-	
-	# Get boxes, classes, scores
-	boxes, classes, scores = get_tensor_output(interpreter_info)
+	image = frame
+	boxes, box_labels, box_colors, marks = [], [], [], []
 	
-	for box, class_, score in zip(boxes, classes[:5], scores[:5]):
-		class_name = labels[int(class_)]
-		if score < THRESHOLD or not (class_name in LABELS_TO_TRACK):
-			continue
+	# Run the detector on every DETECT_EVERY frame with motion, predict in between
+	count += 1
+	if count % DETECT_EVERY != 0 or not motion_gate.has_motion(frame):
+		tracker.predict()
+	else:
+		# Write the frame into the input tensor
+		preprocessor.process(frame)
+		interpreter.invoke()
 		
-		color = [int(i) for i in colors[int(class_)]]
-		add_id(image, box, class_name, score, color, tracker)
-		text = f"Gone Down: {len(tracker.gone_down)}"
-		add_text_to_image(image, text, TEXT_LOCATION, FONT_STYLE,
-						  FONT_SIZE, FONT_COLOR, FONT_THICKNESS)
+		# Get boxes, classes, scores
+		boxes, classes, scores = get_tensor_output(interpreter_info)
+		boxes, classes, scores = filter_detections(preprocessor.to_frame_boxes(boxes), classes, scores,
+												   class_mask, THRESHOLD, image, MAX_DETECTIONS)
 		
-		cv2.imshow("Input", image)
-		print(f"{score} {labels[int(class_)]}")
-	
-	if cv2.waitKey(1) == ord('q'):
+		tracker.set_lines(measurement_lines(image.shape[0]))
+		ids = tracker.update(boxes)
+		
+		box_labels = [f"{labels[class_]} {id_}" for class_, id_ in zip(classes, ids)]
+		box_colors = [[int(i) for i in colors[int(class_)]] for class_ in classes]
+		marks = [id_ in tracker.completed for id_ in ids]
+		for score, class_ in zip(scores, classes):
+			print(f"{score} {labels[int(class_)]}")
+		
+	# Skipped frames are shown too, with the overlay and text only
+	renderer.draw(image, boxes, box_labels, box_colors, marks,
+				  [(f"Gone Down: {tracker.gone_down}", TEXT_LOCATION, FONT_COLOR)])
+	if renderer.present(image):
 		break
 
 
 video.release()
-cv2.destroyAllWindows()
+renderer.close()
 print("All Good")
@@ -2,14 +2,17 @@ import cv2
 import time
 import numpy as np
 from picamera2 import Picamera2
-from helpers import prepare_interpreter, process_image, load_labels, get_tensor_output
+from helpers import prepare_interpreter, Preprocessor, load_labels, get_tensor_output
+from helpers import get_class_mask, filter_detections
 from helpers import generate_colors, add_label, set_camera, add_text_to_image
+from pipeline import Pipeline
 
 # Declare Parameters
 LABEL_PATH = "labelmap.txt"
 MODEL = "efficientdet_lite0.tflite"
 NUM_THREADS = 4
 THRESHOLD = 0.3
+MAX_DETECTIONS = 25
 DISPLAY_HEIGHT = 1280
 DISPLAY_WIDTH = 720
 FRAME_RATE = 25.0
@@ -24,8 +27,10 @@ FONT_COLOR = [int(i) for i in generate_colors(1)[0]]
 # Get interpreter info
 interpreter_info = prepare_interpreter(MODEL, NUM_THREADS)
 interpreter = interpreter_info["Interpreter"]
+preprocessor = Preprocessor(interpreter_info)
 
 labels = load_labels(LABEL_PATH)
+class_mask = get_class_mask(labels)
 colors = generate_colors(len(labels))
 
 # Set Camera
@@ -34,33 +39,48 @@ picam.start()
 
 time_start = time.time()
 fps = 0
-while True:
+
+
+def capture():
+	""" Capture a frame """
 	frame = picam.capture_array()
 	frame = cv2.flip(frame, -1) # Flip Image by 180 degrees
 	
-	input_data, image = process_image(frame, interpreter_info["input_dim"])
+	return {"frame": frame}
 	
-	# Allocate Tensors
-	interpreter.set_tensor(interpreter_info["tensors_index"]["input_tensor_index"], input_data)
+	
+def infer(frame_info):
+	""" Run the detector on the frame """
+	# Write the frame into the input tensor
+	preprocessor.process(frame_info["frame"])
 	interpreter.invoke()
 	
 	# Get boxes, classes, scores
 	boxes, classes, scores = get_tensor_output(interpreter_info)
+	frame_info["output"] = filter_detections(preprocessor.to_frame_boxes(boxes), classes, scores,
+											  class_mask, THRESHOLD, frame_info["frame"], MAX_DETECTIONS)
+	frame_info["image"] = frame_info["frame"]
+	
+	return frame_info
 	
-	for box, class_, score in zip(boxes, classes[:5], scores[:5]):
-		if score < THRESHOLD:
-			continue
+	
+def display(frame_info):
+	""" Label the detected objects and show the frame """
+	global fps, time_start
+	image = frame_info["image"]
+	boxes, classes, scores = frame_info["output"]
+	for box, class_, score in zip(boxes, classes, scores):
+		color = [int(i) for i in colors[class_]]
+		add_label(image, box, labels[class_], score, color)
+		print(f"{score} {labels[class_]}")
 		
-		color = [int(i) for i in colors[int(class_)]]
-		add_label(image, box, labels[int(class_)], score, color)
-		text =  f"{round(fps)} FPS "
-		add_text_to_image(image, text, TEXT_LOCATION, FONT_STYLE, FONT_SIZE,
-					  FONT_COLOR, FONT_THICKNESS)
-		cv2.imshow("Input", image)
-		print(f"{score} {labels[int(class_)]}")
+	text =  f"{round(fps)} FPS "
+	add_text_to_image(image, text, TEXT_LOCATION, FONT_STYLE, FONT_SIZE,
+				  FONT_COLOR, FONT_THICKNESS)
+	cv2.imshow("Input", image)
 	
 	if cv2.waitKey(1) == ord('q'):
-		break
+		pipeline.stop()
 	
 	# Calculate Frames Per Second	
 	time_end = time.time()
@@ -68,4 +88,9 @@ while True:
 	fps = 0.9*fps + 0.1*(1/loop_time)
 	time_start = time.time()
 	
+	
+pipeline = Pipeline([("capture", capture), ("infer", infer),
+					 ("display", display)])
+pipeline.run()
+	
 cv2.destroyAllWindows()
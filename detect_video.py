@@ -1,7 +1,7 @@
 import cv2
 import numpy as np
 from helpers import prepare_interpreter, process_image, load_labels
-from helpers import generate_colors, add_label, get_tensor_output
+from helpers import generate_colors, add_label, get_tensor_output, get_class_mask, filter_detections
 
 # Declare Parameters
 VIDEO_PATH = "veh2.mp4"
@@ -9,12 +9,14 @@ LABEL_PATH = "labelmap.txt"
 MODEL = "efficientdet_lite0.tflite"
 NUM_THREADS = 4
 THRESHOLD = 0.3
+MAX_DETECTIONS = 25
 
 # Get interpreter info
 interpreter_info = prepare_interpreter(MODEL, NUM_THREADS)
 interpreter = interpreter_info["Interpreter"]
 
 labels = load_labels(LABEL_PATH)
+class_mask = get_class_mask(labels)
 colors = generate_colors(len(labels))
 
 # Load Video
@@ -40,15 +42,14 @@ while True:
 	
 	# Get boxes, classes, scores
 	boxes, classes, scores = get_tensor_output(interpreter_info)
+	boxes, classes, scores = filter_detections(boxes, classes, scores, class_mask, THRESHOLD, image,
+											   MAX_DETECTIONS)
 	
-	for box, class_, score in zip(boxes, classes[:5], scores[:5]):
-		if score < THRESHOLD:
-			continue
-		
-		color = [int(i) for i in colors[int(class_)]]
-		add_label(image, box, labels[int(class_)], score, color)
+	for box, class_, score in zip(boxes, classes, scores):
+		color = [int(i) for i in colors[class_]]
+		add_label(image, box, labels[class_], score, color)
 		cv2.imshow("Input", image)
-		print(f"{score} {labels[int(class_)]}")
+		print(f"{score} {labels[class_]}")
 	
 	if cv2.waitKey(1) == ord('q'):
 		break
@@ -0,0 +1,348 @@
+import os
+import stat
+import socket
+import struct
+import argparse
+import socketserver
+import cv2
+import numpy as np
+from helpers import prepare_interpreter, Preprocessor, get_tensor_output
+
+# Declare Parameters
+MODEL = "efficientdet_lite0.tflite"
+NUM_THREADS = 4
+SOCKET_PATH = "/tmp/smart_speed_detector.sock"
+TIMEOUT = 5.0 # Seconds a client waits for the service before running the model itself
+
+# Messages are a header followed by the array data
+IMAGE_HEADER = struct.Struct("!III") # height, width, channels of the uint8 image
+RESULT_HEADER = struct.Struct("!I") # number of detections, then boxes, classes, scores as float32
+ERROR_COUNT = 0xFFFFFFFF # Sent as the number of detections when the image is rejected
+MAX_IMAGE_BYTES = 7680 * 4320 * 4 # Largest image accepted, an 8K BGRA frame
+
+
+def to_bgr(image):
+	""" Convert a gray, BGR or BGRA image to BGR
+
+	Args:
+		image: Loaded image of shape (height, width) or (height, width,
+			   channels)
+
+	Returns:
+		The BGR image, the image itself if it already is
+
+	Raises:
+		ValueError: The image is empty or has an unsupported number of
+					channels
+	"""
+	channels = image.shape[2] if image.ndim == 3 else 1
+	if image.ndim not in (2, 3) or image.size == 0:
+		raise ValueError(f"Unsupported image of shape {image.shape}")
+	if channels == 3:
+		return image
+	if channels == 1:
+		return cv2.cvtColor(image.reshape(image.shape[:2]), cv2.COLOR_GRAY2BGR)
+	if channels == 4:
+		return cv2.cvtColor(image, cv2.COLOR_BGRA2BGR)
+
+	raise ValueError(f"Unsupported image with {channels} channels")
+
+
+class Detector:
+	""" Runs the model on images with an interpreter kept in memory
+
+	Attributes:
+		interpreter_info: Dictionary contains information about interpreter
+		preprocessor: Letterboxes the images into the input tensor
+	"""
+
+	def __init__(self, model_path=MODEL, num_threads=NUM_THREADS):
+		""" Intializes the Detector
+
+		Args:
+			model_path: path to tflite model
+			num_threads: Number of threads used by interpreter
+		"""
+		self.interpreter_info = prepare_interpreter(model_path, num_threads)
+		self.preprocessor = Preprocessor(self.interpreter_info)
+
+	def detect(self, image):
+		""" Run the model on an image
+
+		Args:
+			image: Loaded gray, BGR or BGRA image
+
+		Returns:
+			An array of boxes normalised to the image, each row is
+			(y1, x1, y2, x2), an array of classes and an array of scores
+
+		Raises:
+			ValueError: The image is empty or has an unsupported number of
+						channels
+		"""
+		self.preprocessor.process(to_bgr(image))
+		self.interpreter_info["Interpreter"].invoke()
+		boxes, classes, scores = get_tensor_output(self.interpreter_info)
+
+		return self.preprocessor.to_frame_boxes(boxes), classes, scores
+
+	def close(self):
+		pass
+
+
+class DetectorClient:
+	""" Sends images to a running detector service
+
+	A service that does not answer within the timeout or drops the
+	connection is given up on. The client then runs the detector made by
+	fallback, or raises the error if there is none.
+
+	Attributes:
+		connection: Socket connected to the service, closed once given up on
+		fallback: Function making a local detector, None to raise instead
+		detector: Local detector used once the service is given up on
+	"""
+
+	def __init__(self, socket_path=SOCKET_PATH, timeout=TIMEOUT, fallback=None):
+		""" Intializes the Client
+
+		Args:
+			socket_path: Path of the Unix socket the service listens on
+			timeout: Seconds to wait for the service
+			fallback: Function making a local detector, None to raise
+					  instead
+		"""
+		self.connection = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+		self.connection.settimeout(timeout)
+		try:
+			self.connection.connect(socket_path)
+		except OSError:
+			self.connection.close()
+			raise
+		self.fallback = fallback
+		self.detector = None
+
+	def detect(self, image):
+		""" Run the model of the service on an image
+
+		Args:
+			image: Loaded gray, BGR or BGRA image
+
+		Returns:
+			An array of boxes normalised to the image, each row is
+			(y1, x1, y2, x2), an array of classes and an array of scores
+
+		Raises:
+			ValueError: The service rejected the image
+		"""
+		if self.detector is not None:
+			return self.detector.detect(image)
+
+		try:
+			return self.request(image)
+		except (socket.timeout, ConnectionError) as error:
+			# The service is stuck or gone, the connection is out of step
+			self.connection.close()
+			if self.fallback is None:
+				raise
+			print(f"Detector service unavailable ({error}), loading the model")
+			self.detector = self.fallback()
+
+		return self.detector.detect(image)
+
+	def request(self, image):
+		""" Send an image to the service and receive its detections
+
+		Args:
+			image: Loaded image
+
+		Returns:
+			An array of boxes normalised to the image, each row is
+			(y1, x1, y2, x2), an array of classes and an array of scores
+
+		Raises:
+			ValueError: The image is too large or the service rejected it
+		"""
+		image = np.ascontiguousarray(image, dtype=np.uint8)
+		if image.nbytes > MAX_IMAGE_BYTES:
+			raise ValueError(f"The image of shape {image.shape} is too large for the detector service")
+		height, width = image.shape[:2]
+		channels = image.shape[2] if image.ndim == 3 else 1
+		self.connection.sendall(IMAGE_HEADER.pack(height, width, channels))
+		self.connection.sendall(image.data)
+
+		count, = RESULT_HEADER.unpack(receive(self.connection, RESULT_HEADER.size))
+		if count == ERROR_COUNT:
+			raise ValueError(f"The detector service rejected the image of shape {image.shape}")
+		results = np.frombuffer(receive(self.connection, count * 6 * 4), dtype=np.float32)
+
+		return results[:count * 4].reshape(count, 4), results[count * 4:count * 5], results[count * 5:]
+
+	def close(self):
+		self.connection.close()
+		if self.detector is not None:
+			self.detector.close()
+
+
+def receive(connection, size):
+	""" Receive an exact number of bytes
+
+	Args:
+		connection: Connected socket
+		size: Number of bytes
+
+	Returns:
+		The bytes received
+	"""
+	data = bytearray(size)
+	view = memoryview(data)
+	while size:
+		received = connection.recv_into(view, size)
+		if received == 0:
+			raise ConnectionError("Detector connection closed")
+		view = view[received:]
+		size -= received
+
+	return data
+
+
+def connect_to_detector(socket_path=SOCKET_PATH, timeout=TIMEOUT, fallback=None):
+	""" Connect to the detector service if it is running
+
+	Args:
+		socket_path: Path of the Unix socket the service listens on
+		timeout: Seconds to wait for the service
+		fallback: Function making a local detector if the service stops
+				  answering, None to raise instead
+
+	Returns:
+		A Detector Client, None if the service is not running
+	"""
+	if not os.path.exists(socket_path):
+		return None
+	try:
+		return DetectorClient(socket_path, timeout, fallback)
+	except OSError:
+		return None
+
+
+def get_detector(model_path=MODEL, num_threads=NUM_THREADS, socket_path=SOCKET_PATH):
+	""" Get the detector service if it is running, otherwise load the model
+
+	Args:
+		model_path: path to tflite model
+		num_threads: Number of threads used by interpreter
+		socket_path: Path of the Unix socket the service listens on
+
+	Returns:
+		A Detector Client or a Detector
+	"""
+	detector = connect_to_detector(socket_path, fallback=lambda: Detector(model_path, num_threads))
+	if detector is None:
+		detector = Detector(model_path, num_threads)
+
+	return detector
+
+
+class DetectorHandler(socketserver.BaseRequestHandler):
+	""" Answers the images of a client until it disconnects
+
+	An image the detector fails on is answered with ERROR_COUNT. A header
+	larger than MAX_IMAGE_BYTES is answered with ERROR_COUNT before its
+	data is read, and the connection is closed.
+	"""
+
+	def handle(self):
+		detector = self.server.detector
+		while True:
+			try:
+				header = receive(self.request, IMAGE_HEADER.size)
+			except ConnectionError:
+				return
+			height, width, channels = IMAGE_HEADER.unpack(header)
+			if height * width * channels > MAX_IMAGE_BYTES:
+				# The data is left unread, so the connection is out of step
+				print(f"Rejected an image of {height}x{width}x{channels}")
+				self.request.sendall(RESULT_HEADER.pack(ERROR_COUNT))
+				return
+			try:
+				data = receive(self.request, height * width * channels)
+			except ConnectionError:
+				return
+
+			try:
+				image = np.frombuffer(data, dtype=np.uint8)
+				image = image.reshape((height, width, channels) if channels > 1 else (height, width))
+				boxes, classes, scores = detector.detect(image)
+				results = np.concatenate((np.asarray(boxes, dtype=np.float32).ravel(),
+										  np.asarray(classes, dtype=np.float32).ravel(),
+										  np.asarray(scores, dtype=np.float32).ravel()))
+			except Exception as error:
+				print(f"Rejected an image: {error}")
+				self.request.sendall(RESULT_HEADER.pack(ERROR_COUNT))
+				continue
+			self.request.sendall(RESULT_HEADER.pack(len(scores)) + results.tobytes())
+
+
+def serve(model_path=MODEL, num_threads=NUM_THREADS, socket_path=SOCKET_PATH):
+	""" Serve the model on a Unix socket until interrupted
+
+	Clients are answered one at a time, so the interpreter is only ever
+	used by one request.
+
+	Args:
+		model_path: path to tflite model
+		num_threads: Number of threads used by interpreter
+		socket_path: Path of the Unix socket to listen on
+
+	Raises:
+		OSError: A service is already listening on the socket, or the
+				 path is not a socket
+	"""
+	remove_stale_socket(socket_path)
+
+	with socketserver.UnixStreamServer(socket_path, DetectorHandler) as server:
+		server.detector = Detector(model_path, num_threads)
+		print(f"Serving {model_path} on {socket_path}")
+		try:
+			server.serve_forever()
+		except KeyboardInterrupt:
+			pass
+		finally:
+			os.remove(socket_path)
+
+
+def remove_stale_socket(socket_path):
+	""" Remove a socket left behind by a service that is not running
+
+	Args:
+		socket_path: Path of the Unix socket
+
+	Raises:
+		OSError: A service is listening on the socket, or the path is not
+				 a socket
+	"""
+	if not os.path.exists(socket_path):
+		return
+	if not stat.S_ISSOCK(os.stat(socket_path).st_mode):
+		raise OSError(f"{socket_path} exists and is not a socket")
+
+	probe = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+	try:
+		probe.connect(socket_path)
+	except ConnectionRefusedError:
+		os.remove(socket_path)
+		return
+	finally:
+		probe.close()
+
+	raise OSError(f"A detector service is already listening on {socket_path}")
+
+
+if __name__ == "__main__":
+	parser = argparse.ArgumentParser(description="Keep the detector loaded and serve it on a Unix socket")
+	parser.add_argument("--model", default=MODEL, help="Path to the tflite model")
+	parser.add_argument("--threads", type=int, default=NUM_THREADS, help="Threads used by the interpreter")
+	parser.add_argument("--socket", default=SOCKET_PATH, help="Path of the Unix socket")
+	args = parser.parse_args()
+	serve(args.model, args.threads, args.socket)
@@ -3,7 +3,10 @@ import time
 import pymysql
 import numpy as np
 import tflite_runtime.interpreter as tflite
-from picamera2 import Picamera2
+try:
+	from picamera2 import Picamera2
+except ImportError: # Only the live scripts need the camera
+	Picamera2 = None
 from collections import defaultdict, deque
 
 
@@ -75,6 +78,67 @@ def get_tensor_output(interpreter_info):
 	return boxes, classes, scores
 	
 
+def get_class_mask(labels, labels_to_track=None):
+	""" Build a mask of the classes to keep
+	
+	Args:
+		labels: List of the labels
+		labels_to_track: Labels to keep, every label if None
+		
+	Returns:
+		A boolean array, True for every class index to keep
+	"""
+	if labels_to_track is None:
+		return np.ones(len(labels), dtype=bool)
+		
+	labels_to_track = set(labels_to_track)
+	
+	return np.array([label in labels_to_track for label in labels], dtype=bool)
+	
+	
+def filter_detections(boxes, classes, scores, class_mask, threshold, image, max_detections=None):
+	""" Keep the detections above the threshold of the classes to keep
+	
+	Args:
+		boxes: Array of boxes, each row is (y1, x1, y2, x2) normalised
+		classes: Array of the class index of every box
+		scores: Array of the score of every box
+		class_mask: Mask of the classes to keep from get_class_mask
+		threshold: Minimum score kept
+		image: Loaded image the boxes are mapped onto
+		max_detections: Maximum number of detections kept, None for all
+		
+	Returns:
+		Array of shape (N, 4) of pixel boxes, each row is (x1, y1, x2, y2),
+		array of the N classes and array of the N scores
+	"""
+	classes = np.asarray(classes).astype(int)
+	scores = np.asarray(scores)
+	known = (classes >= 0) & (classes < len(class_mask))
+	keep = np.flatnonzero(known & (scores >= threshold) & class_mask[np.where(known, classes, 0)])
+	if max_detections is not None and len(keep) > max_detections:
+		keep = keep[np.argsort(-scores[keep], kind="stable")[:max_detections]]
+		
+	return get_pixel_boxes(np.asarray(boxes)[keep], image), classes[keep], scores[keep]
+	
+
+def get_pixel_boxes(boxes, image):
+	""" Convert normalised boxes to pixel coordinates of the image
+	
+	Args:
+		boxes: Array of boxes, each row is (y1, x1, y2, x2) normalised
+		image: Loaded image
+		
+	Returns:
+		Array of shape (N, 4), each row is (x1, y1, x2, y2) in pixels
+	"""
+	img_height, img_width = image.shape[:2]
+	boxes = np.asarray(boxes, dtype=float).reshape(-1, 4)
+	scale = np.array((img_width, img_height, img_width, img_height))
+	
+	return np.round(boxes[:, [1, 0, 3, 2]] * scale).astype(int)
+	
+
 def add_pad(image):
 	""" Add pad and create border
 	
@@ -120,6 +184,224 @@ def process_image(image, input_dimension):
 	return input_data, img_padded
 	
 	
+class Preprocessor:
+	""" Letterboxes frames straight into the interpreter's input tensor
+	
+	The letterbox geometry is computed once per frame resolution. Every
+	frame is resized into a preallocated buffer and converted to RGB
+	directly into the input tensor, so no padded copy of the frame is
+	made and nothing is allocated per frame.
+	
+	In region of interest mode only a band around the measurement lines
+	is cropped and letterboxed, so the vehicles in it get more of the
+	model input.
+	
+	Attributes:
+		interpreter_info: Dictionary contains information about interpreter
+		roi_margin: Share of the frame height kept above the first line
+					and below the second line, None for the whole frame
+		roi: Region (x1, y1, x2, y2) of the frame run through the model
+		frame_shape: (height, width) the geometry was computed for
+		scale: Factor the frame is resized by
+		x_offset: Left padding of the resized frame in the input
+		y_offset: Top padding of the resized frame in the input
+		resized: Preallocated buffer holding the resized frame
+	"""
+	
+	def __init__(self, interpreter_info, roi_margin=None):
+		""" Intializes the Preprocessor
+		
+		Args:
+			interpreter_info: Dictionary contains information about interpreter
+			roi_margin: Share of the frame height kept around the
+						measurement lines, None for the whole frame
+		"""
+		self.interpreter_info = interpreter_info
+		self.roi_margin = roi_margin
+		self.roi = None
+		self.frame_shape = None
+		self.scale = 1
+		self.x_offset = 0
+		self.y_offset = 0
+		self.resized = None
+		
+	def prepare(self, frame_shape):
+		""" Compute the letterbox geometry for a frame resolution
+		
+		Args:
+			frame_shape: Shape of the frame
+		"""
+		frame_shape = tuple(frame_shape[:2])
+		if frame_shape == self.frame_shape:
+			return
+			
+		img_height, img_width = frame_shape
+		if self.roi_margin is None:
+			self.roi = (0, 0, img_width, img_height)
+		else:
+			self.roi = measurement_roi(img_height, img_width, self.roi_margin)
+		roi_width = self.roi[2] - self.roi[0]
+		roi_height = self.roi[3] - self.roi[1]
+		
+		input_width, input_height = self.interpreter_info["input_dim"]
+		self.scale = min(input_width / roi_width, input_height / roi_height)
+		resized_width = max(round(roi_width * self.scale), 1)
+		resized_height = max(round(roi_height * self.scale), 1)
+		self.x_offset = (input_width - resized_width) // 2
+		self.y_offset = (input_height - resized_height) // 2
+		self.resized = np.empty((resized_height, resized_width, 3), dtype=np.uint8)
+		self.frame_shape = frame_shape
+		
+	def process(self, frame, input_tensor=None):
+		""" Letterbox a frame into the input tensor
+		
+		Args:
+			frame: Loaded BGR frame
+			input_tensor: Array of shape (height, width, 3) to write into,
+						  the interpreter's input tensor if None
+		"""
+		self.prepare(frame.shape)
+		if input_tensor is None:
+			interpreter = self.interpreter_info["Interpreter"]
+			input_tensor = interpreter.tensor(self.interpreter_info["tensors_index"]["input_tensor_index"])()[0]
+			
+		min_x, min_y, max_x, max_y = self.roi
+		resized_height, resized_width = self.resized.shape[:2]
+		cv2.resize(frame[min_y:max_y, min_x:max_x], (resized_width, resized_height), dst=self.resized,
+				   interpolation=cv2.INTER_AREA)
+		
+		# Padding
+		input_tensor[:self.y_offset] = 0
+		input_tensor[self.y_offset + resized_height:] = 0
+		input_tensor[:, :self.x_offset] = 0
+		input_tensor[:, self.x_offset + resized_width:] = 0
+		
+		cv2.cvtColor(self.resized, cv2.COLOR_BGR2RGB,
+					 dst=input_tensor[self.y_offset:self.y_offset + resized_height,
+									  self.x_offset:self.x_offset + resized_width])
+		
+	def to_frame_boxes(self, boxes):
+		""" Map boxes from the model input to the frame
+		
+		Args:
+			boxes: Array of boxes normalised to the model input, each
+				   row is (y1, x1, y2, x2)
+				   
+		Returns:
+			Array of boxes normalised to the frame, each row is
+			(y1, x1, y2, x2)
+		"""
+		input_width, input_height = self.interpreter_info["input_dim"]
+		img_height, img_width = self.frame_shape
+		boxes = np.asarray(boxes, dtype=float).reshape(-1, 4)
+		input_size = np.array((input_height, input_width, input_height, input_width))
+		offset = np.array((self.y_offset, self.x_offset, self.y_offset, self.x_offset))
+		roi_origin = np.array((self.roi[1], self.roi[0], self.roi[1], self.roi[0]))
+		frame_size = np.array((img_height, img_width, img_height, img_width))
+		
+		return ((boxes * input_size - offset) / self.scale + roi_origin) / frame_size
+		
+		
+class MotionGate:
+	""" Decides if a frame has enough motion to run the detector on
+	
+	The frame, or the band around the measurement lines, is downsampled
+	to grayscale and compared with a running average background. All
+	buffers are preallocated once per frame resolution.
+	
+	Attributes:
+		threshold: Share of changed pixels needed to report motion
+		pixel_threshold: Change in gray level for a pixel to count
+		width: Width the region is downsampled to
+		learning_rate: Weight of the new frame in the background
+		roi_margin: Share of the frame height kept around the
+					measurement lines, None for the whole frame
+		roi: Region (x1, y1, x2, y2) of the frame that is checked
+		frame_shape: (height, width) the buffers were allocated for
+		small: Downsampled region
+		gray: Grayscale downsampled region
+		background: Running average of the gray region
+		background_gray: Background rounded to gray levels
+		difference: Absolute difference to the background
+		motion: Share of changed pixels in the last frame
+	"""
+	
+	def __init__(self, threshold=0.01, pixel_threshold=25, width=160, learning_rate=0.05,
+				 roi_margin=None):
+		""" Intializes the Motion Gate
+		
+		Args:
+			threshold: Share of changed pixels needed to report motion
+			pixel_threshold: Change in gray level for a pixel to count
+			width: Width the region is downsampled to
+			learning_rate: Weight of the new frame in the background
+			roi_margin: Share of the frame height kept around the
+						measurement lines, None for the whole frame
+		"""
+		self.threshold = threshold
+		self.pixel_threshold = pixel_threshold
+		self.width = width
+		self.learning_rate = learning_rate
+		self.roi_margin = roi_margin
+		self.roi = None
+		self.frame_shape = None
+		self.motion = 0
+		
+	def prepare(self, frame_shape):
+		""" Allocate the buffers for a frame resolution
+		
+		Args:
+			frame_shape: Shape of the frame
+		"""
+		img_height, img_width = frame_shape[:2]
+		if self.roi_margin is None:
+			self.roi = (0, 0, img_width, img_height)
+		else:
+			self.roi = measurement_roi(img_height, img_width, self.roi_margin)
+		roi_width = self.roi[2] - self.roi[0]
+		roi_height = self.roi[3] - self.roi[1]
+		
+		small_width = min(self.width, roi_width)
+		small_height = max(round(roi_height * small_width / roi_width), 1)
+		self.small = np.empty((small_height, small_width, 3), dtype=np.uint8)
+		self.gray = np.empty((small_height, small_width), dtype=np.uint8)
+		self.difference = np.empty((small_height, small_width), dtype=np.uint8)
+		self.background_gray = np.empty((small_height, small_width), dtype=np.uint8)
+		self.background = None
+		self.frame_shape = tuple(frame_shape[:2])
+		
+	def has_motion(self, frame):
+		""" Check the frame for motion and update the background
+		
+		Args:
+			frame: Loaded BGR frame
+			
+		Returns:
+			True if the frame has motion or is the first one, otherwise False
+		"""
+		if tuple(frame.shape[:2]) != self.frame_shape:
+			self.prepare(frame.shape)
+			
+		min_x, min_y, max_x, max_y = self.roi
+		small_height, small_width = self.gray.shape
+		cv2.resize(frame[min_y:max_y, min_x:max_x], (small_width, small_height), dst=self.small,
+				   interpolation=cv2.INTER_AREA)
+		cv2.cvtColor(self.small, cv2.COLOR_BGR2GRAY, dst=self.gray)
+		
+		if self.background is None:
+			self.background = self.gray.astype(np.float32)
+			self.motion = 1
+			return True
+			
+		cv2.convertScaleAbs(self.background, dst=self.background_gray)
+		cv2.absdiff(self.gray, self.background_gray, dst=self.difference)
+		cv2.threshold(self.difference, self.pixel_threshold, 255, cv2.THRESH_BINARY, dst=self.difference)
+		self.motion = cv2.countNonZero(self.difference) / self.difference.size
+		cv2.accumulateWeighted(self.gray, self.background, self.learning_rate)
+		
+		return self.motion >= self.threshold
+		
+		
 def generate_colors(num_of_colors):
 	""" Generate an  array of RGB color
 		
@@ -138,7 +420,7 @@ def add_label(image, box, class_name, score, color):
 	
 	Args:
 		image: Loaded image
-		box: Array of the coordinates of the box
+		box: Pixel coordinates of the box (x1, y1, x2, y2)
 		class_name: Label 
 		score: Model Score
 		color: Color of the label
@@ -148,11 +430,7 @@ def add_label(image, box, class_name, score, color):
 	FONT_THICKNESS = 2
 	FONT_SIZE = 1
 	
-	img_height, img_width = image.shape[:2]
-	min_y = round(box[0] * img_height)
-	min_x = round(box[1] * img_width)
-	max_y = round(box[2] * img_height)
-	max_x = round(box[3] * img_width)
+	min_x, min_y, max_x, max_y = (int(i) for i in box)
 	
 	# Add Bounding Box to object
 	cv2.rectangle(image, (min_x, min_y), (max_x, max_y), color, 2)
@@ -169,16 +447,47 @@ def add_label(image, box, class_name, score, color):
 				font_color, FONT_THICKNESS)
 	 
 	
-def add_id(image, box, class_name, score, color, tracker):
+def measurement_lines(img_height):
+	""" Get the lines vehicles are timed between
+	
+	Args:
+		img_height: Height of the image
+		
+	Returns:
+		First line and second line y coordinates
+	"""
+	return int(img_height//1.6), int(img_height//1.5)
+	
+	
+def measurement_roi(img_height, img_width, margin):
+	""" Get the region around the measurement lines
+	
+	Args:
+		img_height: Height of the image
+		img_width: Width of the image
+		margin: Share of the image height kept above the first line
+				and below the second line
+		
+	Returns:
+		Region (x1, y1, x2, y2) in pixels
+	"""
+	first_line, second_line = measurement_lines(img_height)
+	pad = round(margin * img_height)
+	
+	return 0, max(first_line - pad, 0), img_width, min(second_line + pad, img_height)
+	
+	
+def add_id(image, box, class_name, score, color, tracker, id_=None):
 	""" Assign Id to label
 	
 	Args:
 		image: Loaded image
-		box: Array of the coordinates of the box
+		box: Pixel coordinates of the box (x1, y1, x2, y2)
 		class_name: Label 
 		score: Model Score
 		color: Color of the label
 		tracker: assigns Id to label
+		id_: Object Id from Tracker.update, assigned here if None
 	"""
 	font_color = (255, 255, 255) if sum(color) < 144 * 3 else (0, 0, 0)
 	FONT_STYLE = cv2.FONT_HERSHEY_SIMPLEX
@@ -187,53 +496,53 @@ def add_id(image, box, class_name, score, color, tracker):
 	CIRCLE_RADIUS = 10
 	
 	img_height, img_width = image.shape[:2]
-	min_y = round(box[0] * img_height)
-	min_x = round(box[1] * img_width)
-	max_y = round(box[2] * img_height)
-	max_x = round(box[3] * img_width)
+	min_x, min_y, max_x, max_y = (int(i) for i in box)
 	mid_x, mid_y = ((min_x + max_x)//2, (min_y + max_y)//2)
-	first_line = int(img_height//1.6)
-	second_line = int(img_height//1.5)
+	first_line, second_line = measurement_lines(img_height)
 	
-	id_ = tracker.assign_id((min_x, min_y), (max_x, max_y))
+	if id_ is None:
+		tracker.set_lines((first_line, second_line))
+		id_ = tracker.assign_id((min_x, min_y), (max_x, max_y))
 	
 
 	cv2.line(image, (0, first_line), (img_width, first_line), color, 4)
 	cv2.line(image, (0, second_line), (img_width, second_line), color, 4)
 
-	if first_line < mid_y + CIRCLE_RADIUS and first_line > mid_y - CIRCLE_RADIUS:
-		tracker.populate_going_down(id_)
-	
-	if id_ in tracker.going_down:	
-		if second_line < mid_y + CIRCLE_RADIUS and second_line > mid_y - CIRCLE_RADIUS:
-			tracker.populate_gone_down(id_)
-			cv2.circle(image, (mid_x, mid_y), CIRCLE_RADIUS, color, cv2.FILLED)
-		
-			# Add Label
-			label = f"{class_name} {id_}"
-			labelsize, baseline = cv2.getTextSize(label, FONT_STYLE, FONT_SIZE, FONT_THICKNESS)
-			cv2.rectangle(image,
-						(min_x, min_y + labelsize[1]),
-						(min_x + labelsize[0], min_y - baseline),
-						color, cv2.FILLED)
-			text_location = (min_x, min_y + labelsize[1])
-			cv2.putText(image, label, text_location, FONT_STYLE, FONT_SIZE,
-						font_color, FONT_THICKNESS)
+	if id_ in tracker.completed:
+		cv2.circle(image, (mid_x, mid_y), CIRCLE_RADIUS, color, cv2.FILLED)
+	
+		# Add Label
+		label = f"{class_name} {id_}"
+		labelsize, baseline = cv2.getTextSize(label, FONT_STYLE, FONT_SIZE, FONT_THICKNESS)
+		cv2.rectangle(image,
+					(min_x, min_y + labelsize[1]),
+					(min_x + labelsize[0], min_y - baseline),
+					color, cv2.FILLED)
+		text_location = (min_x, min_y + labelsize[1])
+		cv2.putText(image, label, text_location, FONT_STYLE, FONT_SIZE,
+					font_color, FONT_THICKNESS)
+		
 			
-				
-def calculate_speed_fixed_distance_measure_time(image, box, class_name, score, color, tracker):
+def calculate_speed_fixed_distance_measure_time(image, box, class_name, score, color, tracker, id_=None,
+												time_stamp=None):
 	""" Calculate speed of the moving object based on 
 		measuring the travelling time in a given unit
 		of distance.
 	
 	Args:
-		image: Loaded image
-		box: Array of the coordinates of the box
+		image: Loaded image, None to only calculate the speed when
+			   id_ is given
+		box: Pixel coordinates of the box (x1, y1, x2, y2)
 		class_name: Label 
 		score: Model Score
 		color: Color of the label
 		tracker: assigns Id to label
+		id_: Object Id from Tracker.update, assigned here if None
+		time_stamp: Capture time of the frame in seconds, the current
+					time if None, only used when id_ is None
 	"""
+	if time_stamp is None:
+		time_stamp = time.time()
 	speed = -1
 	font_color = (255, 255, 255) if sum(color) < 144 * 3 else (0, 0, 0)
 	FONT_STYLE = cv2.FONT_HERSHEY_SIMPLEX
@@ -241,59 +550,54 @@ def calculate_speed_fixed_distance_measure_time(image, box, class_name, score, c
 	FONT_SIZE = 1
 	CIRCLE_RADIUS = 10
 	
-	img_height, img_width = image.shape[:2]
-	min_y = round(box[0] * img_height)
-	min_x = round(box[1] * img_width)
-	max_y = round(box[2] * img_height)
-	max_x = round(box[3] * img_width)
+	min_x, min_y, max_x, max_y = (int(i) for i in box)
 	mid_x, mid_y = ((min_x + max_x)//2, (min_y + max_y)//2)
-	first_line = int(img_height//1.6)
-	second_line = int(img_height//1.5)
 	
-	id_ = tracker.assign_id((min_x, min_y), (max_x, max_y))
-	
-
+	if id_ is None:
+		tracker.set_lines(measurement_lines(image.shape[0]))
+		id_ = tracker.assign_id((min_x, min_y), (max_x, max_y), time_stamp)
+		
+	if id_ in tracker.completed:
+		distance = 30 # Meters
+		speed = tracker.calculate_object_speed_in_km_per_hr_model_one(id_, distance, tracker.completed[id_])
+		
+	if image is None:
+		return speed
+		
+	img_height, img_width = image.shape[:2]
+	first_line, second_line = measurement_lines(img_height)
 	cv2.line(image, (0, first_line), (img_width, first_line), color, 4)
 	cv2.line(image, (0, second_line), (img_width, second_line), color, 4)
 
-	if first_line < mid_y + CIRCLE_RADIUS and first_line > mid_y - CIRCLE_RADIUS:
-		tracker.populate_going_down(id_)
-		tracker.populate_object_time_stamp(time.time())
-	
-	if id_ in tracker.going_down:	
-		if second_line < mid_y + CIRCLE_RADIUS and second_line > mid_y - CIRCLE_RADIUS:
-			tracker.populate_gone_down(id_)
-			tracker.populate_object_time_stamp(time.time(), before=False)
-			
-			distance = 30 # Meters
-			speed = tracker.calculate_object_speed_in_km_per_hr_model_one(distance)
-			cv2.circle(image, (mid_x, mid_y), CIRCLE_RADIUS, color, cv2.FILLED)
-		
-			# Add Label
-			label = f"{class_name} {id_} {speed = } km/hr"
-			labelsize, baseline = cv2.getTextSize(label, FONT_STYLE, FONT_SIZE, FONT_THICKNESS)
-			cv2.rectangle(image,
-						(min_x, min_y + labelsize[1]),
-						(min_x + labelsize[0], min_y - baseline),
-						color, cv2.FILLED)
-			text_location = (min_x, min_y + labelsize[1])
-			cv2.putText(image, label, text_location, FONT_STYLE, FONT_SIZE,
-						font_color, FONT_THICKNESS)
-						
+	if id_ in tracker.completed:
+		cv2.circle(image, (mid_x, mid_y), CIRCLE_RADIUS, color, cv2.FILLED)
+	
+		# Add Label
+		label = f"{class_name} {id_} {speed = } km/hr"
+		labelsize, baseline = cv2.getTextSize(label, FONT_STYLE, FONT_SIZE, FONT_THICKNESS)
+		cv2.rectangle(image,
+					(min_x, min_y + labelsize[1]),
+					(min_x + labelsize[0], min_y - baseline),
+					color, cv2.FILLED)
+		text_location = (min_x, min_y + labelsize[1])
+		cv2.putText(image, label, text_location, FONT_STYLE, FONT_SIZE,
+					font_color, FONT_THICKNESS)
+					
 	return speed
 
-def calculate_speed_fixed_time_measure_distance(image, box, class_name, score, color, tracker):
+def calculate_speed_fixed_time_measure_distance(image, box, class_name, score, color, tracker, id_=None):
 	""" Calculate speed of the moving object based on 
 		measuring the moving distance in a given unit
 		of time.
 	
 	Args:
-		image: Loaded image
-		box: Array of the coordinates of the box
+		image: Loaded image, None to only calculate the speed
+		box: Pixel coordinates of the box (x1, y1, x2, y2)
 		class_name: Label 
 		score: Model Score
 		color: Color of the label
 		tracker: assigns Id to label
+		id_: Object Id from Tracker.update, assigned here if None
 	"""
 	speed = -1
 	font_color = (255, 255, 255) if sum(color) < 144 * 3 else (0, 0, 0)
@@ -302,17 +606,11 @@ def calculate_speed_fixed_time_measure_distance(image, box, class_name, score, c
 	FONT_SIZE = 1
 	CIRCLE_RADIUS = 10
 	
-	img_height, img_width = image.shape[:2]
-	min_y = round(box[0] * img_height)
-	min_x = round(box[1] * img_width)
-	max_y = round(box[2] * img_height)
-	max_x = round(box[3] * img_width)
+	min_x, min_y, max_x, max_y = (int(i) for i in box)
 	mid_x, mid_y = ((min_x + max_x)//2, (min_y + max_y)//2)
 	
-	# Add Bounding Box
-	cv2.rectangle(image, (min_x, min_y), (max_x, max_y), color, 2)
-	
-	id_ = tracker.assign_id((min_x, min_y), (max_x, max_y))
+	if id_ is None:
+		id_ = tracker.assign_id((min_x, min_y), (max_x, max_y))
 	tracker.populate_coordinates_y(id_, mid_y)
 	
 	
@@ -321,7 +619,12 @@ def calculate_speed_fixed_time_measure_distance(image, box, class_name, score, c
 	else:
 		speed = tracker.calculate_object_speed_in_km_per_hr_model_two(id_)
 		label = f"{class_name} {id_} {speed} km/hr"
-			
+		
+	if image is None:
+		return speed
+		
+	# Add Bounding Box
+	cv2.rectangle(image, (min_x, min_y), (max_x, max_y), color, 2)
 		
 	# Add Label
 	labelsize, baseline = cv2.getTextSize(label, FONT_STYLE, FONT_SIZE, FONT_THICKNESS)
@@ -333,6 +636,25 @@ def calculate_speed_fixed_time_measure_distance(image, box, class_name, score, c
 						
 	return speed
 	
+def capture_frame(picam):
+	""" Capture a frame with the time it was captured at
+	
+	Args:
+		picam: Camera Object
+		
+	Returns:
+		Frame, capture time in seconds from the sensor time stamp
+	"""
+	request = picam.capture_request()
+	try:
+		frame = request.make_array("main")
+		time_stamp = request.get_metadata()["SensorTimestamp"] / 1e9
+	finally:
+		request.release()
+		
+	return frame, time_stamp
+	
+	
 def set_camera(display_width, display_height, fps):
 	""" Set Camera with configuration
 	
@@ -385,14 +707,34 @@ def connect_to_database(host, user, password, database=None):
 						   database=database)
 						   
 
-def populate_database(cursor, table, speed, date_time):
+def populate_database(cursor, table, speed, date_time, camera="camera_0", lane=None, image=None):
 	""" Populate the database with speed and date
 	
 	Args:
 		Cursor: Database Object to execute SQL statements
 		table: Table in database
 		speed: Speed of trespasser
-		date_time: Date_time Trespassed
+		date_time: Datetime Trespassed
+		camera: Name of the camera that saw the trespasser
+		lane: Lane of the trespasser, None if unknown
+		image: Key of the image of the trespasser, None if there is none
 	"""
-	statement = f"INSERT INTO {table}(speed, trespassed_at) VALUES ({speed}, '{date_time}');"
-	print(cursor.execute(statement))
+	print(insert_violations(cursor, table, [(speed, date_time, camera, lane, image)]))
+
+
+def insert_violations(cursor, table, rows):
+	""" Insert many violations with one parameterised statement
+	
+	Args:
+		cursor: Database Object to execute SQL statements
+		table: Table in database
+		rows: A list of (speed, date_time, camera, lane, image) of the
+			  trespassers, date_time is a datetime, lane may be None and
+			  image is the key of the image in the ImageStore
+		
+	Returns:
+		Number of rows inserted
+	"""
+	statement = f"INSERT INTO {table}(speed, trespassed_at, camera, lane, image) VALUES (%s, %s, %s, %s, %s)"
+	
+	return cursor.executemany(statement, rows)
@@ -0,0 +1,148 @@
+import os
+import uuid
+import cv2
+from app.image_keys import new_key, get_context_key, get_image_path
+
+
+class ImageStore:
+	""" Stores the evidence images of the violations
+
+	Every image gets a unique key of the form YYYY/MM/DD/HHMMSS_ffffff_id.jpg,
+	so images saved in the same second never overwrite each other and no
+	directory holds more than a day of images. An image is written to a
+	temporary file and renamed into place, so a reader never sees a
+	partial image.
+
+	With crop_only, only the box of the vehicle is kept at full
+	resolution, with a downscaled copy of the whole frame saved next to
+	it as the context image.
+
+	Attributes:
+		root: Directory the images are stored under
+		crop_only: Condition to save the vehicle crop and a context image
+				   instead of the full frame
+		crop_margin: Share of the box size added around the crop
+		context_width: Width in pixels of the context image
+		jpeg_quality: Quality of the JPEG images, 0 to 100
+	"""
+
+	def __init__(self, root, crop_only=False, crop_margin=0.2, context_width=320, jpeg_quality=90):
+		""" Intializes the Image Store
+
+		Args:
+			root: Directory the images are stored under
+			crop_only: Condition to save the vehicle crop and a context
+					   image instead of the full frame
+			crop_margin: Share of the box size added around the crop
+			context_width: Width in pixels of the context image
+			jpeg_quality: Quality of the JPEG images, 0 to 100
+		"""
+		self.root = os.path.abspath(root)
+		self.crop_only = crop_only
+		self.crop_margin = crop_margin
+		self.context_width = context_width
+		self.jpeg_quality = jpeg_quality
+
+	def save(self, image, date_time, box=None):
+		""" Save the image of a violation
+
+		Args:
+			image: Loaded BGR image of the violation
+			date_time: Datetime Trespassed
+			box: Pixel coordinates of the vehicle (x1, y1, x2, y2), the
+				 full frame is saved if None
+
+		Returns:
+			Key of the saved image
+
+		Raises:
+			OSError: The image could not be written
+			ValueError: The image could not be encoded
+		"""
+		key = new_key(date_time)
+		if not self.crop_only or box is None:
+			self.write(key, self.encode(image))
+			return key
+
+		height, width = image.shape[:2]
+		context_height = max(round(height * self.context_width / width), 1)
+		context = cv2.resize(image, (self.context_width, context_height), interpolation=cv2.INTER_AREA)
+		self.write(get_context_key(key), self.encode(context))
+		self.write(key, self.encode(self.crop(image, box)))
+
+		return key
+
+	def crop(self, image, box):
+		""" Cut the box of a vehicle and its margin out of an image
+
+		Args:
+			image: Loaded BGR image
+			box: Pixel coordinates of the vehicle (x1, y1, x2, y2)
+
+		Returns:
+			The crop, a view of the image
+		"""
+		height, width = image.shape[:2]
+		min_x, min_y, max_x, max_y = (int(i) for i in box)
+		margin_x = int((max_x - min_x) * self.crop_margin)
+		margin_y = int((max_y - min_y) * self.crop_margin)
+
+		return image[max(min_y - margin_y, 0):min(max_y + margin_y, height),
+					 max(min_x - margin_x, 0):min(max_x + margin_x, width)]
+
+	def encode(self, image):
+		""" Encode an image as a JPEG
+
+		Args:
+			image: Loaded BGR image
+
+		Returns:
+			Bytes of the JPEG
+
+		Raises:
+			ValueError: The image could not be encoded
+		"""
+		status, encoded = (False, None) if image.size == 0 else \
+			cv2.imencode(".jpg", image, [cv2.IMWRITE_JPEG_QUALITY, self.jpeg_quality])
+		if not status:
+			raise ValueError("Unable to encode the image")
+
+		return encoded.tobytes()
+
+	def write(self, key, data):
+		""" Write the bytes of an image atomically
+
+		The bytes are written to a temporary file in the directory of the
+		image and renamed over the image once they are on the disk.
+
+		Args:
+			key: Key of the image
+			data: Bytes of the image
+		"""
+		path = self.get_path(key)
+		os.makedirs(os.path.dirname(path), exist_ok=True)
+		temporary_path = f"{path}.{uuid.uuid4().hex}.tmp"
+		try:
+			with open(temporary_path, "wb") as f:
+				f.write(data)
+				f.flush()
+				os.fsync(f.fileno())
+			os.replace(temporary_path, path)
+		except BaseException:
+			if os.path.exists(temporary_path):
+				os.remove(temporary_path)
+			raise
+
+	def get_path(self, key):
+		""" Get the path of an image
+
+		Args:
+			key: Key of the image
+
+		Returns:
+			Path of the image
+
+		Raises:
+			ValueError: The key points outside the root
+		"""
+		return get_image_path(self.root, key)
@@ -0,0 +1,195 @@
+import os
+import json
+import time
+import threading
+import numpy as np
+from contextlib import contextmanager
+
+# Upper bounds in seconds of the latency buckets, the last one catches the rest
+BUCKETS = (0.0001, 0.0002, 0.0005, 0.001, 0.002, 0.005, 0.01, 0.02, 0.05, 0.1, 0.2, 0.5, 1.0, 2.0, 5.0, float("inf"))
+QUANTILES = (0.5, 0.95, 0.99)
+
+
+class Histogram:
+	""" Counts values into fixed buckets
+
+	Attributes:
+		buckets: Array of the upper bound of every bucket
+		counts: Array of the number of values in every bucket
+		sum: Sum of the values
+		count: Number of values
+	"""
+
+	def __init__(self, buckets=BUCKETS):
+		""" Intializes the Histogram
+
+		Args:
+			buckets: Increasing upper bounds of the buckets, the last one
+					 should be infinity
+		"""
+		self.buckets = np.asarray(buckets, dtype=float)
+		self.counts = np.zeros(len(buckets), dtype=np.int64)
+		self.sum = 0.0
+		self.count = 0
+
+	def observe(self, value):
+		""" Count a value
+
+		Args:
+			value: Value to count
+		"""
+		self.counts[min(np.searchsorted(self.buckets, value), len(self.buckets) - 1)] += 1
+		self.sum += value
+		self.count += 1
+
+	def quantile(self, q):
+		""" Estimate a quantile by interpolating inside its bucket
+
+		Args:
+			q: Quantile between 0 and 1
+
+		Returns:
+			Estimated value, 0 if nothing was counted
+		"""
+		if self.count == 0:
+			return 0.0
+		cumulative = np.cumsum(self.counts)
+		rank = q * self.count
+		index = int(np.searchsorted(cumulative, rank))
+		lower = self.buckets[index - 1] if index > 0 else 0.0
+		upper = self.buckets[index]
+		if np.isinf(upper):
+			return float(lower)
+		below = cumulative[index - 1] if index > 0 else 0
+		share = (rank - below) / self.counts[index]
+
+		return float(lower + (upper - lower) * share)
+
+	def to_dict(self):
+		""" Get the histogram as a dictionary
+
+		Returns:
+			A dictionary of the buckets, counts, sum, count and quantiles
+		"""
+		buckets = ["+Inf" if np.isinf(bucket) else float(bucket) for bucket in self.buckets]
+
+		return {"buckets": buckets, "counts": self.counts.tolist(),
+				"sum": self.sum, "count": self.count,
+				"quantiles": {str(q): self.quantile(q) for q in QUANTILES}}
+
+
+class Metrics:
+	""" Records stage latencies and counters and dumps them to a file
+
+	The file is replaced atomically, so a reader such as the app's
+	/metrics route never sees a partial dump.
+
+	Attributes:
+		path: Path of the JSON file the metrics are dumped to, None to
+			  only keep them in memory
+		dump_interval: Seconds between two dumps
+		histograms: A Dictionary mapping a stage name to its Histogram
+		counters: A Dictionary mapping a counter name to its value
+		gauges: A Dictionary mapping a gauge name to its current value
+		lock: Lock guarding the histograms and counters
+		last_dump: Time of the last dump
+	"""
+
+	def __init__(self, path=None, dump_interval=5.0):
+		""" Intializes the Metrics
+
+		Args:
+			path: Path of the JSON file the metrics are dumped to, None
+				  to only keep them in memory
+			dump_interval: Seconds between two dumps
+		"""
+		self.path = path
+		self.dump_interval = dump_interval
+		self.histograms = {}
+		self.counters = {}
+		self.gauges = {}
+		self.lock = threading.Lock()
+		self.last_dump = time.monotonic()
+
+	def observe(self, stage, seconds):
+		""" Record the latency of a stage
+
+		Args:
+			stage: Name of the stage
+			seconds: Time the stage took
+		"""
+		with self.lock:
+			histogram = self.histograms.get(stage)
+			if histogram is None:
+				histogram = self.histograms[stage] = Histogram()
+			histogram.observe(seconds)
+
+	@contextmanager
+	def time(self, stage):
+		""" Record the latency of the block run in the context
+
+		Args:
+			stage: Name of the stage
+		"""
+		time_start = time.perf_counter()
+		try:
+			yield
+		finally:
+			self.observe(stage, time.perf_counter() - time_start)
+
+	def increment(self, name, amount=1):
+		""" Add to a counter
+
+		Args:
+			name: Name of the counter
+			amount: Amount added
+		"""
+		with self.lock:
+			self.counters[name] = self.counters.get(name, 0) + amount
+
+	def set_counter(self, name, value):
+		""" Set a counter kept elsewhere, such as the pipeline's drops
+
+		Args:
+			name: Name of the counter
+			value: Value of the counter
+		"""
+		with self.lock:
+			self.counters[name] = value
+
+	def set_gauge(self, name, value):
+		""" Set a value that can go up and down, such as a queue depth
+
+		Args:
+			name: Name of the gauge
+			value: Current value of the gauge
+		"""
+		with self.lock:
+			self.gauges[name] = value
+
+	def to_dict(self):
+		""" Get the metrics as a dictionary
+
+		Returns:
+			A dictionary of the histograms, counters and gauges
+		"""
+		with self.lock:
+			return {"updated_at": time.time(),
+					"histograms": {stage: histogram.to_dict() for stage, histogram in self.histograms.items()},
+					"counters": dict(self.counters),
+					"gauges": dict(self.gauges)}
+
+	def dump(self):
+		""" Write the metrics to the file, replacing it atomically """
+		self.last_dump = time.monotonic()
+		if self.path is None:
+			return
+		temporary_path = f"{self.path}.tmp"
+		with open(temporary_path, "w") as f:
+			json.dump(self.to_dict(), f)
+		os.replace(temporary_path, self.path)
+
+	def dump_if_due(self):
+		""" Write the metrics if dump_interval passed since the last dump """
+		if time.monotonic() - self.last_dump >= self.dump_interval:
+			self.dump()
@@ -0,0 +1,217 @@
+import threading
+from collections import deque
+
+
+class DropOldestQueue:
+	""" A bounded queue that never blocks the producer
+
+	When the queue is full the oldest item is dropped to make room,
+	so a slow consumer always gets the most recent items. Items the keep
+	function marks are never dropped, unmarked items make room for them
+	and a marked item waits for room if every queued item is marked.
+
+	Attributes:
+		items: A deque holding the queued items
+		maxsize: Maximum number of items held
+		keep: Function telling if an item must not be dropped, None to
+			  treat every item alike
+		condition: Condition used to wait for items and room
+		dropped: Number of items dropped
+		closed: Condition to stop waiting for room
+	"""
+
+	def __init__(self, maxsize=2, keep=None):
+		""" Intializes the Queue
+
+		Args:
+			maxsize: Maximum number of items held
+			keep: Function telling if an item must not be dropped, None
+				  to treat every item alike
+		"""
+		self.items = deque()
+		self.maxsize = maxsize
+		self.keep = keep
+		self.condition = threading.Condition()
+		self.dropped = 0
+		self.closed = False
+
+	def __len__(self):
+		return len(self.items)
+
+	def put(self, item):
+		""" Add an item, dropping the oldest one if the queue is full
+
+		A marked item waits for room while every queued item is marked.
+
+		Args:
+			item: Item to be added
+		"""
+		with self.condition:
+			marked = self.keep is not None and self.keep(item)
+			if marked:
+				self.condition.wait_for(lambda: self.closed or len(self.items) < self.maxsize
+										or self.find_unmarked() is not None)
+			if len(self.items) >= self.maxsize:
+				self.dropped += 1
+				index = self.find_unmarked()
+				if index is None and self.keep is not None and not marked:
+					return
+				del self.items[0 if index is None else index]
+			self.items.append(item)
+			self.condition.notify_all()
+
+	def find_unmarked(self):
+		""" Find the oldest queued item the keep function does not mark
+
+		Returns:
+			Index of the item, None if every item is marked or there is
+			no keep function
+		"""
+		if self.keep is None:
+			return None
+		for index, item in enumerate(self.items):
+			if not self.keep(item):
+				return index
+
+		return None
+
+	def get(self, timeout=None):
+		""" Remove and return the oldest item
+
+		Args:
+			timeout: Seconds to wait for an item, None to wait forever
+
+		Returns:
+			The oldest item, None if no item arrived in time
+		"""
+		with self.condition:
+			if not self.condition.wait_for(lambda: len(self.items) != 0, timeout):
+				return None
+			item = self.items.popleft()
+			self.condition.notify_all()
+			return item
+
+	def close(self):
+		""" Stop the producers waiting for room """
+		with self.condition:
+			self.closed = True
+			self.condition.notify_all()
+
+
+class Pipeline:
+	""" Runs the stages of a frame pipeline, each on its own thread
+
+	The first stage is a source called with no arguments, every other
+	stage is called with the output of the stage before it. Stages are
+	connected by bounded drop-oldest queues so a slow stage never stalls
+	the stages before it. Items marked by the keep function, such as the
+	frames the detector runs on, are never dropped, the stage before
+	waits for room instead. A stage returning None drops the item. The
+	last stage runs on the thread calling run, so it can use the display.
+	Once the source calls finish, the items in flight still go through
+	every stage before run returns. The first error raised by a stage
+	stops every stage and is raised again by run.
+
+	Attributes:
+		stages: A list of (name, function) pairs in order
+		queues: A list of queues, the input of every stage but the first
+		stopped: Event set when the pipeline is stopping
+		finished: Event set of every stage that has handled its last item
+		threads: Threads of every stage but the last
+		error: First exception raised by a stage thread, None if none
+	"""
+
+	def __init__(self, stages, queue_size=2, keep=None):
+		""" Intializes the Pipeline
+
+		Args:
+			stages: A list of (name, function) pairs in order
+			queue_size: Maximum number of items waiting between two stages
+			keep: Function telling if an item must not be dropped from the
+				  queues, None to treat every item alike
+		"""
+		self.stages = stages
+		self.queues = [DropOldestQueue(queue_size, keep) for _ in stages[1:]]
+		self.stopped = threading.Event()
+		self.finished = [threading.Event() for _ in stages]
+		self.threads = []
+		self.error = None
+
+	def run(self):
+		""" Start the stages and run the last one until stopped
+
+		Raises:
+			The first exception raised by a stage thread
+		"""
+		for index, (name, function) in enumerate(self.stages[:-1]):
+			thread = threading.Thread(target=self.run_stage, args=(index,), name=name, daemon=True)
+			self.threads.append(thread)
+			thread.start()
+
+		try:
+			self.run_stage(len(self.stages) - 1)
+		finally:
+			self.stop()
+			for thread in self.threads:
+				thread.join()
+
+		if self.error is not None:
+			raise self.error
+
+	def run_stage(self, index):
+		""" Feed a stage from its queue until the pipeline is stopped
+
+		Args:
+			index: Index of the stage
+		"""
+		name, function = self.stages[index]
+		input_queue = self.queues[index - 1] if index > 0 else None
+		output_queue = self.queues[index] if index < len(self.queues) else None
+
+		try:
+			while not self.stopped.is_set():
+				if input_queue is None:
+					if self.finished[0].is_set():
+						break
+					item = function()
+				else:
+					item = input_queue.get(timeout=0.1)
+					if item is None:
+						# The stage before put its last item before it finished
+						if self.finished[index - 1].is_set() and len(input_queue) == 0:
+							break
+						continue
+					item = function(item)
+
+				if item is not None and output_queue is not None:
+					output_queue.put(item)
+		except BaseException as error:
+			self.stop()
+			if index == len(self.stages) - 1:
+				raise
+			# Kept for run to raise on its own thread
+			if self.error is None:
+				self.error = error
+			return
+		self.finished[index].set()
+
+	def finish(self):
+		""" End the source, the items in flight still go through every stage
+
+		Called by the source once it has no more items.
+		"""
+		self.finished[0].set()
+
+	def stop(self):
+		""" Stop every stage, dropping the items in flight """
+		self.stopped.set()
+		for queue in self.queues:
+			queue.close()
+
+	def get_dropped(self):
+		""" Get the number of items dropped in front of every stage
+
+		Returns:
+			A dictionary mapping stage name to items dropped
+		"""
+		return {name: queue.dropped for (name, _), queue in zip(self.stages[1:], self.queues)}
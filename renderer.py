@@ -0,0 +1,141 @@
+import cv2
+import numpy as np
+from helpers import measurement_lines
+
+
+class Renderer:
+	""" Draws the overlay of a frame in one pass and shows it once
+
+	Static elements, the measurement lines and the legend, are drawn
+	once per frame resolution into a cached overlay and copied onto
+	every frame through the indices of their pixels. Boxes, labels and
+	text are then drawn in a single pass and the frame is shown once.
+	A disabled renderer does nothing, so headless runs pay no drawing.
+
+	Attributes:
+		enabled: Condition to draw and show the frames
+		window_name: Name of the window the frames are shown in
+		lines_color: Color of the measurement lines, None for no lines
+		legend: A list of (text, color) pairs listed in the top right
+		text_size: Font size of the text drawn on the frame
+		text_thickness: Font thickness of the text drawn on the frame
+		frame_shape: (height, width) the overlay was drawn for
+		overlay_index: Row and column indices of the overlay pixels
+		overlay_pixels: Colors of the overlay pixels
+	"""
+
+	FONT_STYLE = cv2.FONT_HERSHEY_SIMPLEX
+	FONT_SIZE = 1
+	FONT_THICKNESS = 2
+	LINE_THICKNESS = 4
+	BOX_THICKNESS = 2
+	CIRCLE_RADIUS = 10
+
+	def __init__(self, enabled=True, window_name="Input", lines_color=None, legend=None, text_size=1,
+				 text_thickness=2):
+		""" Intializes the Renderer
+
+		Args:
+			enabled: Condition to draw and show the frames
+			window_name: Name of the window the frames are shown in
+			lines_color: Color of the measurement lines, None for no lines
+			legend: A list of (text, color) pairs listed in the top right
+			text_size: Font size of the text drawn on the frame
+			text_thickness: Font thickness of the text drawn on the frame
+		"""
+		self.enabled = enabled
+		self.window_name = window_name
+		self.lines_color = lines_color
+		self.legend = legend or []
+		self.text_size = text_size
+		self.text_thickness = text_thickness
+		self.frame_shape = None
+		self.overlay_index = None
+		self.overlay_pixels = None
+
+	def prepare(self, frame_shape):
+		""" Draw the static overlay for a frame resolution
+
+		Args:
+			frame_shape: Shape of the frame
+		"""
+		img_height, img_width = frame_shape[:2]
+		overlay = np.zeros((img_height, img_width, 3), dtype=np.uint8)
+		mask = np.zeros((img_height, img_width), dtype=np.uint8)
+
+		if self.lines_color is not None:
+			for line in measurement_lines(img_height):
+				cv2.line(overlay, (0, line), (img_width, line), self.lines_color, self.LINE_THICKNESS)
+				cv2.line(mask, (0, line), (img_width, line), 255, self.LINE_THICKNESS)
+
+		for index, (text, color) in enumerate(self.legend):
+			labelsize, baseline = cv2.getTextSize(text, self.FONT_STYLE, self.FONT_SIZE, self.FONT_THICKNESS)
+			text_location = (img_width - labelsize[0] - 20, 60 * (index + 1))
+			cv2.putText(overlay, text, text_location, self.FONT_STYLE, self.FONT_SIZE, color, self.FONT_THICKNESS)
+			cv2.putText(mask, text, text_location, self.FONT_STYLE, self.FONT_SIZE, 255, self.FONT_THICKNESS)
+
+		self.overlay_index = np.nonzero(mask)
+		self.overlay_pixels = overlay[self.overlay_index]
+		self.frame_shape = (img_height, img_width)
+
+	def draw(self, image, boxes, labels, colors, marks=None, texts=None):
+		""" Draw the overlay, boxes, labels and text onto a frame
+
+		Args:
+			image: Loaded image, drawn on in place
+			boxes: Pixel boxes, each row is (x1, y1, x2, y2)
+			labels: Label of every box, None for no label
+			colors: Color of every box
+			marks: Condition to mark the mid_point of every box, None for
+				   no marks
+			texts: A list of (text, location, color) drawn on the frame
+		"""
+		if not self.enabled:
+			return
+		if image.shape[:2] != self.frame_shape:
+			self.prepare(image.shape)
+
+		# Indexing rows and columns writes in place, whatever the strides of the frame
+		image[self.overlay_index] = self.overlay_pixels
+
+		if marks is None:
+			marks = [False] * len(boxes)
+		for box, label, color, mark in zip(boxes, labels, colors, marks):
+			min_x, min_y, max_x, max_y = (int(i) for i in box)
+			cv2.rectangle(image, (min_x, min_y), (max_x, max_y), color, self.BOX_THICKNESS)
+			if mark:
+				cv2.circle(image, ((min_x + max_x)//2, (min_y + max_y)//2), self.CIRCLE_RADIUS, color, cv2.FILLED)
+			if label is None:
+				continue
+
+			# Add Label
+			font_color = (255, 255, 255) if sum(color) < 144 * 3 else (0, 0, 0)
+			labelsize, baseline = cv2.getTextSize(label, self.FONT_STYLE, self.FONT_SIZE, self.FONT_THICKNESS)
+			cv2.rectangle(image, (min_x, min_y + labelsize[1]),
+						  (min_x + labelsize[0], min_y - baseline),
+						  color, cv2.FILLED)
+			text_location = (min_x, min_y + labelsize[1])
+			cv2.putText(image, label, text_location, self.FONT_STYLE, self.FONT_SIZE, font_color, self.FONT_THICKNESS)
+
+		for text, text_location, color in texts or []:
+			cv2.putText(image, text, text_location, self.FONT_STYLE, self.text_size, color, self.text_thickness)
+
+	def present(self, image):
+		""" Show a frame
+
+		Args:
+			image: Loaded image
+
+		Returns:
+			True if q was pressed, otherwise False
+		"""
+		if not self.enabled:
+			return False
+		cv2.imshow(self.window_name, image)
+
+		return cv2.waitKey(1) & 0xFF == ord('q')
+
+	def close(self):
+		""" Close the window """
+		if self.enabled:
+			cv2.destroyAllWindows()
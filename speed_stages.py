@@ -0,0 +1,309 @@
+import time
+from datetime import datetime
+from helpers import prepare_interpreter, Preprocessor, MotionGate, load_labels
+from helpers import generate_colors, get_tensor_output, get_class_mask, filter_detections, measurement_lines
+from helpers import calculate_speed_fixed_distance_measure_time, calculate_speed_fixed_time_measure_distance
+from tracker import Tracker
+from pipeline import Pipeline
+from metrics import Metrics
+
+
+class SpeedStages:
+	""" The stages of the speed scripts, shared with the benchmark
+
+	A frame is started, inferred, tracked, saved and displayed. The video
+	scripts run the stages one after the other with process, the live
+	scripts run each on its own thread with run_live. The detector runs
+	on every detect_every frame with motion and the tracker predicts the
+	others. Every frame is shown, the skipped ones with the overlay and
+	the text only.
+
+	Attributes:
+		model_one: Condition to measure speed with model one
+		interpreter_info: Dictionary contains information about interpreter
+		preprocessor: Letterboxes the frames into the input tensor
+		motion_gate: Skips the detector on static frames
+		labels: List of the labels
+		class_mask: Mask of the classes to track
+		colors: Color of every class
+		tracker: Tracker of the model
+		renderer: Draws and shows the frames
+		metrics: Metrics the stage latencies and counters are recorded in
+		violation_writer: ViolationWriter the trespassers are queued in,
+						  None to not save them
+		threshold: Minimum score of a detection
+		max_detections: Maximum number of detections kept per frame
+		detect_every: The detector runs on one frame out of detect_every
+		speed_limit: Speeds above it are violations
+		text: Text drawn on every frame, formatted with fps and tracker
+		text_location: Location of the text
+		text_color: Color of the text
+		verbose: Condition to print every detection
+		measurements: A list of (time_stamp, x, speed) of every speed
+					  measured, x is the middle of the box, None to not
+					  keep them
+		count: Number of frames started
+		tracked_count: Count of the last frame tracked
+		fps: Frames per second shown, smoothed
+		time_start: Time the last frame was shown
+	"""
+
+	def __init__(self, model_one, model_path, label_path, renderer, metrics=None, violation_writer=None,
+				 num_threads=4, threshold=0.3, max_detections=25, labels_to_track=None, detect_every=1,
+				 roi_margin=None, motion_threshold=0.01, speed_limit=40, text="{fps} FPS", text_location=(20, 60),
+				 text_color=(0, 0, 0), verbose=False, measurements=None):
+		""" Intializes the Speed Stages
+
+		Args:
+			model_one: Condition to measure speed with model one
+			model_path: Path of the tflite model
+			label_path: Path of the labelmap
+			renderer: Draws and shows the frames
+			metrics: Metrics the stage latencies and counters are
+					 recorded in, None to keep them in memory only
+			violation_writer: ViolationWriter the trespassers are queued
+							  in, None to not save them
+			num_threads: Number of threads of the interpreter
+			threshold: Minimum score of a detection
+			max_detections: Maximum number of detections kept per frame
+			labels_to_track: A list of the labels tracked, None for all
+			detect_every: The detector runs on one frame out of
+						  detect_every
+			roi_margin: Share of frame height around the lines run
+						through the model, None for all
+			motion_threshold: Share of changed pixels needed to run the
+							  model
+			speed_limit: Speeds above it are violations
+			text: Text drawn on every frame, formatted with fps and
+				  tracker
+			text_location: Location of the text
+			text_color: Color of the text
+			verbose: Condition to print every detection
+			measurements: A list the measured speeds are appended to, None
+						  to not keep them
+		"""
+		self.model_one = model_one
+		self.interpreter_info = prepare_interpreter(model_path, num_threads)
+		self.preprocessor = Preprocessor(self.interpreter_info, roi_margin)
+		self.motion_gate = MotionGate(motion_threshold, roi_margin=roi_margin)
+		self.labels = load_labels(label_path)
+		self.class_mask = get_class_mask(self.labels, labels_to_track)
+		self.colors = generate_colors(len(self.labels))
+		self.tracker = Tracker(model_one=model_one)
+		self.renderer = renderer
+		self.metrics = metrics or Metrics()
+		self.violation_writer = violation_writer
+		self.threshold = threshold
+		self.max_detections = max_detections
+		self.detect_every = detect_every
+		self.speed_limit = speed_limit
+		self.text = text
+		self.text_location = text_location
+		self.text_color = text_color
+		self.verbose = verbose
+		self.measurements = measurements
+		self.count = 0
+		self.tracked_count = 0
+		self.fps = 0
+		self.time_start = time.time()
+
+	def start(self, frame, time_stamp=None):
+		""" Count a frame and mark whether the detector runs on it
+
+		Args:
+			frame: Loaded BGR frame
+			time_stamp: Capture time of the frame in seconds, None if
+						unknown
+
+		Returns:
+			Dictionary of the frame passed on to the next stages
+		"""
+		self.metrics.increment("frames")
+		self.count += 1
+		with self.metrics.time("gate"):
+			detect = self.count % self.detect_every == 0 and self.motion_gate.has_motion(frame)
+		if not detect:
+			self.metrics.increment("frames_skipped")
+
+		return {"frame": frame, "image": frame, "time_stamp": time_stamp, "count": self.count, "detect": detect,
+				"speeds": []}
+
+	def infer(self, frame_info):
+		""" Run the detector on the frame if it is marked
+
+		Args:
+			frame_info: Dictionary of the frame
+
+		Returns:
+			The dictionary, with the boxes, classes and scores as output
+		"""
+		if not frame_info["detect"]:
+			return frame_info
+
+		# Write the frame into the input tensor
+		with self.metrics.time("preprocess"):
+			self.preprocessor.process(frame_info["frame"])
+		with self.metrics.time("invoke"):
+			self.interpreter_info["Interpreter"].invoke()
+
+		# Get boxes, classes, scores
+		with self.metrics.time("postprocess"):
+			boxes, classes, scores = get_tensor_output(self.interpreter_info)
+			frame_info["output"] = filter_detections(self.preprocessor.to_frame_boxes(boxes), classes, scores,
+													  self.class_mask, self.threshold, frame_info["frame"],
+													  self.max_detections)
+
+		return frame_info
+
+	def track(self, frame_info):
+		""" Track the detected objects, measure their speed and draw them
+
+		Args:
+			frame_info: Dictionary of the frame
+
+		Returns:
+			The dictionary, with the (speed, box) of every trespasser
+		"""
+		boxes, box_labels, box_colors, marks = [], [], [], []
+		with self.metrics.time("track"):
+			# Frames dropped before this stage still advance the tracker, one predict each
+			for _ in range(frame_info["count"] - self.tracked_count - 1):
+				self.tracker.predict()
+			self.tracked_count = frame_info["count"]
+
+			if frame_info["detect"]:
+				boxes, box_labels, box_colors, marks = self.measure(frame_info)
+			else:
+				self.tracker.predict()
+
+		# Skipped frames are drawn with the overlay and text only
+		with self.metrics.time("render"):
+			self.renderer.draw(frame_info["image"], boxes, box_labels, box_colors, marks,
+							   [(self.text.format(fps=round(self.fps), tracker=self.tracker), self.text_location,
+								 self.text_color)])
+
+		return frame_info
+
+	def measure(self, frame_info):
+		""" Update the tracker with the detections and measure their speed
+
+		Args:
+			frame_info: Dictionary of a frame the detector ran on
+
+		Returns:
+			The boxes and the label, color and mark of every box
+		"""
+		image = frame_info["image"]
+		boxes, classes, scores = frame_info["output"]
+		if self.model_one:
+			self.tracker.set_lines(measurement_lines(image.shape[0]))
+			ids = self.tracker.update(boxes, frame_info["time_stamp"])
+		else:
+			ids = self.tracker.update(boxes)
+
+		box_labels, box_colors, marks = [], [], []
+		for box, class_, score, id_ in zip(boxes, classes, scores, ids):
+			class_name = self.labels[class_]
+			color = [int(i) for i in self.colors[int(class_)]]
+			if self.model_one:
+				speed = calculate_speed_fixed_distance_measure_time(None, box, class_name, score, color,
+																	self.tracker, id_)
+			else:
+				speed = calculate_speed_fixed_time_measure_distance(None, box, class_name, score, color,
+																	self.tracker, id_)
+			if speed != -1 and self.measurements is not None:
+				self.measurements.append((frame_info["time_stamp"], (box[0] + box[2]) / 2, speed))
+			if speed > self.speed_limit:
+				frame_info["speeds"].append((speed, box))
+			box_labels.append(f"{class_name} {id_}" if speed == -1 else f"{class_name} {id_} {speed} km/hr")
+			box_colors.append(color)
+			marks.append(self.model_one and speed != -1)
+			if self.verbose:
+				print(f"{score} {class_name}")
+		self.metrics.increment("detections", len(boxes))
+		self.metrics.increment("violations", len(frame_info["speeds"]))
+
+		return boxes, box_labels, box_colors, marks
+
+	def save(self, frame_info):
+		""" Queue the frame and speed of every trespasser for the writer
+
+		Args:
+			frame_info: Dictionary of the frame
+
+		Returns:
+			The dictionary
+		"""
+		if self.violation_writer is not None:
+			for speed, box in frame_info["speeds"]:
+				self.violation_writer.put(frame_info["image"], speed, datetime.now(), box=box)
+
+		return frame_info
+
+	def display(self, frame_info):
+		""" Show the frame
+
+		Args:
+			frame_info: Dictionary of the frame
+
+		Returns:
+			True if q was pressed, otherwise False
+		"""
+		with self.metrics.time("display"):
+			stopped = self.renderer.present(frame_info["image"])
+		self.metrics.dump_if_due()
+
+		# Calculate Frames Per Second
+		time_end = time.time()
+		loop_time = time_end - self.time_start
+		self.fps = 0.9*self.fps + 0.1*(1/max(loop_time, 1e-6))
+		self.time_start = time.time()
+
+		return stopped
+
+	def process(self, frame, time_stamp=None):
+		""" Run every stage on a frame, one after the other
+
+		Args:
+			frame: Loaded BGR frame
+			time_stamp: Capture time of the frame in seconds, None if
+						unknown
+
+		Returns:
+			True if q was pressed, otherwise False
+		"""
+		frame_info = self.start(frame, time_stamp)
+
+		return self.display(self.save(self.track(self.infer(frame_info))))
+
+	def run_live(self, capture):
+		""" Run every stage on its own thread until q is pressed
+
+		The run also ends when capture returns no frame.
+
+		Args:
+			capture: Function returning a frame and its capture time in
+					 seconds, the frame is None once there are no more
+
+		Returns:
+			The stopped Pipeline
+		"""
+		def start():
+			with self.metrics.time("capture"):
+				frame, time_stamp = capture()
+			if frame is None:
+				pipeline.finish()
+				return None
+			return self.start(frame, time_stamp)
+
+		def display(frame_info):
+			self.metrics.set_counter("frames_dropped", sum(pipeline.get_dropped().values()))
+			if self.display(frame_info):
+				pipeline.stop()
+
+		pipeline = Pipeline([("capture", start), ("infer", self.infer), ("track", self.track), ("save", self.save),
+							 ("display", display)],
+							keep=lambda frame_info: frame_info["detect"]) # Detect frames are never dropped
+		pipeline.run()
+
+		return pipeline
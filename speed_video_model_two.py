@@ -1,9 +1,7 @@
 import cv2
-import time
-import numpy as np
-from helpers import prepare_interpreter, process_image, load_labels, add_text_to_image
-from helpers import generate_colors, add_label, get_tensor_output, add_id, calculate_speed_fixed_time_measure_distance
-from tracker import Tracker
+from helpers import generate_colors
+from speed_stages import SpeedStages
+from renderer import Renderer
 
 # Declare Parameters
 VIDEO_PATH = "veh2.mp4"
@@ -11,31 +9,29 @@ LABEL_PATH = "labelmap.txt"
 MODEL = "efficientdet_lite0.tflite"
 NUM_THREADS = 4
 THRESHOLD = 0.3
+MAX_DETECTIONS = 25
 LABELS_TO_TRACK = ["car", "motorcycle", "bus", "truck"]
 SPEED_LIMIT = 60 # km/hr
+DISPLAY = True # Draw and show the frames, False for headless runs
+MOTION_THRESHOLD = 0.01 # Share of changed pixels needed to run the model
 
 # Text Properties
 TEXT_LOCATION = (20, 120)
-FONT_STYLE = cv2.FONT_HERSHEY_SIMPLEX
 FONT_SIZE = 2
 FONT_THICKNESS = 4
 FONT_COLOR = [int(i) for i in generate_colors(1)[0]]
 
-# Get interpreter info
-interpreter_info = prepare_interpreter(MODEL, NUM_THREADS)
-interpreter = interpreter_info["Interpreter"]
-
-labels = load_labels(LABEL_PATH)
-
-colors = generate_colors(len(labels))
+# Get the stages
+renderer = Renderer(DISPLAY, legend=[(f"Limit {SPEED_LIMIT} km/hr", FONT_COLOR)],
+					text_size=FONT_SIZE, text_thickness=FONT_THICKNESS)
+speed_stages = SpeedStages(False, MODEL, LABEL_PATH, renderer, num_threads=NUM_THREADS, threshold=THRESHOLD,
+						   max_detections=MAX_DETECTIONS, labels_to_track=LABELS_TO_TRACK,
+						   motion_threshold=MOTION_THRESHOLD, speed_limit=SPEED_LIMIT, text_location=TEXT_LOCATION,
+						   text_color=FONT_COLOR, verbose=True)
 
 # Load Video
 video = cv2.VideoCapture(VIDEO_PATH)
-count = 0
 
-time_start = time.time()
-fps = 0
-tracker = Tracker(model_one=False)
 while True:
 	status, frame = video.read()
 	
@@ -44,45 +40,9 @@ while True:
 		print("Read operation failed")
 		exit(1)
 		
-#	count += 1 
-#	if count % 3 != 0:
-#		continue
-		
-	input_data, image = process_image(frame, interpreter_info["input_dim"])
-	
-	# Allocate Tensors
-	interpreter.set_tensor(interpreter_info["tensors_index"]["input_tensor_index"], input_data)
-	interpreter.invoke()
-	
-	# Get boxes, classes, scores
-	boxes, classes, scores = get_tensor_output(interpreter_info)
-	
-	for box, class_, score in zip(boxes, classes[:5], scores[:5]):
-		class_name = labels[int(class_)]
-		if score < THRESHOLD or not (class_name in LABELS_TO_TRACK):
-			continue
-		
-		color = [int(i) for i in colors[int(class_)]]
-		speed = calculate_speed_fixed_time_measure_distance(image, box, class_name, score, color, tracker)
-		if speed !=  -1:
-			print(f"{speed = }")
-		
-		text = f"{round(fps)} FPS"
-		add_text_to_image(image, text, TEXT_LOCATION, FONT_STYLE,
-						  FONT_SIZE, FONT_COLOR, FONT_THICKNESS)
-		
-		cv2.imshow("Input", image)
-		print(f"{score} {labels[int(class_)]}")
-	
-	if cv2.waitKey(1) == ord('q'):
+	if speed_stages.process(frame):
 		break
-	
-	# Calculate Frames Per Second	
-	time_end = time.time()
-	loop_time = time_end - time_start
-	fps = 0.9*fps + 0.1*(1/loop_time)
-	time_start = time.time()
 
 
 video.release()
-cv2.destroyAllWindows()
+renderer.close()
@@ -0,0 +1,144 @@
+import time
+import threading
+import unittest
+from pipeline import DropOldestQueue, Pipeline
+
+
+class TestPipeline(unittest.TestCase):
+	"""
+		A Class for testing the queues and stages
+		of the frame pipeline
+	"""
+	
+	def test_drop_oldest_queue_drops_the_oldest_item(self):
+		queue = DropOldestQueue(2)
+		for item in range(3):
+			queue.put(item)
+		self.assertEqual([1, 2], [queue.get(0), queue.get(0)])
+		self.assertEqual(1, queue.dropped)
+		
+	def test_drop_oldest_queue_drops_unmarked_items_first(self):
+		queue = DropOldestQueue(2, keep=lambda item: item["detect"])
+		for index, detect in enumerate([True, False, False, True, False]):
+			queue.put({"index": index, "detect": detect})
+		self.assertEqual([0, 3], [queue.get(0)["index"], queue.get(0)["index"]])
+		self.assertEqual(3, queue.dropped)
+		
+	def test_drop_oldest_queue_waits_for_room_when_all_are_marked(self):
+		queue = DropOldestQueue(2, keep=lambda item: item["detect"])
+		producer = threading.Thread(target=lambda: [queue.put({"index": index, "detect": True})
+													for index in range(3)])
+		producer.start()
+		producer.join(0.1)
+		self.assertTrue(producer.is_alive())
+		self.assertEqual(0, queue.get(1)["index"])
+		producer.join(1)
+		self.assertFalse(producer.is_alive())
+		self.assertEqual([1, 2], [queue.get(0)["index"], queue.get(0)["index"]])
+		self.assertEqual(0, queue.dropped)
+		
+	def test_drop_oldest_queue_close_releases_a_waiting_producer(self):
+		queue = DropOldestQueue(1, keep=lambda item: True)
+		queue.put(0)
+		producer = threading.Thread(target=queue.put, args=(1,))
+		producer.start()
+		queue.close()
+		producer.join(1)
+		self.assertFalse(producer.is_alive())
+		
+	def test_pipeline_loses_no_detect_frame_when_inference_is_slower_than_capture(self):
+		frame_count, detect_every = 120, 4
+		detected = []
+		
+		def capture():
+			if capture.count == frame_count:
+				pipeline.finish()
+				return None
+			capture.count += 1
+			time.sleep(0.002)
+			return {"count": capture.count, "detect": capture.count % detect_every == 0}
+		capture.count = 0
+		
+		def infer(frame_info):
+			# Slower than capture on average, but in time for the detect frames alone
+			time.sleep(0.006 if frame_info["detect"] else 0.003)
+			return frame_info
+			
+		def track(frame_info):
+			if frame_info["detect"]:
+				detected.append(frame_info["count"])
+				
+		pipeline = Pipeline([("capture", capture), ("infer", infer), ("track", track)],
+							keep=lambda frame_info: frame_info["detect"])
+		pipeline.run()
+		self.assertEqual(list(range(detect_every, frame_count + 1, detect_every)), detected)
+		self.assertGreater(pipeline.get_dropped()["infer"], 0)
+		
+	def test_pipeline_loses_no_detect_frame_when_inference_is_slower_than_detect_frames(self):
+		detected = []
+		
+		def capture():
+			if capture.count == 20:
+				pipeline.finish()
+				return None
+			capture.count += 1
+			return {"count": capture.count, "detect": True}
+		capture.count = 0
+		
+		def infer(frame_info):
+			time.sleep(0.005)
+			return frame_info
+			
+		def track(frame_info):
+			detected.append(frame_info["count"])
+				
+		pipeline = Pipeline([("capture", capture), ("infer", infer), ("track", track)],
+							keep=lambda frame_info: frame_info["detect"])
+		pipeline.run()
+		self.assertEqual(list(range(1, 21)), detected)
+		
+	def test_pipeline_finish_lets_the_items_in_flight_through(self):
+		received = []
+		
+		def source():
+			if source.count == 10:
+				pipeline.finish()
+				return None
+			source.count += 1
+			return {"count": source.count, "detect": True}
+		source.count = 0
+		
+		def slow(frame_info):
+			time.sleep(0.005)
+			return frame_info
+			
+		def sink(frame_info):
+			received.append(frame_info["count"])
+			
+		pipeline = Pipeline([("source", source), ("slow", slow), ("sink", sink)],
+							keep=lambda frame_info: frame_info["detect"])
+		pipeline.run()
+		self.assertEqual(list(range(1, 11)), received)
+		
+	def test_pipeline_run_raises_the_error_of_a_stage_thread(self):
+		received = []
+		
+		def source():
+			source.count += 1
+			return source.count
+		source.count = 0
+		
+		def failing(count):
+			if count >= 5:
+				raise RuntimeError("stage failed")
+			return count
+			
+		pipeline = Pipeline([("source", source), ("failing", failing), ("sink", received.append)])
+		with self.assertRaisesRegex(RuntimeError, "stage failed"):
+			pipeline.run()
+		self.assertTrue(pipeline.stopped.is_set())
+		self.assertTrue(all(count < 5 for count in received))
+		
+		
+if __name__ == "__main__":
+	unittest.main()
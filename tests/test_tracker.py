@@ -0,0 +1,185 @@
+import unittest
+import numpy as np
+from tracker import Tracker, TENTATIVE, CONFIRMED, LOST, DELETED
+
+
+def make_box(mid_x, mid_y, size=40):
+	""" Make a box around a mid_point
+
+	Args:
+		mid_x: X coordinate of the mid_point
+		mid_y: Y coordinate of the mid_point
+		size: Width and height of the box
+
+	Returns:
+		Array of shape (4,), (x1, y1, x2, y2)
+	"""
+	return np.array((mid_x - size / 2, mid_y - size / 2, mid_x + size / 2, mid_y + size / 2))
+
+
+class TestTracker(unittest.TestCase):
+	"""
+		A Class for testing the matching, lifecycle, grid
+		and crossing times of the Tracker
+	"""
+
+	def assert_grid_consistent(self, tracker):
+		""" Check every live object is in the grid once, in its own cell """
+		placed = {}
+		for cell, slots in tracker.grid.items():
+			self.assertNotEqual(0, len(slots))
+			for slot in slots:
+				self.assertNotIn(slot, placed)
+				placed[slot] = cell
+		live = [int(slot) for slot in tracker.tracks.live_slots()]
+		self.assertEqual(sorted(live), sorted(placed))
+		for slot in live:
+			self.assertEqual(placed[slot], tracker.get_cell(tracker.tracks.mid_points[slot]))
+			self.assertEqual(placed[slot], tuple(int(i) for i in tracker.tracks.cells[slot]))
+
+	def test_ids_are_stable_across_frames(self):
+		tracker = Tracker(model_one=False)
+		first_ids = tracker.update(np.array([make_box(100, 100), make_box(400, 100)]))
+		for frame in range(1, 10):
+			ids = tracker.update(np.array([make_box(100, 100 + 20 * frame), make_box(400, 100 + 30 * frame)]))
+			self.assertEqual(list(first_ids), list(ids))
+		self.assertNotEqual(first_ids[0], first_ids[1])
+
+	def test_closest_first_matching_does_not_assign_an_object_twice(self):
+		tracker = Tracker(model_one=False)
+		object_id, = tracker.update(np.array([make_box(100, 100)]))
+		ids = tracker.update(np.array([make_box(130, 100), make_box(110, 100)]))
+		self.assertEqual(object_id, ids[1])
+		self.assertNotEqual(object_id, ids[0])
+
+	def test_match_pairs_takes_the_closest_pair_first(self):
+		object_slots = np.array([0, 0, 1, 1])
+		detection_index = np.array([0, 1, 0, 1])
+		distances = np.array([5.0, 1.0, 2.0, 50.0])
+		matched_slots, matched_index = Tracker.match_pairs(object_slots, detection_index, distances, 40)
+		self.assertEqual([(0, 1), (1, 0)], list(zip(matched_slots, matched_index)))
+
+	def test_lifecycle_goes_from_tentative_to_deleted(self):
+		tracker = Tracker(model_one=False, min_hits=2, max_age=5)
+		id_, = tracker.update(np.array([make_box(100, 100)]))
+		self.assertEqual(TENTATIVE, tracker.get_state(id_))
+		tracker.update(np.array([make_box(100, 110)]))
+		self.assertEqual(CONFIRMED, tracker.get_state(id_))
+		tracker.update(np.zeros((0, 4)))
+		self.assertEqual(LOST, tracker.get_state(id_))
+
+		# Lost at one frame unseen, deleted after max_age
+		for _ in range(tracker.max_age - 1):
+			tracker.predict()
+			self.assertEqual(LOST, tracker.get_state(id_))
+		tracker.predict()
+		self.assertEqual(DELETED, tracker.get_state(id_))
+		self.assertIsNone(tracker.get_track(id_))
+		self.assertEqual(0, len(tracker.tracks))
+
+	def test_tentative_object_is_deleted_after_tentative_max_missed(self):
+		tracker = Tracker(model_one=False, tentative_max_missed=2)
+		id_, = tracker.update(np.array([make_box(100, 100)]))
+		for _ in range(tracker.tentative_max_missed):
+			tracker.update(np.zeros((0, 4)))
+			self.assertEqual(TENTATIVE, tracker.get_state(id_))
+		tracker.update(np.zeros((0, 4)))
+		self.assertEqual(DELETED, tracker.get_state(id_))
+
+	def test_tentative_object_keeps_its_crossing_state_through_a_missed_detection(self):
+		tracker = Tracker(lines=[100, 300])
+		id_, = tracker.update(np.array([make_box(100, 60)]), time_stamp=0.0)
+		tracker.update(np.zeros((0, 4)), time_stamp=1.0)
+		self.assertEqual(TENTATIVE, tracker.get_state(id_))
+
+		# Detected again, the object is confirmed and crosses the first line
+		self.assertEqual([id_], list(tracker.update(np.array([make_box(100, 140)]), time_stamp=2.0)))
+		self.assertEqual(CONFIRMED, tracker.get_state(id_))
+		self.assertIn(id_, tracker.going_down)
+		self.assertAlmostEqual(1.0, tracker.crossing_time_stamps[id_])
+
+	def test_predict_only_expires_objects_after_max_age(self):
+		tracker = Tracker(model_one=False, max_age=3)
+		id_, = tracker.update(np.array([make_box(100, 100)]))
+		for _ in range(tracker.max_age):
+			tracker.predict()
+			self.assertEqual(TENTATIVE, tracker.get_state(id_))
+		tracker.predict()
+		self.assertEqual(DELETED, tracker.get_state(id_))
+
+	def test_grid_is_consistent_after_slot_reuse(self):
+		tracker = Tracker(model_one=False, capacity=2)
+		first_id, = tracker.update(np.array([make_box(100, 100)]))
+		first_slot = tracker.tracks.slots[first_id]
+		for _ in range(tracker.tentative_max_missed + 1):
+			tracker.update(np.zeros((0, 4)))
+		self.assert_grid_consistent(tracker)
+
+		second_id, = tracker.update(np.array([make_box(500, 700)]))
+		self.assertEqual(first_slot, tracker.tracks.slots[second_id])
+		self.assertNotEqual(first_id, second_id)
+		self.assert_grid_consistent(tracker)
+
+		# Grow past the capacity and move every object across cells
+		for frame in range(1, 6):
+			tracker.update(np.array([make_box(500, 700 + 60 * frame), make_box(100, 100 + 60 * frame),
+									 make_box(300, 100 + 60 * frame)]))
+			self.assert_grid_consistent(tracker)
+		self.assertEqual(3, len(tracker.tracks))
+
+	def test_find_candidates_returns_the_objects_of_the_nine_cells_around(self):
+		tracker = Tracker(model_one=False, capacity=4)
+		generator = np.random.default_rng(0)
+		mid_points = generator.uniform(-400, 800, (40, 2))
+		tracker.update(np.array([make_box(x, y) for x, y in mid_points]))
+		mid_points = np.concatenate((generator.uniform(-400, 800, (30, 2)), [[5000, 5000]]))
+
+		candidate_slots, detection_index = tracker.find_candidates(mid_points)
+		expected = set()
+		for index, mid_point in enumerate(mid_points):
+			column, row = tracker.get_cell(mid_point)
+			for cell, slots in tracker.grid.items():
+				if abs(cell[0] - column) <= 1 and abs(cell[1] - row) <= 1:
+					expected.update((int(slot), index) for slot in slots)
+		found = list(zip(candidate_slots.tolist(), detection_index.tolist()))
+		self.assertEqual(len(expected), len(found))
+		self.assertEqual(expected, set(found))
+
+		candidate_slots, detection_index = tracker.find_candidates(np.array([[5000.0, 5000.0]]))
+		self.assertEqual(0, len(candidate_slots))
+		self.assertEqual(0, len(detection_index))
+
+	def test_crossing_times_are_interpolated_between_detections(self):
+		tracker = Tracker(lines=[100, 300])
+		id_, = tracker.update(np.array([make_box(100, 60)]), time_stamp=0.0)
+		tracker.update(np.array([make_box(100, 140)]), time_stamp=1.0)
+		self.assertIn(id_, tracker.going_down)
+		self.assertAlmostEqual(0.5, tracker.crossing_time_stamps[id_])
+
+		tracker.update(np.array([make_box(100, 220)]), time_stamp=2.0)
+		self.assertEqual({}, tracker.completed)
+		tracker.update(np.array([make_box(100, 320)]), time_stamp=3.0)
+		self.assertAlmostEqual(2.8, tracker.completed[id_])
+		self.assertEqual(1, tracker.gone_down)
+
+		speed = tracker.calculate_object_speed_in_km_per_hr_model_one(id_, 30, tracker.completed[id_])
+		self.assertEqual(round(30 / 2.3 * 3.6), speed)
+
+	def test_assign_id_does_not_advance_the_frame(self):
+		tracker = Tracker(model_one=False, max_age=2)
+		id_ = tracker.assign_id((80, 80), (120, 120))
+		for _ in range(10):
+			self.assertEqual(id_, tracker.assign_id((80, 90), (120, 130)))
+		self.assertEqual(0, tracker.frame_count)
+
+		# Objects only age when every frame is advanced with predict
+		other_id = tracker.assign_id((580, 580), (620, 620))
+		for _ in range(tracker.max_age + 1):
+			tracker.predict()
+			tracker.assign_id((80, 90), (120, 130))
+		self.assertEqual(DELETED, tracker.get_state(other_id))
+		self.assertNotEqual(DELETED, tracker.get_state(id_))
+
+
+if __name__ == "__main__":
+	unittest.main()
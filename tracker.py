@@ -2,6 +2,204 @@ import math
 import numpy as np
 from collections import defaultdict, deque
 
+# Track states
+TENTATIVE = 0
+CONFIRMED = 1
+LOST = 2
+DELETED = 3
+
+# A grid cell (column, row) is keyed as column * CELL_KEY_SCALE + row
+CELL_KEY_SCALE = 1 << 32
+
+class TrackStore:
+	""" Stores the tracked objects in preallocated arrays
+
+	Every object lives in a slot, the same index in every array. Slots of
+	deleted objects go on a free list and are reused, the arrays only grow
+	when every slot is taken.
+
+	Attributes:
+		ids: Object id of every slot, 0 for a free slot
+		mid_points: Mid_point (x, y) of every slot
+		velocity: Movement of the mid_point in pixels per frame
+		last_seen: Frame the object was last detected in
+		hits: Number of times the object was detected
+		misses: Number of detection frames in a row the object was missed in
+		state: Lifecycle state, DELETED for a free slot
+		gone_down: Flag set once the object is counted as gone down
+		line_state: Number of lines the object has crossed, in order
+		measured_y: Y coordinate of the mid_point last detected
+		measured_at: Time the mid_point was last detected
+		cells: Grid cell (column, row) of the mid_point
+		slots: A Dictionary mapping object id to slot
+		free_slots: A list of the free slots
+	"""
+
+	def __init__(self, capacity=64):
+		""" Intializes the Track Store
+
+		Args:
+			capacity: Number of slots to preallocate
+		"""
+		self.ids = np.zeros(0, dtype=np.int64)
+		self.mid_points = np.zeros((0, 2))
+		self.velocity = np.zeros((0, 2))
+		self.last_seen = np.zeros(0, dtype=np.int64)
+		self.hits = np.zeros(0, dtype=np.int32)
+		self.misses = np.zeros(0, dtype=np.int32)
+		self.state = np.zeros(0, dtype=np.int8)
+		self.gone_down = np.zeros(0, dtype=bool)
+		self.line_state = np.zeros(0, dtype=np.int8)
+		self.measured_y = np.zeros(0)
+		self.measured_at = np.zeros(0)
+		self.cells = np.zeros((0, 2), dtype=np.int64)
+		self.slots = {}
+		self.free_slots = []
+		self.grow(capacity)
+
+	def __len__(self):
+		return len(self.slots)
+
+	def __contains__(self, id_):
+		return id_ in self.slots
+
+	@property
+	def capacity(self):
+		return len(self.ids)
+
+	def grow(self, capacity):
+		""" Extend every array to the new capacity
+
+		Args:
+			capacity: New number of slots
+		"""
+		extra = capacity - self.capacity
+		self.ids = np.concatenate((self.ids, np.zeros(extra, dtype=np.int64)))
+		self.mid_points = np.concatenate((self.mid_points, np.zeros((extra, 2))))
+		self.velocity = np.concatenate((self.velocity, np.zeros((extra, 2))))
+		self.last_seen = np.concatenate((self.last_seen, np.zeros(extra, dtype=np.int64)))
+		self.hits = np.concatenate((self.hits, np.zeros(extra, dtype=np.int32)))
+		self.misses = np.concatenate((self.misses, np.zeros(extra, dtype=np.int32)))
+		self.state = np.concatenate((self.state, np.full(extra, DELETED, dtype=np.int8)))
+		self.gone_down = np.concatenate((self.gone_down, np.zeros(extra, dtype=bool)))
+		self.line_state = np.concatenate((self.line_state, np.zeros(extra, dtype=np.int8)))
+		self.measured_y = np.concatenate((self.measured_y, np.zeros(extra)))
+		self.measured_at = np.concatenate((self.measured_at, np.zeros(extra)))
+		self.cells = np.concatenate((self.cells, np.zeros((extra, 2), dtype=np.int64)))
+		# Lowest slots are handed out first
+		self.free_slots.extend(range(self.capacity - 1, self.capacity - extra - 1, -1))
+
+	def add(self, id_):
+		""" Take a free slot for a new object
+
+		Args:
+			id_: Object id
+
+		Returns:
+			Slot of the object
+		"""
+		if len(self.free_slots) == 0:
+			self.grow(self.capacity * 2)
+
+		slot = self.free_slots.pop()
+		self.ids[slot] = id_
+		self.velocity[slot] = 0
+		self.hits[slot] = 0
+		self.misses[slot] = 0
+		self.state[slot] = TENTATIVE
+		self.gone_down[slot] = False
+		self.line_state[slot] = 0
+		self.slots[id_] = slot
+
+		return slot
+
+	def remove(self, slot):
+		""" Free the slot of an object
+
+		Args:
+			slot: Slot of the object
+		"""
+		del self.slots[int(self.ids[slot])]
+		self.ids[slot] = 0
+		self.state[slot] = DELETED
+		self.free_slots.append(slot)
+
+	def live_slots(self):
+		""" Get the slots in use
+
+		Returns:
+			Array of the slots of all live objects
+		"""
+		return np.flatnonzero(self.state != DELETED)
+
+	def snapshot(self):
+		""" Copy the arrays of all live objects
+
+		Returns:
+			A dictionary of arrays i.e ids, mid_points, velocity,
+			last_seen, hits and state, one row per live object
+		"""
+		live = self.live_slots()
+
+		return {"ids": self.ids[live], "mid_points": self.mid_points[live],
+				"velocity": self.velocity[live], "last_seen": self.last_seen[live],
+				"hits": self.hits[live], "state": self.state[live]}
+
+	def view(self, id_):
+		""" Get a view of a live object
+
+		Args:
+			id_: Object id
+
+		Returns:
+			TrackView of the object, None if there is no such object
+		"""
+		slot = self.slots.get(id_)
+
+		return None if slot is None else TrackView(self, slot)
+
+
+class TrackView:
+	""" A view of one object in a Track Store
+
+	Attributes:
+		store: Track Store holding the object
+		slot: Slot of the object
+	"""
+	__slots__ = ("store", "slot")
+
+	def __init__(self, store, slot):
+		self.store = store
+		self.slot = slot
+
+	@property
+	def id_(self):
+		return int(self.store.ids[self.slot])
+
+	@property
+	def mid_point(self):
+		return self.store.mid_points[self.slot]
+
+	@property
+	def velocity(self):
+		return self.store.velocity[self.slot]
+
+	@property
+	def last_seen(self):
+		return int(self.store.last_seen[self.slot])
+
+	@property
+	def hits(self):
+		return int(self.store.hits[self.slot])
+
+	@property
+	def state(self):
+		return int(self.store.state[self.slot])
+
+	def __repr__(self):
+		return f"TrackView(id_={self.id_}, mid_point={self.mid_point}, state={self.state})"
+
+
 class Tracker:
 	""" Tracks Objects in a Frame and measures the speed.
 	
@@ -18,32 +216,82 @@ class Tracker:
 	Attributes:
 		model_one:  Decides the model to use.
 		distance_offset: Diffrence Allowed in Euclidean Distance
-		object_info: A Dictionary containing the object_id and info
-					 about the objects
+		tracks: A Track Store holding the mid_point, velocity, state,
+				hits and last_seen of the objects
+		mid_point_buffer: Preallocated array the mid_points of a frame
+						  are computed into
+		range_key_buffer: Preallocated array the key ranges of the cells
+						  around the mid_points are computed into
+		candidate_buffer: Preallocated array the candidate slots, their
+						  detection indices and their positions in the
+						  sorted keys are gathered into
+		min_hits: Detections needed before an object is confirmed
+		max_age: Frames an object may go unseen before it is deleted
+		tentative_max_missed: Detection frames in a row a tentative object
+							  may be missed in before it is deleted
+		frame_count: Number of frames the tracker has been updated with
+		grid: A Dictionary mapping a grid cell, distance_offset wide, to
+			  the slots of the objects whose mid_point lies in it
 		id_: Stores the present id of object
-		going_down: A list that stores the object_id of object going down
-		gone_down: A list that stores the object_id of object gone down
-		object_time_stamp: A list that stores the time stamp of objects 
-						   i.e before and after
+		next_id: Id given to the next new object
+		lines: Array of the y coordinates of the lines objects cross, in
+			   the order they are crossed going down
+		going_down: A set of the object_id of objects that crossed the
+					first line but not the last one
+		gone_down: Number of objects gone down
+		completed: A Dictionary mapping the object_id of objects that
+				   crossed the last line in the current frame to the
+				   time they crossed it at
+		crossing_time_stamps: A Dictionary mapping the object_id of an
+							  object going down to the capture time it
+							  crossed the first line at
 		coordinates_y: Stores the coordinate of y for an object in every 
 					   frame per sec
+		velocity_gain: Share of the prediction error used to correct the
+					   velocity of an object
 	"""
 	
-	def __init__(self, model_one=True, distance_offset=90, fps=3):
+	def __init__(self, model_one=True, distance_offset=90, fps=3, min_hits=2, max_age=15,
+				 capacity=64, velocity_gain=0.5, lines=None, tentative_max_missed=1):
 		""" Intializes the Tracker Object
 		
 		Args:
 			model_one: Condition to determine the model
 			distance_offset: Allowed margin of error in distance
 			fps: Number of frames per second
+			min_hits: Detections needed before an object is confirmed
+			max_age: Frames an object may go unseen before it is deleted
+			capacity: Number of objects to preallocate room for
+			velocity_gain: Share of the prediction error used to correct
+						   the velocity, between 0 and 1
+			lines: Y coordinates of the lines for model one, can be set
+				   later with set_lines
+			tentative_max_missed: Detection frames in a row a tentative
+								  object may be missed in before it is
+								  deleted
 		"""
-		self.object_info = {}
+		self.model_one = model_one
+		self.tracks = TrackStore(capacity)
+		self.mid_point_buffer = np.empty((capacity, 2))
+		self.range_key_buffer = np.empty(3 * capacity, dtype=np.int64)
+		self.candidate_buffer = np.empty((3, 9 * capacity), dtype=np.int64)
 		self.distance_offset = distance_offset
+		self.min_hits = min_hits
+		self.max_age = max_age
+		self.tentative_max_missed = tentative_max_missed
+		self.velocity_gain = velocity_gain
+		self.frame_count = 0
+		self.grid = defaultdict(set)
 		self.id_ = 0
+		self.next_id = 1
+		self.lines = None
 		if model_one:
-			self.going_down = []
-			self.gone_down = []
-			self.object_time_stamp = [0, 0]
+			self.going_down = set()
+			self.gone_down = 0
+			self.completed = {}
+			self.crossing_time_stamps = {}
+			if lines is not None:
+				self.set_lines(lines)
 		else:
 			self.coordinates_y = defaultdict(lambda: deque(maxlen=fps))
 			
@@ -74,116 +322,512 @@ class Tracker:
 		
 		return speed
 		
+	def set_lines(self, lines):
+		""" Set the lines objects are timed between
+		
+		Args:
+			lines: Y coordinates of the lines, in the order they are
+				   crossed going down
+		"""
+		lines = np.asarray(lines, dtype=float)
+		if self.lines is None or not np.array_equal(lines, self.lines):
+			self.lines = lines
+		
 	def populate_going_down(self, id_):
-		""" Add Id to list of object going down
+		""" Add Id to set of object going down
 		
 		Args:
 			id_: Object_id to be added
 		"""
-		self.going_down.append(id_)
+		self.going_down.add(id_)
+		
+	def populate_object_time_stamp(self, id_, time):
+		""" Record the time an object crossed the first line
 		
-	def populate_object_time_stamp(self, time, before=True):
-		""" Populate the object time stamp
+		Only the first crossing is kept until the object completes
 		
 		Args:
-			time: Time Instance
-			before: Condition to determin before or after
+			id_: Object Id
+			time: Capture time of the frame in seconds
 		"""
-		if before:
-			self.object_time_stamp[0] = time
-		else:
-			self.object_time_stamp[1] = time
+		self.crossing_time_stamps.setdefault(id_, time)
 		
 			
-	def calculate_object_speed_in_km_per_hr_model_one(self, distance):
-		""" Calculate the speed from object time stamp
+	def calculate_object_speed_in_km_per_hr_model_one(self, id_, distance, time):
+		""" Calculate the speed from the crossing time stamp of an object
+		
+		The crossing time stamp is removed as the object has completed
 		
 		Args:
+			id_: Object Id
 			distance: Distance covered by moving vehicle
+			time: Capture time of the frame the object completed in
 		
 		Returns:
-			Speed of object in Km/hr
+			Speed of object in Km/hr, -1 if it has no crossing time stamp
 		"""
-		elapsed_time = abs(self.object_time_stamp[1] - self.object_time_stamp[0])
+		time_stamp = self.crossing_time_stamps.pop(id_, None)
+		if time_stamp is None or time <= time_stamp:
+			return -1
+		elapsed_time = time - time_stamp
 		speed = round(distance/elapsed_time * 3.6)
 		
 		return speed
 		
-	def calculate_object_speed_in_metere_per_sec(self, distance):
-		""" Calculate the speed from object time stamp
+	def calculate_object_speed_in_metere_per_sec(self, id_, distance, time):
+		""" Calculate the speed from the crossing time stamp of an object
 		
 		Args:
+			id_: Object Id
 			distance: Distance covered by moving vehicle
+			time: Capture time of the frame the object completed in
 		
 		Returns:
-			Speed of object in m/s
+			Speed of object in m/s, -1 if it has no crossing time stamp
 		"""
-		return round(self.calculate_object_speed_in_km_per_hr(distance)/3.6)
+		speed = self.calculate_object_speed_in_km_per_hr_model_one(id_, distance, time)
+		
+		return -1 if speed == -1 else round(speed/3.6)
 		
 		
 	def populate_gone_down(self, id_):
-		""" Add Id to list of object gone down
+		""" Count an object as gone down
 		
-		Remove the obejct id from going down and add object id to gone
-		down if object_id is not recent
+		Remove the obejct id from going down and count the object
+		as gone down if it has not been counted before
 		
 		
 		Args:
 			id_: Object_id to be added
 		"""
 
-		self.going_down.remove(id_)
+		self.going_down.discard(id_)
 		
-		if len(self.gone_down) == 0:
-			self.gone_down.append(id_)
-		elif id_ != self.gone_down[-1]:
-			self.gone_down.append(id_)
+		slot = self.tracks.slots.get(id_)
+		if slot is not None and not self.tracks.gone_down[slot]:
+			self.tracks.gone_down[slot] = True
+			self.gone_down += 1
 		
 		
-	def assign_id(self, first_coordinate, second_coordinate):
+	def update(self, boxes, time_stamp=None):
+		""" Assigns Ids to all the objects detected in a frame
+
+		Every object is first moved to its predicted mid_point. Each
+		detection is compared with the objects in the grid cells around
+		it, the distances of all candidate pairs are computed in one
+		operation and pairs are matched closest first, so an object is
+		given to at most one detection in the frame.
+
+		Args:
+			boxes: Array of shape (N, 4), each row is (x1, y1, x2, y2)
+			time_stamp: Capture time of the frame in seconds, the frame
+						count if None
+
+		Returns:
+			Array of the object ids, in the order of the boxes
+		"""
+		self.frame_count += 1
+		if self.model_one:
+			self.completed.clear()
+		self.extrapolate()
+		object_ids = self.associate(boxes, time_stamp)
+		self.age_objects()
+
+		return object_ids
+
+	def predict(self):
+		""" Advance a frame in which the detector was not run
+
+		Every object is moved along its velocity, so it can still be
+		matched when the detector runs again, and missed objects are aged.
+		"""
+		self.frame_count += 1
+		if self.model_one:
+			self.completed.clear()
+		self.extrapolate()
+		self.age_objects(detected=False)
+
+	def extrapolate(self):
+		""" Move every object one frame along its velocity """
+		live = self.tracks.live_slots()
+		moving = live[(self.tracks.velocity[live] != 0).any(axis=1)]
+		self.tracks.mid_points[moving] += self.tracks.velocity[moving]
+		self.place_in_grid(moving)
+
+	def associate(self, boxes, time_stamp=None):
+		""" Match boxes to known objects and refresh the matched objects
+
+		Unmatched boxes become new tentative objects, the frame is not
+		advanced so objects missed by the boxes are not aged.
+
+		Args:
+			boxes: Array of shape (N, 4), each row is (x1, y1, x2, y2)
+			time_stamp: Capture time of the frame in seconds, the frame
+						count if None
+
+		Returns:
+			Array of the object ids, in the order of the boxes
+		"""
+		boxes = np.asarray(boxes, dtype=float).reshape(-1, 4)
+		number_of_boxes = len(boxes)
+		if len(self.mid_point_buffer) < number_of_boxes:
+			self.mid_point_buffer = np.empty((2 * number_of_boxes, 2))
+		mid_points = self.calculate_midpoints(boxes, out=self.mid_point_buffer[:number_of_boxes])
+		slots = np.full(number_of_boxes, -1, dtype=np.int64)
+
+		if len(self.tracks) != 0 and number_of_boxes != 0:
+			candidate_slots, detection_index = self.find_candidates(mid_points)
+			difference = self.tracks.mid_points[candidate_slots] - mid_points[detection_index]
+			distances = np.hypot(difference[:, 0], difference[:, 1])
+			matched_slots, matched_index = self.match_pairs(candidate_slots, detection_index,
+															distances, self.distance_offset)
+			slots[matched_index] = matched_slots
+
+		for index in np.flatnonzero(slots == -1):
+			slots[index] = self.tracks.add(self.next_id)
+			self.tracks.last_seen[slots[index]] = self.frame_count
+			self.tracks.mid_points[slots[index]] = mid_points[index]
+			self.next_id += 1
+
+		self.refresh(slots, mid_points, self.frame_count if time_stamp is None else time_stamp)
+
+		return self.tracks.ids[slots]
+
+	def refresh(self, slots, mid_points, time_stamp):
+		""" Store the detected mid_points of the matched objects
+
+		Args:
+			slots: Array of the slots of the detected objects
+			mid_points: Array of the detected mid_points
+			time_stamp: Time the mid_points were detected at
+		"""
+		tracks = self.tracks
+		seen_before = tracks.hits[slots] > 0
+		corrected = slots[seen_before]
+		frames = np.maximum(self.frame_count - tracks.last_seen[corrected], 1)[:, np.newaxis]
+		# The second detection sets the velocity, later ones correct it
+		gain = np.where(tracks.hits[corrected] == 1, 1.0, self.velocity_gain)[:, np.newaxis]
+		error = mid_points[seen_before] - tracks.mid_points[corrected]
+		tracks.velocity[corrected] += gain * error / frames
+
+		tracks.mid_points[slots] = mid_points
+		tracks.last_seen[slots] = self.frame_count
+		tracks.hits[slots] += 1
+		tracks.misses[slots] = 0
+		confirmed = slots[tracks.hits[slots] >= self.min_hits]
+		tracks.state[confirmed] = CONFIRMED
+
+		if self.model_one and self.lines is not None:
+			self.detect_crossings(corrected, tracks.measured_y[corrected], tracks.measured_at[corrected],
+								  mid_points[seen_before, 1], time_stamp)
+		tracks.measured_y[slots] = mid_points[:, 1]
+		tracks.measured_at[slots] = time_stamp
+
+		self.place_in_grid(corrected)
+		for slot in slots[~seen_before]:
+			self.move_in_grid(int(slot), self.get_cell(tracks.mid_points[slot]), placed=False)
+
+	def detect_crossings(self, slots, previous_y, previous_time, current_y, time_stamp):
+		""" Move objects that crossed lines through the crossing states
+
+		A line is crossed going down when the previous mid_point is above
+		it and the current one is not, so an object cannot jump over a
+		line between two detections. Every line is checked for every
+		object in one operation and the crossing time is interpolated
+		between the two detections. Lines must be crossed in order, an
+		object crossing the first line is going down and an object going
+		down that crosses the last line is completed.
+
+		Args:
+			slots: Array of the slots of objects detected before
+			previous_y: Array of their previously detected y coordinates
+			previous_time: Array of the times they were detected at
+			current_y: Array of their current y coordinates
+			time_stamp: Time of the current detection
+		"""
+		crossed = (previous_y[:, np.newaxis] < self.lines) & (current_y[:, np.newaxis] >= self.lines)
+		if not crossed.any():
+			return
+
+		travelled = np.maximum(current_y - previous_y, np.finfo(float).eps)[:, np.newaxis]
+		share = (self.lines - previous_y[:, np.newaxis]) / travelled
+		crossing_times = previous_time[:, np.newaxis] + share * (time_stamp - previous_time)[:, np.newaxis]
+
+		state = self.tracks.line_state[slots]
+		last_line = len(self.lines) - 1
+		for line in range(len(self.lines)):
+			advancing = np.flatnonzero((state == line) & crossed[:, line])
+			state[advancing] += 1
+			for index in advancing:
+				id_ = int(self.tracks.ids[slots[index]])
+				if line == 0:
+					self.populate_going_down(id_)
+					self.populate_object_time_stamp(id_, float(crossing_times[index, line]))
+				if line == last_line and id_ in self.going_down:
+					self.populate_gone_down(id_)
+					self.completed[id_] = float(crossing_times[index, line])
+		self.tracks.line_state[slots] = state
+
+	def place_in_grid(self, slots):
+		""" Move the objects whose mid_point changed cell
+
+		Args:
+			slots: Array of the slots of objects already in the grid
+		"""
+		cells = np.floor(self.tracks.mid_points[slots] / self.distance_offset).astype(np.int64)
+		moved = np.flatnonzero((cells != self.tracks.cells[slots]).any(axis=1))
+		for index in moved:
+			self.move_in_grid(int(slots[index]), (int(cells[index, 0]), int(cells[index, 1])))
+
+	def age_objects(self, detected=True):
+		""" Move objects missed in the current frame through their lifecycle
+
+		A confirmed object that is missed becomes lost. A tentative object
+		missed in more than tentative_max_missed detection frames in a row,
+		so a single flicker of the detector does not drop it, or any object
+		unseen for more than max_age frames is deleted and its slot is
+		freed.
+
+		Args:
+			detected: False when the detector was not run on the frame,
+					  only objects unseen for too long are then deleted
+		"""
+		live = self.tracks.live_slots()
+		unseen = self.frame_count - self.tracks.last_seen[live]
+		expired = unseen > self.max_age
+		if detected:
+			missed = unseen > 0
+			self.tracks.misses[live[missed]] += 1
+			tentative = self.tracks.state[live] == TENTATIVE
+			expired |= tentative & (self.tracks.misses[live] > self.tentative_max_missed)
+			self.tracks.state[live[missed & ~tentative & ~expired]] = LOST
+
+		for slot in live[expired]:
+			self.delete_object(int(self.tracks.ids[slot]))
+
+	def delete_object(self, id_):
+		""" Remove an object and everything stored about it
+
+		Args:
+			id_: Object id
+		"""
+		slot = self.tracks.slots[id_]
+		cell = tuple(int(i) for i in self.tracks.cells[slot])
+		self.grid[cell].discard(slot)
+		if len(self.grid[cell]) == 0:
+			del self.grid[cell]
+		self.tracks.remove(slot)
+
+		if self.model_one:
+			self.going_down.discard(id_)
+			self.crossing_time_stamps.pop(id_, None)
+		else:
+			self.coordinates_y.pop(id_, None)
+
+	def move_in_grid(self, slot, cell, placed=True):
+		""" Keep the grid in step with the mid_point of an object
+
+		The object only changes cell when its mid_point has crossed into
+		a different one, the rest of the grid is left as it is.
+
+		Args:
+			slot: Slot of the object
+			cell: New cell (column, row) of the object
+			placed: False for an object not yet in the grid
+		"""
+		if placed:
+			previous_cell = tuple(int(i) for i in self.tracks.cells[slot])
+			self.grid[previous_cell].discard(slot)
+			if len(self.grid[previous_cell]) == 0:
+				del self.grid[previous_cell]
+		self.grid[cell].add(slot)
+		self.tracks.cells[slot] = cell
+
+	def get_cell(self, mid_point):
+		""" Get the grid cell a mid_point lies in
+
+		Args:
+			mid_point: Midpoint (x, y)
+
+		Returns:
+			Cell (column, row)
+		"""
+		return (math.floor(mid_point[0] / self.distance_offset),
+				math.floor(mid_point[1] / self.distance_offset))
+
+	def find_candidates(self, mid_points):
+		""" Find the objects in the cells around every mid_point
+
+		Any object closer than distance_offset to a mid_point lies in the
+		cell of the mid_point or in one of the eight cells around it. The
+		cells of the live objects are sorted as keys, so the three cells
+		around a mid_point in one column are a single range of keys. The
+		ranges of all mid_points are found with one binary search and
+		their objects are gathered into reused buffers.
+
+		Args:
+			mid_points: Array of shape (N, 2)
+
+		Returns:
+			Arrays of the candidate slots and their detection indices,
+			views of a buffer reused by the next call
+		"""
+		tracks = self.tracks
+		live = tracks.live_slots()
+		keys = tracks.cells[live, 0] * CELL_KEY_SCALE
+		keys += tracks.cells[live, 1]
+		order = np.argsort(keys)
+		keys = keys[order]
+		sorted_slots = live[order]
+
+		# Key of the cell above the mid_point, one row per column around it
+		number_of_points = len(mid_points)
+		if len(self.range_key_buffer) < 3 * number_of_points:
+			self.range_key_buffer = np.empty(6 * number_of_points, dtype=np.int64)
+		range_keys = self.range_key_buffer[:3 * number_of_points]
+		columns = np.floor_divide(mid_points[:, 0], self.distance_offset).astype(np.int64)
+		rows = np.floor_divide(mid_points[:, 1], self.distance_offset).astype(np.int64)
+		rows -= 1
+		for column_keys, column_offset in zip(range_keys.reshape(3, number_of_points), (-1, 0, 1)):
+			np.add(columns, column_offset, out=column_keys)
+			column_keys *= CELL_KEY_SCALE
+			column_keys += rows
+
+		starts = np.searchsorted(keys, range_keys, side="left")
+		range_keys += 2
+		counts = np.searchsorted(keys, range_keys, side="right")
+		counts -= starts
+		runs = np.flatnonzero(counts)
+		starts, counts = starts[runs], counts[runs]
+		total = int(counts.sum())
+		if self.candidate_buffer.shape[1] < total:
+			self.candidate_buffer = np.empty((3, 2 * total), dtype=np.int64)
+		candidate_slots, detection_index, positions = self.candidate_buffer[:, :total]
+		if total == 0:
+			return candidate_slots, detection_index
+
+		# Positions step by one within a range and jump to the start of the next one
+		boundaries = np.cumsum(counts[:-1])
+		positions.fill(1)
+		positions[0] = starts[0]
+		positions[boundaries] = starts[1:] - starts[:-1] - counts[:-1] + 1
+		np.cumsum(positions, out=positions)
+		np.take(sorted_slots, positions, out=candidate_slots)
+
+		runs %= number_of_points
+		detection_index.fill(0)
+		detection_index[0] = runs[0]
+		detection_index[boundaries] = np.diff(runs)
+		np.cumsum(detection_index, out=detection_index)
+
+		return candidate_slots, detection_index
+
+	def get_track(self, id_):
+		""" Get a view of an object
+
+		Args:
+			id_: Object id
+
+		Returns:
+			TrackView of the object, None if the object is gone
+		"""
+		return self.tracks.view(id_)
+
+	def get_state(self, id_):
+		""" Get the lifecycle state of an object
+
+		Args:
+			id_: Object id
+
+		Returns:
+			TENTATIVE, CONFIRMED or LOST, DELETED if the object is gone
+		"""
+		slot = self.tracks.slots.get(id_)
+
+		return DELETED if slot is None else int(self.tracks.state[slot])
+
+	def assign_id(self, first_coordinate, second_coordinate, time_stamp=None):
 		""" Assigns Id to objects based on the Coordinate
-		
+
+		Boxes are matched one at a time and the frame is not advanced,
+		as the boxes of a frame may come in several calls. Call predict
+		once per frame, before assigning its boxes, or the objects never
+		age and are never deleted. Missed objects are then only deleted
+		after max_age frames, use update to match a whole frame.
+
 		Args:
 			first_coordinate: Top left corner (x1, y1)
 			second_coordinate: Bottom right corner (x2, y2)
-			
+			time_stamp: Capture time of the frame in seconds
+
 		Returns:
 			Object Id
 		"""
-		mid_point = self.get_object_info(first_coordinate, second_coordinate)
-		
-		if self.object_has_been_detected_before(mid_point,):
-			self.object_info[self.id_] = {"mid_point": mid_point}
-			object_id = self.id_
-		else:
-			object_id = len(self.object_info) + 1
-			self.object_info[object_id] = {"mid_point": mid_point}
-		
-		return object_id
-			
+		box = (*first_coordinate, *second_coordinate)
+		if self.model_one:
+			self.completed.clear()
+
+		return int(self.associate([box], time_stamp)[0])
+
 	def object_has_been_detected_before(self, mid_point):
 		""" Check if the object has been Detected before
-		
+
+		The closest known object within the distance offset is stored in id_
+
 		Args:
-			area: Area enclosed by object
 			mid_point: Midpoint of two coordinates
-			n_difference: Difference between normalized mid_point
-			
+
 		Returns:
 			True if detected before, otherwise false
 		"""
-		if len(self.object_info) == 0:
+		if len(self.tracks) == 0:
 			return False
-			
-		for id_, info in self.object_info.items():
-			 distance_change = self.calculate_euclidean_distance(mid_point, info["mid_point"])
-			 if distance_change < self.distance_offset:
-				 self.id_ = id_
-				 return True
-				 
+
+		candidate_slots, _ = self.find_candidates(np.reshape(mid_point, (1, 2)))
+		if len(candidate_slots) == 0:
+			return False
+
+		known_mid_points = self.tracks.mid_points[candidate_slots]
+		distances = self.calculate_distance_matrix(known_mid_points, np.reshape(mid_point, (1, 2)))[:, 0]
+		closest = int(np.argmin(distances))
+		if distances[closest] < self.distance_offset:
+			self.id_ = int(self.tracks.ids[candidate_slots[closest]])
+			return True
+
 		return False
-		
-		
+
+	@staticmethod
+	def match_pairs(object_slots, detection_index, distances, max_distance):
+		""" Match objects to detections, closest pair first
+
+		Args:
+			object_slots: Array of the object slot of every candidate pair
+			detection_index: Array of the detection index of every pair
+			distances: Array of the distance of every pair
+			max_distance: Pairs at or beyond this distance are never matched
+
+		Returns:
+			Arrays of the matched object slots and detection indices
+		"""
+		close = distances < max_distance
+		object_slots, detection_index = object_slots[close], detection_index[close]
+		order = np.argsort(distances[close], kind="stable")
+
+		object_slots, detection_index = object_slots[order], detection_index[order]
+
+		# Flags of the matched objects and detections, one byte each
+		matched_objects = bytearray(int(object_slots.max()) + 1 if len(object_slots) else 0)
+		matched_detections = bytearray(int(detection_index.max()) + 1 if len(detection_index) else 0)
+		matched = np.zeros(len(order), dtype=bool)
+		for index, (object_, detection) in enumerate(zip(object_slots.tolist(), detection_index.tolist())):
+			if matched_objects[object_] or matched_detections[detection]:
+				continue
+			matched_objects[object_] = 1
+			matched_detections[detection] = 1
+			matched[index] = True
+
+		return object_slots[matched], detection_index[matched]
+
 	@classmethod
 	def get_object_info(cls, first_coordinate, second_coordinate):
 		""" Calculate the properties i.e mid_point of 
@@ -247,3 +891,33 @@ class Tracker:
 		y_difference = abs(first_coordinate[1] - second_coordinate[1])
 		
 		return math.hypot(x_difference, y_difference)
+
+	@staticmethod
+	def calculate_midpoints(boxes, out=None):
+		""" Calculate the Midpoints of an array of boxes
+
+		Args:
+			boxes: Array of shape (N, 4), each row is (x1, y1, x2, y2)
+			out: Array of shape (N, 2) to write the midpoints into
+
+		Returns:
+			Array of shape (N, 2) of the midpoints
+		"""
+		mid_points = np.add(boxes[:, :2], boxes[:, 2:], out=out)
+
+		return np.divide(mid_points, 2, out=mid_points)
+
+	@staticmethod
+	def calculate_distance_matrix(first_points, second_points):
+		""" Calculate the Euclidean Distance between every pair of points
+
+		Args:
+			first_points: Array of shape (M, 2)
+			second_points: Array of shape (N, 2)
+
+		Returns:
+			Array of shape (M, N) of the distances
+		"""
+		difference = first_points[:, np.newaxis, :] - second_points[np.newaxis, :, :]
+
+		return np.hypot(difference[..., 0], difference[..., 1])
@@ -0,0 +1,199 @@
+import time
+import threading
+from contextlib import nullcontext
+from helpers import insert_violations
+from pipeline import DropOldestQueue
+
+
+class ViolationWriter:
+	""" Saves the evidence of speed violations on a background thread
+
+	The detection loop only queues a violation, the writer thread saves
+	its image in the ImageStore and inserts the violations of a batch
+	with one executemany and one commit. The queue is bounded and drops
+	the oldest violation when full, so the detection loop never blocks on
+	the disk or the database.
+
+	Attributes:
+		database_connection: Connection the violations are inserted with,
+							 only used by the writer thread
+		table: Table in database
+		image_store: ImageStore the images are saved in
+		camera: Name of the camera stored with every violation
+		batch_size: Violations inserted with one commit
+		flush_interval: Seconds a queued violation may wait for a batch
+						to fill up
+		metrics: Metrics the write latencies and counters are recorded in,
+				 None to not record them
+		queue: Bounded queue of the violations waiting to be written
+		stopped: Event set when the writer is closing
+		thread: Writer thread
+		written: Number of violations saved
+		failed: Number of violations that could not be saved
+	"""
+
+	def __init__(self, database_connection, table, image_store, camera="camera_0", maxsize=64,
+				 batch_size=16, flush_interval=1.0, metrics=None):
+		""" Intializes the Violation Writer
+
+		Args:
+			database_connection: Connection the violations are inserted
+								 with, only used by the writer thread
+			table: Table in database
+			image_store: ImageStore the images are saved in
+			camera: Name of the camera stored with every violation
+			maxsize: Maximum number of violations waiting to be written
+			batch_size: Violations inserted with one commit
+			flush_interval: Seconds a queued violation may wait for a
+							batch to fill up
+			metrics: Metrics the write latencies and counters are
+					 recorded in, None to not record them
+		"""
+		self.database_connection = database_connection
+		self.table = table
+		self.image_store = image_store
+		self.camera = camera
+		self.batch_size = batch_size
+		self.flush_interval = flush_interval
+		self.metrics = metrics
+		self.queue = DropOldestQueue(maxsize)
+		self.stopped = threading.Event()
+		self.thread = threading.Thread(target=self.run, name="violation_writer", daemon=True)
+		self.written = 0
+		self.failed = 0
+
+	def start(self):
+		""" Start the writer thread """
+		self.thread.start()
+
+	def put(self, image, speed, date_time, lane=None, box=None):
+		""" Queue a violation without waiting
+
+		Args:
+			image: Loaded image of the violation, it must not be changed
+				   after it is queued
+			speed: Speed of trespasser
+			date_time: Datetime Trespassed
+			lane: Lane of the trespasser, None if unknown
+			box: Pixel coordinates of the trespasser, used when the
+				 image store only keeps the crop
+		"""
+		self.queue.put((image, speed, date_time, lane, box))
+		self.report()
+
+	def close(self, timeout=10.0):
+		""" Write the queued violations and stop the writer thread
+
+		Args:
+			timeout: Seconds to wait for the queued violations
+		"""
+		self.stopped.set()
+		if self.thread.is_alive():
+			self.thread.join(timeout)
+		self.report()
+
+	def get_stats(self):
+		""" Get the state of the writer
+
+		Returns:
+			A dictionary of the queue depth and the number of violations
+			written, failed and dropped
+		"""
+		return {"queue_depth": len(self.queue), "written": self.written,
+				"failed": self.failed, "dropped": self.queue.dropped}
+
+	def report(self):
+		""" Record the state of the writer in the metrics """
+		if self.metrics is None:
+			return
+		stats = self.get_stats()
+		self.metrics.set_gauge("violation_queue_depth", stats["queue_depth"])
+		for name in ("written", "failed", "dropped"):
+			self.metrics.set_counter(f"violations_{name}", stats[name])
+
+	def run(self):
+		""" Write batches until closed and the queue is empty """
+		while not self.stopped.is_set() or len(self.queue) != 0:
+			batch = self.collect()
+			if batch:
+				self.write(batch)
+			self.report()
+
+	def collect(self):
+		""" Wait for a batch of violations
+
+		The batch is returned once it is full, flush_interval after its
+		first violation arrived or when the writer is closing.
+
+		Returns:
+			A list of (image, speed, date_time, lane, box), empty if
+			none arrived
+		"""
+		item = self.queue.get(timeout=0.1)
+		if item is None:
+			return []
+		batch = [item]
+		deadline = time.monotonic() + self.flush_interval
+		while len(batch) < self.batch_size:
+			remaining = deadline - time.monotonic()
+			if self.stopped.is_set():
+				remaining = 0
+			item = self.queue.get(timeout=max(remaining, 0))
+			if item is None:
+				break
+			batch.append(item)
+
+		return batch
+
+	def write(self, batch):
+		""" Write the images of a batch and insert its rows
+
+		Violations whose image could not be written are not inserted. A
+		failed insert is rolled back and the connection is checked, so the
+		next batch can reconnect.
+
+		Args:
+			batch: A list of (image, speed, date_time, lane, box)
+		"""
+		rows = []
+		for image, speed, date_time, lane, box in batch:
+			try:
+				with self.time("image_write"):
+					key = self.image_store.save(image, date_time, box)
+			except (OSError, ValueError) as error:
+				print(f"Unable to save the image of {date_time}: {error}")
+				self.failed += 1
+				continue
+			rows.append((speed, date_time, self.camera, lane, key))
+		if not rows:
+			return
+
+		try:
+			with self.time("db_insert"):
+				with self.database_connection.cursor() as cursor:
+					insert_violations(cursor, self.table, rows)
+				self.database_connection.commit()
+		except Exception as error:
+			print(f"Unable to insert {len(rows)} violations: {error}")
+			self.failed += len(rows)
+			try:
+				self.database_connection.rollback()
+				self.database_connection.ping(reconnect=True)
+			except Exception:
+				pass
+			return
+		self.written += len(rows)
+
+	def time(self, stage):
+		""" Record the latency of a stage if there are metrics
+
+		Args:
+			stage: Name of the stage
+
+		Returns:
+			A context manager timing the block
+		"""
+		if self.metrics is None:
+			return nullcontext()
+
+		return self.metrics.time(stage)